@@ -3,7 +3,8 @@ from abc import ABC, abstractmethod
 from os.path import join, exists, dirname, abspath
 import logging
 
-from ..utils import Config, get_module
+from ..utils import Config, get_module, get_hash, make_dir
+from .utils.manifest import Manifest
 
 logging.basicConfig(
     level=logging.INFO,
@@ -105,6 +106,47 @@ class BaseDataset(ABC):
         """
         return
 
+    def get_manifest_path(self):
+        """Returns the path of the manifest in the cache directory."""
+        cfg = self.cfg
+        return join(
+            cfg.get('cache_dir', './logs/cache'), self.name,
+            'manifest_{}.npz'.format(get_hash(abspath(cfg.dataset_path))))
+
+    def get_manifest(self, dirs, path_fn=None, label_fn=None):
+        """Returns the manifest of the files of the dataset.
+
+        With the use_manifest config option, the manifest is generated once
+        and stored in the cache directory. It is generated again when the
+        directories changed, keeping the statistics of unchanged files.
+        Otherwise the directories are scanned every time.
+
+        Args:
+            dirs: Directories of the dataset.
+            path_fn: Optional function mapping a directory and a file name
+                to the path of an item, or to None to skip the file.
+            label_fn: Optional function returning whether an item has labels.
+
+        Returns:
+            A Manifest.
+        """
+        if not self.cfg.get('use_manifest', False):
+            return Manifest.scan(dirs, path_fn, label_fn, with_sizes=False)
+
+        path = self.get_manifest_path()
+        old = Manifest.load(path) if exists(path) else None
+        if old is not None and old.is_valid(dirs):
+            return old
+
+        log.info("Generating the manifest of {}.".format(self.name))
+        manifest = Manifest.scan(dirs, path_fn, label_fn)
+        if old is not None:
+            manifest.copy_stats(old)
+        make_dir(dirname(path))
+        manifest.save(path)
+
+        return manifest
+
 
 class BaseDatasetSplit(ABC):
     """The base class for dataset splits.
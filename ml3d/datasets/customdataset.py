@@ -8,6 +8,7 @@ from sklearn.neighbors import KDTree
 from tqdm import tqdm
 import logging
 
+from .utils import DataProcessing as DP, Manifest
 from .base_dataset import BaseDataset, BaseDatasetSplit
 from ..utils import make_dir, DATASET
 
@@ -20,6 +21,7 @@ log = logging.getLogger(__name__)
 # Expect point clouds to be in npy format with train, val and test files in separate folders.
 # Expected format of npy files : ['x', 'y', 'z', 'class', 'feat_1', 'feat_2', ........,'feat_n'].
 # For test files, format should be : ['x', 'y', 'z', 'feat_1', 'feat_2', ........,'feat_n'].
+# Whitespace separated .txt files with the same columns can be converted once with Custom3D.ingest.
 
 
 class Custom3DSplit():
@@ -47,12 +49,12 @@ class Custom3DSplit():
 
     def get_data(self, idx):
         pc_path = self.path_list[idx]
-        data = np.load(pc_path)
+        data = np.load(pc_path, mmap_mode='r')
         points = np.array(data[:, :3], dtype=np.float32)
 
         if (self.split != 'test'):
             labels = np.array(data[:, 3], dtype=np.int32)
-            feat = data[:, 4:] if data.shape[1] > 4 else None
+            feat = np.array(data[:, 4:]) if data.shape[1] > 4 else None
         else:
             feat = np.array(data[:, 3:],
                             dtype=np.float32) if data.shape[1] > 3 else None
@@ -119,9 +121,41 @@ class Custom3D(BaseDataset):
         self.val_dir = str(Path(cfg.dataset_path) / cfg.val_dir)
         self.test_dir = str(Path(cfg.dataset_path) / cfg.test_dir)
 
-        self.train_files = [f for f in glob.glob(self.train_dir + "/*.npy")]
-        self.val_files = [f for f in glob.glob(self.val_dir + "/*.npy")]
-        self.test_files = [f for f in glob.glob(self.test_dir + "/*.npy")]
+        self.find_files()
+
+    def find_files(self):
+        """Finds the .npy files of the train, val and test directories."""
+
+        def has_label(path):
+            return dirname(path) != self.test_dir
+
+        self.manifest = self.get_manifest(
+            [self.train_dir, self.val_dir, self.test_dir],
+            path_fn=Manifest.ext_filter('.npy'),
+            label_fn=has_label)
+        self.train_files = self.manifest.files(self.train_dir)
+        self.val_files = self.manifest.files(self.val_dir)
+        self.test_files = self.manifest.files(self.test_dir)
+
+    def ingest(self, overwrite=False):
+        """Converts the .txt files of the dataset to .npy files.
+
+        Each whitespace separated .txt file of the train, val and test
+        directories is written as a .npy file with the same columns next to
+        it, which is then memory mapped by the dataset splits. This only has
+        to be done once.
+
+        Args:
+            overwrite: Convert files that already have a .npy version.
+        """
+        for directory in [self.train_dir, self.val_dir, self.test_dir]:
+            for txt_path in glob.glob(directory + "/*.txt"):
+                npy_path = txt_path[:-len('.txt')] + '.npy'
+                if overwrite or not exists(npy_path):
+                    log.info("Converting {}".format(txt_path))
+                    DP.text_to_npy(txt_path, npy_path, dtype=np.float32)
+
+        self.find_files()
 
     @staticmethod
     def get_label_to_names():
@@ -7,8 +7,8 @@ import logging
 import yaml
 
 from .base_dataset import BaseDataset, BaseDatasetSplit
-from ..utils import Config, make_dir, DATASET
-from .utils import DataProcessing, BEVBox3D
+from ..utils import Config, make_dir, DATASET, Cache
+from .utils import DataProcessing, BoxArray, Manifest
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,11 +28,14 @@ class KITTI(BaseDataset):
                  cache_dir='./logs/cache',
                  use_cache=False,
                  val_split=3712,
+                 cache_culled_points=False,
                  **kwargs):
         """
         Initialize
         Args:
             dataset_path (str): path to the dataset
+            cache_culled_points (bool): cache the points inside the camera
+                frustum of each frame in cache_dir
             kwargs:
         """
         super().__init__(dataset_path=dataset_path,
@@ -40,6 +43,7 @@ class KITTI(BaseDataset):
                          cache_dir=cache_dir,
                          use_cache=use_cache,
                          val_split=val_split,
+                         cache_culled_points=cache_culled_points,
                          **kwargs)
 
         cfg = self.cfg
@@ -49,8 +53,14 @@ class KITTI(BaseDataset):
         self.num_classes = 3
         self.label_to_names = self.get_label_to_names()
 
-        self.all_files = glob(
-            join(cfg.dataset_path, 'training', 'velodyne', '*.bin'))
+        train_dir = join(cfg.dataset_path, 'training', 'velodyne')
+        test_dir = join(cfg.dataset_path, 'testing', 'velodyne')
+        self.manifest = self.get_manifest([train_dir, test_dir],
+                                          path_fn=Manifest.ext_filter('.bin'),
+                                          label_fn=Manifest.sibling_label_fn(
+                                              'label_2', '.txt'))
+
+        self.all_files = self.manifest.files(train_dir)
         self.train_files = []
         self.val_files = []
 
@@ -61,8 +71,7 @@ class KITTI(BaseDataset):
             else:
                 self.val_files.append(f)
 
-        self.test_files = glob(
-            join(cfg.dataset_path, 'testing', 'velodyne', '*.bin'))
+        self.test_files = self.manifest.files(test_dir)
 
     @staticmethod
     def get_label_to_names():
@@ -85,28 +94,13 @@ class KITTI(BaseDataset):
     @staticmethod
     def read_label(path, calib):
         if not Path(path).exists():
-            return []
+            return BoxArray.from_kitti_format([], calib)
 
         with open(path, 'r') as f:
             lines = f.readlines()
 
-        objects = []
-        for line in lines:
-            label = line.strip().split(' ')
-
-            center = np.array(
-                [float(label[11]),
-                 float(label[12]),
-                 float(label[13]), 1.0])
-
-            points = center @ np.linalg.inv(calib['world_cam'])
-
-            size = [float(label[9]), float(label[8]), float(label[10])]  # w,h,l
-            center = [points[0], points[1], size[1] / 2 + points[2]]
-
-            objects.append(Object3d(center, size, label, calib))
-
-        return objects
+        return BoxArray.from_kitti_format(
+            lines, calib, class_names=KITTI.get_label_to_names().values())
 
     @staticmethod
     def _extend_matrix(mat):
@@ -191,6 +185,13 @@ class KITTISplit():
         self.split = split
         self.dataset = dataset
 
+        self.cache_culled = None
+        if self.cfg.get('cache_culled_points', False):
+            self.cache_culled = Cache(self.remove_outside_points,
+                                      cache_dir=self.cfg.cache_dir,
+                                      cache_key=join(dataset.name,
+                                                     'culled_points'))
+
     def __len__(self):
         return len(self.path_list)
 
@@ -204,8 +205,14 @@ class KITTISplit():
         calib = self.dataset.read_calib(calib_path)
         label = self.dataset.read_label(label_path, calib)
 
-        reduced_pc = DataProcessing.remove_outside_points(
-            pc, calib['world_cam'], calib['cam_img'], [370, 1224])
+        if self.cache_culled is not None:
+            # training and testing frames share the same names
+            unique_id = '{}_{}'.format(
+                Path(pc_path).parts[-3],
+                Path(pc_path).name.split('.')[0])
+            reduced_pc = self.cache_culled(unique_id, pc, calib)['point']
+        else:
+            reduced_pc = self.remove_outside_points(pc, calib)['point']
 
         data = {
             'point': reduced_pc,
@@ -224,71 +231,14 @@ class KITTISplit():
         attr = {'name': name, 'path': pc_path, 'split': self.split}
         return attr
 
-
-class Object3d(BEVBox3D):
-    """
-    Stores object specific details like bbox coordinates, occlusion etc.
-    """
-
-    def __init__(self, center, size, label, calib=None):
-        confidence = float(label[15]) if label.__len__() == 16 else -1.0
-
-        world_cam = calib['world_cam']
-        cam_img = calib['cam_img']
-
-        # kitti boxes are pointing backwards
-        yaw = float(label[14]) - np.pi
-        yaw = yaw - np.floor(yaw / (2 * np.pi) + 0.5) * 2 * np.pi
-
-        self.truncation = float(label[1])
-        self.occlusion = float(
-            label[2]
-        )  # 0:fully visible 1:partly occluded 2:largely occluded 3:unknown
-
-        self.alpha = float(label[3])
-        self.box2d = np.array((float(label[4]), float(label[5]), float(
-            label[6]), float(label[7])),
-                              dtype=np.float32)
-
-        class_name = label[0] if label[0] in KITTI.get_label_to_names().values(
-        ) else 'DontCare'
-
-        super().__init__(center, size, yaw, class_name, confidence, world_cam,
-                         cam_img)
-
-        self.yaw = float(label[14])
-
-    def get_difficulty(self):
-        """
-        determines the difficulty level of object.
-        """
-        height = float(self.box2d[3]) - float(self.box2d[1]) + 1
-
-        if height >= 40 and self.truncation <= 0.15 and self.occlusion <= 0:
-            self.level_str = 'Easy'
-            return 0  # Easy
-        elif height >= 25 and self.truncation <= 0.3 and self.occlusion <= 1:
-            self.level_str = 'Moderate'
-            return 1  # Moderate
-        elif height >= 25 and self.truncation <= 0.5 and self.occlusion <= 2:
-            self.level_str = 'Hard'
-            return 2  # Hard
-        else:
-            self.level_str = 'UnKnown'
-            return -1
-
-    def to_str(self):
-        print_str = '%s %.3f %.3f %.3f box2d: %s hwl: [%.3f %.3f %.3f] pos: %s ry: %.3f' \
-                     % (self.label_class, self.truncation, self.occlusion, self.alpha, self.box2d, self.size[2], self.size[0], self.size[1],
-                        self.center, self.yaw)
-        return print_str
-
-    def to_kitti_format(self):
-        kitti_str = '%s %.2f %d %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f' \
-                    % (self.label_class, self.truncation, int(self.occlusion), self.alpha, self.box2d[0], self.box2d[1],
-                       self.box2d[2], self.box2d[3], self.size[2], self.size[0], self.size[1], self.center[0], self.center[1], self.center[2],
-                       self.yaw)
-        return kitti_str
+    @staticmethod
+    def remove_outside_points(pc, calib):
+        return {
+            'point':
+                DataProcessing.remove_outside_points(pc, calib['world_cam'],
+                                                     calib['cam_img'],
+                                                     [370, 1224])
+        }
 
 
 DATASET._register_module(KITTI)
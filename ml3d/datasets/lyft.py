@@ -5,11 +5,10 @@ from pathlib import Path
 from glob import glob
 import logging
 import yaml
-from scipy.spatial.transform import Rotation as R
 
 from .base_dataset import BaseDataset
 from ..utils import Config, make_dir, DATASET
-from .utils import BEVBox3D
+from .utils import BoxArray, FrameInfos
 
 logging.basicConfig(
     level=logging.INFO,
@@ -53,21 +52,7 @@ class Lyft(BaseDataset):
         self.num_classes = 9
         self.label_to_names = self.get_label_to_names()
 
-        self.train_info = {}
-        self.test_info = {}
-        self.val_info = {}
-
-        if os.path.exists(join(info_path, 'infos_train.pkl')):
-            self.train_info = pickle.load(
-                open(join(info_path, 'infos_train.pkl'), 'rb'))
-
-        if os.path.exists(join(info_path, 'infos_val.pkl')):
-            self.val_info = pickle.load(
-                open(join(info_path, 'infos_val.pkl'), 'rb'))
-
-        if os.path.exists(join(info_path, 'infos_test.pkl')):
-            self.test_info = pickle.load(
-                open(join(info_path, 'infos_test.pkl'), 'rb'))
+        self.infos = {}
 
     @staticmethod
     def get_label_to_names():
@@ -98,34 +83,35 @@ class Lyft(BaseDataset):
         boxes = info['gt_boxes'][mask]
         names = info['gt_names'][mask]
 
-        objects = []
-        for name, box in zip(names, boxes):
-            center = [float(box[0]), float(box[1]), float(box[2])]
-            size = [float(box[3]), float(box[5]), float(box[4])]
-            ry = float(box[6])
-
-            yaw = ry - np.pi
-            yaw = yaw - np.floor(yaw / (2 * np.pi) + 0.5) * 2 * np.pi
-
-            world_cam = calib['world_cam']
-
-            objects.append(BEVBox3D(center, size, yaw, name, -1.0, world_cam))
-            objects[-1].yaw = ry
-
-        return objects
+        # boxes are pointing backwards
+        return BoxArray(boxes[:, 0:3],
+                        boxes[:, [3, 5, 4]],
+                        boxes[:, 6],
+                        names,
+                        world_cam=calib['world_cam'],
+                        yaw_offset=-np.pi)
 
     def get_split(self, split):
         return LyftSplit(self, split=split)
 
     def get_split_list(self, split):
+        """Frame infos of a split as FrameInfos. The info file of the split
+        is loaded on first use."""
         if split in ['train', 'training']:
-            return self.train_info
+            split = 'train'
         elif split in ['test', 'testing']:
-            return self.test_info
+            split = 'test'
         elif split in ['val', 'validation']:
-            return self.val_info
+            split = 'val'
+        else:
+            raise ValueError("Invalid split {}".format(split))
 
-        raise ValueError("Invalid split {}".format(split))
+        if split not in self.infos:
+            path = join(self.cfg.info_path, 'infos_{}.pkl'.format(split))
+            self.infos[split] = FrameInfos.load(path) if exists(
+                path) else FrameInfos.from_infos([])
+
+        return self.infos[split]
 
     def is_tested():
         pass
@@ -143,9 +129,7 @@ class LyftSplit():
 
         log.info("Found {} pointclouds for {}".format(len(self.infos), split))
 
-        self.path_list = []
-        for info in self.infos:
-            self.path_list.append(info['lidar_path'])
+        self.path_list = self.infos.lidar_path.tolist()
         self.split = split
         self.dataset = dataset
 
@@ -153,16 +137,11 @@ class LyftSplit():
         return len(self.infos)
 
     def get_data(self, idx):
-        info = self.infos[idx]
-        lidar_path = info['lidar_path']
-
-        world_cam = np.eye(4)
-        world_cam[:3, :3] = R.from_quat(info['lidar2ego_rot']).as_matrix()
-        world_cam[:3, -1] = info['lidar2ego_tr']
-        calib = {'world_cam': world_cam.T}
+        lidar_path = self.path_list[idx]
+        calib = {'world_cam': self.infos.world_cam[idx].copy()}
 
         pc = self.dataset.read_lidar(lidar_path)
-        label = self.dataset.read_label(info, calib)
+        label = self.dataset.read_label(self.infos.get_boxes(idx), calib)
 
         data = {
             'point': pc,
@@ -174,8 +153,7 @@ class LyftSplit():
         return data
 
     def get_attr(self, idx):
-        info = self.infos[idx]
-        pc_path = info['lidar_path']
+        pc_path = self.path_list[idx]
         name = Path(pc_path).name.split('.')[0]
 
         attr = {'name': name, 'path': str(pc_path), 'split': self.split}
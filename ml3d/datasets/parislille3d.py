@@ -9,7 +9,9 @@ from tqdm import tqdm
 import logging
 
 from .base_dataset import BaseDataset, BaseDatasetSplit
+from .utils import Manifest
 from ..utils import make_dir, DATASET
+from ..utils.ply import read_ply, ply_xyz, ply_columns
 
 logging.basicConfig(
     level=logging.INFO,
@@ -65,8 +67,14 @@ class ParisLille3D(BaseDataset):
         self.label_to_idx = {l: i for i, l in enumerate(self.label_values)}
         self.ignored_labels = np.array([0])
 
-        train_path = cfg.dataset_path + "/training_10_classes/"
-        self.train_files = glob.glob(train_path + "/*.ply")
+        train_path = join(cfg.dataset_path, "training_10_classes")
+        test_path = join(cfg.dataset_path, "test_10_classes")
+        self.manifest = self.get_manifest(
+            [train_path, test_path],
+            path_fn=Manifest.ext_filter('.ply'),
+            label_fn=lambda path: dirname(path) == train_path)
+
+        self.train_files = self.manifest.files(train_path)
         self.val_files = [
             f for f in self.train_files if Path(f).name in cfg.val_files
         ]
@@ -74,8 +82,7 @@ class ParisLille3D(BaseDataset):
             f for f in self.train_files if f not in self.val_files
         ]
 
-        test_path = cfg.dataset_path + "/test_10_classes/"
-        self.test_files = glob.glob(test_path + '*.ply')
+        self.test_files = self.manifest.files(test_path)
 
     @staticmethod
     def get_label_to_names():
@@ -192,15 +199,12 @@ class ParisLille3DSplit(BaseDatasetSplit):
     def get_data(self, idx):
         pc_path = self.path_list[idx]
         log.debug("get_data called {}".format(pc_path))
-        data = PlyData.read(pc_path)['vertex']
+        data = read_ply(pc_path, mmap=True)
 
-        points = np.zeros((data['x'].shape[0], 3), dtype=np.float32)
-        points[:, 0] = data['x']
-        points[:, 1] = data['y']
-        points[:, 2] = data['z']
+        points = np.array(ply_xyz(data), dtype=np.float32)
 
         if (self.split != 'test'):
-            labels = np.array(data['class'], dtype=np.int32).reshape((-1,))
+            labels = np.array(ply_columns(data, 'class'), dtype=np.int32)
         else:
             labels = np.zeros((points.shape[0],), dtype=np.int32)
 
@@ -8,10 +8,12 @@ from plyfile import PlyData, PlyElement
 from sklearn.neighbors import KDTree
 from tqdm import tqdm
 import logging
+from multiprocessing import Pool
 
-from .utils import DataProcessing
+from .utils import DataProcessing, Manifest
 from .base_dataset import BaseDataset, BaseDatasetSplit
 from ..utils import make_dir, DATASET
+from ..utils.ply import read_ply, ply_xyz, ply_rgb, ply_columns
 
 logging.basicConfig(
     level=logging.INFO,
@@ -78,14 +80,23 @@ class S3DIS(BaseDataset):
 
         self.pc_path = join(self.cfg.dataset_path, 'original_ply')
 
-        if not exists(self.pc_path):
-            print("creating dataset")
-            self.create_ply_files(self.cfg.dataset_path, self.label_to_names)
+        self.manifest = self.get_ply_manifest()
 
-        # TODO : if num of ply files < 272, then create.
+        # Rooms which are missing, e.g. after an interrupted conversion,
+        # are created if their annotations are available.
+        if len(self.manifest) < len(
+                self.get_annotation_paths(self.cfg.dataset_path)):
+            self.create_ply_files(self.cfg.dataset_path, self.label_to_names,
+                                  cfg.get('num_cpus', None))
+            self.manifest = self.get_ply_manifest()
 
-        self.all_files = glob.glob(
-            str(Path(self.cfg.dataset_path) / 'original_ply' / '*.ply'))
+        self.all_files = self.manifest.files()
+
+    def get_ply_manifest(self):
+        """Returns the manifest of the .ply files of the rooms."""
+        return self.get_manifest([self.pc_path],
+                                 path_fn=Manifest.ext_filter('.ply'),
+                                 label_fn=lambda path: True)
 
     @staticmethod
     def get_label_to_names():
@@ -338,44 +349,98 @@ class S3DIS(BaseDataset):
         return lines
 
     @staticmethod
-    def create_ply_files(dataset_path, class_names):
+    def get_annotation_paths(dataset_path):
+        """Returns the Annotations directories of all rooms."""
+        anno_file = str(
+            Path(abspath(__file__)).parent / '_resources' /
+            's3dis_annotation_paths.txt')
+        with open(anno_file) as f:
+            return [Path(dataset_path) / line.rstrip() for line in f]
+
+    @staticmethod
+    def read_object_txt(file):
+        """Reads the x, y, z, r, g, b columns of an annotated object.
+
+        The columns are separated by single spaces in the original files,
+        which is parsed much faster than arbitrary whitespace. Files which
+        do not follow this layout are parsed as whitespace separated.
+        """
+        try:
+            return pd.read_csv(file,
+                               header=None,
+                               sep=' ',
+                               usecols=range(6),
+                               dtype=np.float64,
+                               engine='c').values
+        except ValueError:
+            return pd.read_csv(file, header=None, sep=r'\s+').values[:, :6]
+
+    @staticmethod
+    def create_room_ply(job):
+        """Merges the annotated objects of a room into a .ply file.
+
+        Rooms which have already been converted are skipped. The file is
+        written to a temporary directory and then atomically moved, a .ply
+        file in original_ply is therefore always complete.
+        """
+        anno_path, save_path, label_to_idx = job
+        if exists(save_path):
+            return save_path
+
+        xyz, colors, labels = [], [], []
+        for file in sorted(glob.glob(str(anno_path / '*.txt'))):
+            class_name = Path(file).name.split('_')[0]
+            if class_name not in label_to_idx:
+                class_name = 'clutter'
+
+            pc = S3DIS.read_object_txt(file)
+            xyz.append(pc[:, :3].astype(np.float32))
+            colors.append(pc[:, 3:6].astype(np.uint8))
+            labels.append(
+                np.full((pc.shape[0],), label_to_idx[class_name], np.uint8))
+
+        tmp_path = join(dirname(save_path), '.tmp', Path(save_path).name)
+        os.makedirs(dirname(tmp_path), exist_ok=True)
+        S3DIS.write_ply(tmp_path, (np.concatenate(xyz), np.concatenate(colors),
+                                   np.concatenate(labels)),
+                        ['x', 'y', 'z', 'red', 'green', 'blue', 'class'])
+        os.replace(tmp_path, save_path)
+
+        return save_path
+
+    @staticmethod
+    def create_ply_files(dataset_path, class_names, num_cpus=None):
+        """Converts the annotated rooms to .ply files in original_ply.
+
+        Args:
+            dataset_path: The path to the dataset.
+            class_names: A dict of the label numbers and names.
+            num_cpus: The number of processes converting rooms in parallel,
+                defaults to the number of CPUs.
+        """
         os.makedirs(join(dataset_path, 'original_ply'), exist_ok=True)
-        anno_file = Path(abspath(
-            __file__)).parent / '_resources' / 's3dis_annotation_paths.txt'
-        print(anno_file)
-        anno_file = str(anno_file)
-        anno_paths = [line.rstrip() for line in open(anno_file)]
-        anno_paths = [Path(dataset_path) / p for p in anno_paths]
+        anno_paths = S3DIS.get_annotation_paths(dataset_path)
 
         class_names = [val for key, val in class_names.items()]
         label_to_idx = {l: i for i, l in enumerate(class_names)}
 
         out_format = '.ply'  # TODO : Use from config.
 
-        for anno_path in tqdm(anno_paths):
+        jobs = []
+        for anno_path in anno_paths:
             elems = str(anno_path).split('/')
             save_path = elems[-3] + '_' + elems[-2] + out_format
-            save_path = Path(dataset_path) / 'original_ply' / save_path
-
-            data_list = []
-            for file in glob.glob(str(anno_path / '*.txt')):
-                class_name = Path(file).name.split('_')[0]
-                if class_name not in class_names:
-                    class_name = 'clutter'
+            save_path = str(Path(dataset_path) / 'original_ply' / save_path)
+            if not exists(save_path) and exists(anno_path):
+                jobs.append((anno_path, save_path, label_to_idx))
+        if len(jobs) == 0:
+            return
 
-                pc = pd.read_csv(file, header=None,
-                                 delim_whitespace=True).values
-                labels = np.ones((pc.shape[0], 1)) * label_to_idx[class_name]
-                data_list.append(np.concatenate([pc, labels], 1))
-
-            pc_label = np.concatenate(data_list, 0)
-
-            xyz = pc_label[:, :3].astype(np.float32)
-            colors = pc_label[:, 3:6].astype(np.uint8)
-            labels = pc_label[:, 6].astype(np.uint8)
-
-            S3DIS.write_ply(str(save_path), (xyz, colors, labels),
-                            ['x', 'y', 'z', 'red', 'green', 'blue', 'class'])
+        print("creating dataset")
+        with Pool(num_cpus) as p:
+            for _ in tqdm(p.imap_unordered(S3DIS.create_room_ply, jobs),
+                          total=len(jobs)):
+                pass
 
 
 class S3DISSplit():
@@ -407,19 +472,11 @@ class S3DISSplit():
 
     def get_data(self, idx):
         pc_path = self.path_list[idx]
-        data = PlyData.read(pc_path)['vertex']
-
-        points = np.zeros((data['x'].shape[0], 3), dtype=np.float32)
-        points[:, 0] = data['x']
-        points[:, 1] = data['y']
-        points[:, 2] = data['z']
-
-        feat = np.zeros(points.shape, dtype=np.float32)
-        feat[:, 0] = data['red']
-        feat[:, 1] = data['green']
-        feat[:, 2] = data['blue']
+        data = read_ply(pc_path, mmap=True)
 
-        labels = np.array(data['class'], dtype=np.int32).reshape((-1,))
+        points = np.array(ply_xyz(data), dtype=np.float32)
+        feat = np.array(ply_rgb(data), dtype=np.float32)
+        labels = np.array(ply_columns(data, 'class'), dtype=np.int32)
 
         data = {'point': points, 'feat': feat, 'label': labels}
 
@@ -8,7 +8,7 @@ from plyfile import PlyData, PlyElement
 from sklearn.neighbors import KDTree
 import logging
 
-from .utils import DataProcessing as DP
+from .utils import DataProcessing as DP, Manifest
 from .base_dataset import BaseDataset, BaseDatasetSplit
 from ..utils import make_dir, DATASET
 
@@ -78,15 +78,26 @@ class Semantic3D(BaseDataset):
         self.label_to_idx = {l: i for i, l in enumerate(self.label_values)}
         self.ignored_labels = np.array([0])
 
-        self.all_files = glob.glob(str(Path(self.cfg.dataset_path) / '*.txt'))
-
-        self.train_files = [
-            f for f in self.all_files if exists(
-                str(Path(f).parent / Path(f).name.replace('.txt', '.labels')))
-        ]
-        self.test_files = [
-            f for f in self.all_files if f not in self.train_files
-        ]
+        # Clouds are identified by the path of their .txt file, which may
+        # only exist in its binary form, e.g. as written by
+        # scripts/preprocess_semantic3d.py.
+        def cloud_path(d, name):
+            if name.endswith('.txt'):
+                return join(d, name)
+            if name.endswith('.npy') and not name.endswith('.labels.npy'):
+                return join(d, name[:-len('.npy')] + '.txt')
+            return None
+
+        def has_label(path):
+            return exists(path[:-len('.txt')] + '.labels') or exists(
+                self.get_binary_paths(path)[1])
+
+        self.manifest = self.get_manifest([self.cfg.dataset_path],
+                                          path_fn=cloud_path,
+                                          label_fn=has_label)
+        self.all_files = self.manifest.files()
+        self.train_files = self.manifest.files(mask=self.manifest.has_label)
+        self.test_files = self.manifest.files(mask=~self.manifest.has_label)
 
         self.train_files = np.sort(self.train_files)
         self.test_files = np.sort(self.test_files)
@@ -123,6 +134,40 @@ class Semantic3D(BaseDataset):
         }
         return label_to_names
 
+    @staticmethod
+    def get_binary_paths(pc_path):
+        """Returns the paths of the binary point cloud and label files.
+
+        Args:
+            pc_path: Path of the .txt point cloud.
+
+        Returns:
+            The paths of the .npy files of the points and the labels.
+        """
+        base = pc_path[:-len('.txt')]
+        return base + '.npy', base + '.labels.npy'
+
+    def ingest(self, overwrite=False):
+        """Converts the text files of the dataset to binary .npy files.
+
+        The .npy files are written next to the .txt and .labels files and
+        are used by the dataset splits automatically, which memory map them
+        instead of parsing the text on every read. This only has to be done
+        once.
+
+        Args:
+            overwrite: Convert files that already have a binary version.
+        """
+        for pc_path in self.all_files:
+            npy_path, label_path = self.get_binary_paths(pc_path)
+            if exists(pc_path) and (overwrite or not exists(npy_path)):
+                log.info("Converting {}".format(pc_path))
+                DP.text_to_npy(pc_path, npy_path, dtype=np.float32)
+
+            txt_label_path = pc_path.replace('.txt', '.labels')
+            if exists(txt_label_path) and (overwrite or not exists(label_path)):
+                DP.text_to_npy(txt_label_path, label_path, dtype=np.int32)
+
     def get_split(self, split):
         return Semantic3DSplit(self, split=split)
         """Returns a dataset split.
@@ -156,7 +201,8 @@ class Semantic3D(BaseDataset):
         elif split in ['val', 'validation']:
             files = self.val_files
         elif split in ['all']:
-            files = self.val_files + self.train_files + self.test_files
+            files = list(self.val_files) + list(self.train_files) + list(
+                self.test_files)
         else:
             raise ValueError("Invalid split {}".format(split))
         return files
@@ -234,24 +280,25 @@ class Semantic3DSplit():
         pc_path = self.path_list[idx]
         log.debug("get_data called {}".format(pc_path))
 
-        pc = pd.read_csv(pc_path,
-                         header=None,
-                         delim_whitespace=True,
-                         dtype=np.float32).values
-
-        points = pc[:, 0:3]
-        feat = pc[:, [4, 5, 6]]
-        intensity = pc[:, 3]
+        npy_path, label_path = Semantic3D.get_binary_paths(pc_path)
+        if exists(npy_path):
+            pc = np.load(npy_path, mmap_mode='r')
+        else:
+            pc = pd.read_csv(pc_path, header=None, sep=r'\s+',
+                             dtype=np.float32).values
 
-        points = np.array(points, dtype=np.float32)
-        feat = np.array(feat, dtype=np.float32)
-        intensity = np.array(intensity, dtype=np.float32)
+        points = np.array(pc[:, 0:3], dtype=np.float32)
+        feat = np.array(pc[:, [4, 5, 6]], dtype=np.float32)
+        intensity = np.array(pc[:, 3], dtype=np.float32)
 
         if (self.split != 'test'):
-            labels = pd.read_csv(pc_path.replace(".txt", ".labels"),
-                                 header=None,
-                                 delim_whitespace=True,
-                                 dtype=np.int32).values
+            if exists(label_path):
+                labels = np.load(label_path, mmap_mode='r')
+            else:
+                labels = pd.read_csv(pc_path.replace(".txt", ".labels"),
+                                     header=None,
+                                     sep=r'\s+',
+                                     dtype=np.int32).values
             labels = np.array(labels, dtype=np.int32).reshape((-1,))
         else:
             labels = np.zeros((points.shape[0],), dtype=np.int32)
@@ -7,7 +7,7 @@ from sklearn.neighbors import KDTree
 import yaml
 
 from .base_dataset import BaseDataset, BaseDatasetSplit
-from .utils import DataProcessing
+from .utils import DataProcessing, Manifest
 from ..utils import make_dir, DATASET
 
 logging.basicConfig(
@@ -101,6 +101,18 @@ class SemanticKITTI(BaseDataset):
         self.remap_lut_val = remap_lut_val
         self.remap_lut = remap_lut
 
+        seqs = sorted(
+            set(cfg.training_split + cfg.validation_split + cfg.test_split +
+                cfg.all_split))
+        self.manifest = self.get_manifest(
+            [self.get_sequence_dir(seq_id) for seq_id in seqs],
+            label_fn=Manifest.sibling_label_fn('labels', '.label'))
+
+    def get_sequence_dir(self, seq_id):
+        """Returns the directory of the point clouds of a sequence."""
+        return join(self.cfg.dataset_path, 'dataset', 'sequences', seq_id,
+                    'velodyne')
+
     @staticmethod
     def get_label_to_names():
         """
@@ -247,14 +259,9 @@ class SemanticKITTI(BaseDataset):
             raise ValueError("Invalid split {}".format(split))
 
         for seq_id in seq_list:
-            pc_path = join(dataset_path, 'dataset', 'sequences', seq_id,
-                           'velodyne')
-            file_list.append(
-                [join(pc_path, f) for f in np.sort(os.listdir(pc_path))])
-
-        file_list = np.concatenate(file_list, axis=0)
+            file_list.extend(self.manifest.files(self.get_sequence_dir(seq_id)))
 
-        return file_list
+        return np.array(file_list)
 
 
 class SemanticKITTISplit(BaseDatasetSplit):
@@ -57,15 +57,21 @@ class ShapeNet(BaseDataset):
                 ls = line.strip().split()
                 self.cat[idx] = ls[1]
 
+        dir_points = [
+            os.path.join(self.dataset_path, self.cat[item], 'points')
+            for item in self.cat
+        ]
+        self.manifest = self.get_manifest(
+            dir_points,
+            path_fn=lambda d, name: join(d,
+                                         os.path.splitext(name)[0] + '.pts'))
+
         self.meta = {}
-        for item in self.cat:
+        for item, dir_point in zip(self.cat, dir_points):
             self.meta[item] = []
-            dir_point = os.path.join(self.dataset_path, self.cat[item],
-                                     'points')
             dir_seg = os.path.join(self.dataset_path, self.cat[item],
                                    'points_label')
-            fns = sorted(os.listdir(dir_point))
-            for fn in fns:
+            for fn in self.manifest.files(dir_point):
                 token = (os.path.splitext(os.path.basename(fn))[0])
                 self.meta[item].append(
                     (join(dir_point,
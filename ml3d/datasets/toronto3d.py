@@ -10,6 +10,7 @@ import logging
 
 from .base_dataset import BaseDataset, BaseDatasetSplit
 from ..utils import make_dir, DATASET
+from ..utils.ply import read_ply, ply_xyz, ply_rgb, ply_columns
 
 logging.basicConfig(
     level=logging.INFO,
@@ -208,18 +209,18 @@ class Toronto3DSplit(BaseDatasetSplit):
         pc_path = self.path_list[idx]
         log.debug("get_data called {}".format(pc_path))
 
-        data = PlyData.read(pc_path)['vertex']
-        points = np.vstack(
-            (data['x'], data['y'], data['z'])).astype(np.float64).T
-        points = points - self.UTM_OFFSET
-        points = np.float32(points)
+        data = read_ply(pc_path, mmap=True)
 
-        feat = np.zeros(points.shape, dtype=np.float32)
-        feat[:, 0] = data['red']
-        feat[:, 1] = data['green']
-        feat[:, 2] = data['blue']
+        # The offset is subtracted in double precision, but without a double
+        # precision copy of the points.
+        points = np.empty((len(data), 3), dtype=np.float32)
+        np.subtract(ply_xyz(data),
+                    np.array(self.UTM_OFFSET, dtype=np.float64),
+                    out=points,
+                    casting='unsafe')
 
-        labels = np.array(data['scalar_Label'], dtype=np.int32)
+        feat = np.array(ply_rgb(data), dtype=np.float32)
+        labels = np.array(ply_columns(data, 'scalar_Label'), dtype=np.int32)
 
         data = {'point': points, 'feat': feat, 'label': labels}
 
@@ -1,9 +1,13 @@
 from .dataprocessing import DataProcessing
 from .transforms import trans_normalize, trans_augment, trans_crop_pc, ObjdetAugmentation
 from .operations import create_3D_rotations
-from .bev_box import BEVBox3D
+from .bev_box import BEVBox3D, BoxArray
+from .gt_database import GTDatabase
+from .manifest import Manifest
+from .frame_infos import FrameInfos
 
 __all__ = [
     'DataProcessing', 'trans_normalize', 'create_3D_rotations', 'trans_augment',
-    'trans_crop_pc', 'BEVBox3D'
+    'trans_crop_pc', 'BEVBox3D', 'BoxArray', 'GTDatabase', 'Manifest',
+    'FrameInfos'
 ]
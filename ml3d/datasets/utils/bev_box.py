@@ -1,4 +1,5 @@
 from ...vis import BoundingBox3D
+import copy
 import numpy as np
 
 
@@ -149,8 +150,11 @@ class BEVBox3D(BoundingBox3D):
         Convert data for evaluation:
 
         Args:
-            bboxes: List of BEVBox3D bboxes.
+            bboxes: List of BEVBox3D bboxes or a BoxArray.
         """
+        if isinstance(bboxes, BoxArray):
+            return bboxes.to_dicts()
+
         box_dicts = {
             'bbox': np.empty((len(bboxes), 7)),
             'label': np.empty((len(bboxes),), dtype='<U20'),
@@ -164,3 +168,426 @@ class BEVBox3D(BoundingBox3D):
                 box_dicts[k][i] = box_dict[k]
 
         return box_dicts
+
+    @staticmethod
+    def to_arrays(bboxes):
+        """
+        Convert boxes to arrays for training.
+
+        Args:
+            bboxes: List of BEVBox3D bboxes or a BoxArray.
+
+        Returns:
+            The boxes in the common 7-sized vector representation (N, 7) and
+            their label classes (N,).
+        """
+        if isinstance(bboxes, BoxArray):
+            return bboxes.to_xyzwhlr().astype(np.float32), bboxes.label_class
+
+        n = len(bboxes)
+        center = np.array([bb.center for bb in bboxes],
+                          dtype=np.float32).reshape(n, 3)
+        size = np.array([bb.size for bb in bboxes],
+                        dtype=np.float32).reshape(n, 3)
+        yaw = np.array([bb.yaw for bb in bboxes], dtype=np.float32)
+        label_class = np.array([bb.label_class for bb in bboxes])
+
+        xyzwhlr = np.empty((n, 7), dtype=np.float32)
+        xyzwhlr[:, 0:3] = center
+        xyzwhlr[:, 2] -= size[:, 1] / 2
+        xyzwhlr[:, 3:6] = size[:, [0, 2, 1]]
+        xyzwhlr[:, 6] = yaw
+
+        return xyzwhlr, label_class
+
+
+class BoxArray(object):
+    """Array-backed set of BEV boxes, stored as a struct of arrays.
+
+    A BoxArray holds the same information as a list of BEVBox3D, one array
+    per attribute, and converts all boxes at once. It can be used wherever
+    a list of BEVBox3D is expected: indexing with an integer or iterating
+    materializes BEVBox3D objects (e.g. for the visualizer), while slices,
+    masks and index arrays return a BoxArray.
+
+    Conventions follow BEVBox3D: center is the center of the box, size is
+    (width, height, depth) with the height along z.
+    """
+
+    def __init__(self,
+                 center,
+                 size,
+                 yaw,
+                 label_class,
+                 confidence=None,
+                 level=None,
+                 world_cam=None,
+                 cam_img=None,
+                 yaw_offset=0.0):
+        """
+        Initialize
+
+        Args:
+            center: Box centers (N, 3).
+            size: Box sizes (N, 3) as (width, height, depth).
+            yaw: Yaw angles (N,).
+            label_class: Label classes (N,).
+            confidence: Confidences (N,), defaults to -1.
+            level: Difficulty levels (N,). If None, it is computed from the
+                camera projection like BEVBox3D.get_difficulty on first use.
+            world_cam: World to camera transformation, either shared by all
+                boxes (4, 4) or per box (N, 4, 4).
+            cam_img: Camera to image transformation, (4, 4) or (N, 4, 4).
+            yaw_offset: Offset added to the yaw for the heading of
+                materialized boxes, scalar or (N,). Datasets whose labels
+                point backwards use -pi.
+
+        Returns:
+            class: The corresponding class.
+        """
+        self.center = np.asarray(center, dtype=np.float32).reshape(-1, 3)
+        n = len(self.center)
+        self.size = np.asarray(size, dtype=np.float64).reshape(n, 3)
+        self.yaw = np.asarray(yaw, dtype=np.float64).reshape(n)
+        self.label_class = np.asarray(label_class).reshape(n)
+        if n == 0:
+            self.label_class = self.label_class.astype('<U20')
+        if confidence is None:
+            confidence = np.full((n,), -1.0)
+        self.confidence = np.asarray(confidence, dtype=np.float64).reshape(n)
+        self._level = None if level is None else np.asarray(level).reshape(n)
+        self.world_cam = None if world_cam is None else np.asarray(world_cam)
+        self.cam_img = None if cam_img is None else np.asarray(cam_img)
+        self.yaw_offset = yaw_offset
+
+    @classmethod
+    def from_boxes(cls, bboxes):
+        """Create a BoxArray from a list of BEVBox3D.
+
+        The calibration is kept if all boxes have one, shared if it is the
+        same for all boxes and per box otherwise.
+        """
+        if isinstance(bboxes, BoxArray):
+            return bboxes
+
+        n = len(bboxes)
+        center = np.array([bb.center for bb in bboxes],
+                          dtype=np.float32).reshape(n, 3)
+        size = np.array([bb.size for bb in bboxes], dtype=np.float64)
+        yaw = np.array([bb.yaw for bb in bboxes], dtype=np.float64)
+        front = np.array([bb.front for bb in bboxes],
+                         dtype=np.float64).reshape(n, 3)
+
+        return cls(center,
+                   size,
+                   yaw, [bb.label_class for bb in bboxes],
+                   [bb.confidence for bb in bboxes],
+                   [bb.level for bb in bboxes],
+                   cls._merge_calib([bb.world_cam for bb in bboxes]),
+                   cls._merge_calib([bb.cam_img for bb in bboxes]),
+                   yaw_offset=np.arctan2(front[:, 0], front[:, 1]) - yaw)
+
+    @classmethod
+    def from_xyzwhlr(cls,
+                     xyzwhlr,
+                     label_class,
+                     confidence=None,
+                     world_cam=None,
+                     cam_img=None):
+        """Create a BoxArray from boxes in the common 7-sized vector
+        representation (N, 7), see BEVBox3D.to_xyzwhlr.
+        """
+        xyzwhlr = np.asarray(xyzwhlr).reshape(-1, 7)
+        size = xyzwhlr[:, [3, 5, 4]]
+        center = xyzwhlr[:, 0:3] + np.stack(
+            [np.zeros(len(size)),
+             np.zeros(len(size)), size[:, 1] / 2], 1)
+
+        return cls(center, size, xyzwhlr[:, 6], label_class, confidence, None,
+                   world_cam, cam_img)
+
+    @classmethod
+    def from_kitti_format(cls, lines, calib, class_names=None):
+        """Create a BoxArray from KITTI label lines.
+
+        Args:
+            lines: Lines of a KITTI label file.
+            calib: Calibration with 'world_cam' and 'cam_img'.
+            class_names: Known class names. Other classes are renamed to
+                'DontCare'.
+        """
+        labels = [line.strip().split(' ') for line in lines if line.strip()]
+        n = len(labels)
+        # ground truth lines have 14 values, detections add a score
+        values = np.array([l[1:16] for l in labels], dtype=np.float64).reshape(
+            n, -1) if n > 0 else np.zeros((0, 14))
+        names = np.array([l[0] for l in labels], dtype='<U20')
+        if class_names is not None:
+            names[~np.isin(names, list(class_names))] = 'DontCare'
+
+        world_cam = calib['world_cam']
+        cam_img = calib['cam_img']
+
+        # hwl in camera, w,h,l for the boxes
+        size = values[:, [8, 7, 9]]
+        location = np.concatenate([values[:, 10:13], np.ones((n, 1))], 1)
+        center = (location @ np.linalg.inv(world_cam))[:, :3]
+        center[:, 2] += size[:, 1] / 2
+
+        confidence = values[:, 14] if values.shape[1] == 15 else None
+
+        # difficulty from the 2D box height, truncation and occlusion
+        height = values[:, 6] - values[:, 4] + 1
+        truncation = values[:, 0]
+        occlusion = values[:, 1]
+        level = np.full((n,), -1, dtype=np.int64)
+        level[(height >= 25) & (truncation <= 0.5) & (occlusion <= 2)] = 2
+        level[(height >= 25) & (truncation <= 0.3) & (occlusion <= 1)] = 1
+        level[(height >= 40) & (truncation <= 0.15) & (occlusion <= 0)] = 0
+
+        # kitti boxes are pointing backwards
+        return cls(center,
+                   size,
+                   values[:, 13],
+                   names,
+                   confidence,
+                   level,
+                   world_cam,
+                   cam_img,
+                   yaw_offset=-np.pi)
+
+    @staticmethod
+    def concatenate(box_arrays):
+        """Concatenate BoxArrays or lists of BEVBox3D into a BoxArray.
+
+        The calibration is kept only if all parts have one.
+        """
+        box_arrays = [BoxArray.from_boxes(b) for b in box_arrays]
+        n = [len(b) for b in box_arrays]
+
+        def calib(name):
+            mats = [getattr(b, name) for b in box_arrays]
+            if len(mats) == 0 or any(m is None for m in mats):
+                return None
+            if all(m.ndim == 2 and np.array_equal(m, mats[0]) for m in mats):
+                return mats[0]
+            return np.concatenate(
+                [np.broadcast_to(m, (k, 4, 4)) for m, k in zip(mats, n)])
+
+        def cat(name):
+            return np.concatenate([getattr(b, name) for b in box_arrays])
+
+        return BoxArray(cat('center'),
+                        cat('size'),
+                        cat('yaw'),
+                        cat('label_class'),
+                        cat('confidence'),
+                        cat('level'),
+                        calib('world_cam'),
+                        calib('cam_img'),
+                        yaw_offset=np.concatenate([
+                            np.broadcast_to(b.yaw_offset, (k,))
+                            for b, k in zip(box_arrays, n)
+                        ]))
+
+    @staticmethod
+    def _merge_calib(mats):
+        if len(mats) == 0 or any(m is None for m in mats):
+            return None
+        if all(m is mats[0] for m in mats):
+            return mats[0]
+        return np.stack(mats)
+
+    def __len__(self):
+        return len(self.center)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self._box(idx)
+
+        def take(m):
+            if m is None or np.ndim(m) < 3:
+                return m
+            return m[idx]
+
+        yaw_offset = self.yaw_offset
+        if np.ndim(yaw_offset) > 0:
+            yaw_offset = yaw_offset[idx]
+
+        return BoxArray(self.center[idx], self.size[idx], self.yaw[idx],
+                        self.label_class[idx], self.confidence[idx],
+                        None if self._level is None else self._level[idx],
+                        take(self.world_cam), take(self.cam_img), yaw_offset)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._box(i)
+
+    def __add__(self, other):
+        return BoxArray.concatenate([self, other])
+
+    def __radd__(self, other):
+        return BoxArray.concatenate([other, self])
+
+    def __repr__(self):
+        return 'BoxArray({} boxes)'.format(len(self))
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def _calib(self, mat, i):
+        if mat is None or mat.ndim == 2:
+            return mat
+        return mat[i]
+
+    def _box(self, i):
+        """Materialize a single BEVBox3D."""
+        if i < 0:
+            i += len(self)
+        yaw_offset = self.yaw_offset
+        if np.ndim(yaw_offset) > 0:
+            yaw_offset = yaw_offset[i]
+
+        box = BEVBox3D(self.center[i], self.size[i],
+                       float(self.yaw[i] + yaw_offset), self.label_class[i],
+                       float(self.confidence[i]),
+                       self._calib(self.world_cam, i),
+                       self._calib(self.cam_img, i))
+        box.yaw = float(self.yaw[i])
+        box.level = self.level[i]
+        return box
+
+    def to_boxes(self):
+        """Materialize all boxes as a list of BEVBox3D."""
+        return list(self)
+
+    @property
+    def level(self):
+        if self._level is None:
+            self._level = self.get_difficulty()
+        return self._level
+
+    @staticmethod
+    def _transform(points, mat):
+        """Apply a (4, 4) or per point (N, 4, 4) row-vector transform."""
+        points = np.concatenate([points, np.ones((len(points), 1))], axis=-1)
+        if mat.ndim == 2:
+            return points @ mat
+        return np.einsum('ni,nij->nj', points, mat)
+
+    def to_xyzwhlr(self):
+        """
+        Returns boxes in the common 7-sized vector representation.
+        :return boxes: (N, 7)
+        """
+        bbox = np.empty((len(self), 7))
+        bbox[:, 0:3] = self.center
+        bbox[:, 2] -= self.size[:, 1] / 2
+        bbox[:, 3:6] = self.size[:, [0, 2, 1]]
+        bbox[:, 6] = self.yaw
+        return bbox
+
+    def to_camera(self):
+        """
+        Transforms boxes into camera space.
+        :return transformed boxes: (N, 7)
+        """
+        if self.world_cam is None:
+            return self.to_xyzwhlr()[:, [1, 2, 0, 4, 5, 3, 6]]
+
+        bbox = np.empty((len(self), 7))
+        bottom = self.center - np.stack(
+            [np.zeros(len(self)),
+             np.zeros(len(self)), self.size[:, 1] / 2], 1)
+        bbox[:, 0:3] = self._transform(bottom, self.world_cam)[:, :3]
+        bbox[:, 3:6] = self.size[:, 2::-1]
+        bbox[:, 6] = self.yaw
+        return bbox
+
+    def generate_corners3d(self):
+        """
+        generate corners3d representation for these objects
+        :return corners_3d: (N, 8, 3) corners of box3d in camera coord
+        """
+        l, h, w = self.size[:, 2], self.size[:, 1], self.size[:, 0]
+        x_corners = np.stack([l, l, -l, -l, l, l, -l, -l], 1) / 2
+        y_corners = np.stack([np.zeros_like(h)] * 4 + [-h] * 4, 1)
+        z_corners = np.stack([w, -w, -w, w, w, -w, -w, w], 1) / 2
+
+        cos, sin = np.cos(self.yaw)[:, None], np.sin(self.yaw)[:, None]
+        corners3d = np.stack([
+            cos * x_corners + sin * z_corners, y_corners,
+            -sin * x_corners + cos * z_corners
+        ], -1)
+        return corners3d + self.to_camera()[:, None, :3]
+
+    def to_img(self):
+        """
+        Transforms boxes into 2d boxes.
+        :return transformed boxes: (N, 4)
+        """
+        if self.cam_img is None:
+            return None
+
+        corners = self.generate_corners3d()
+        n = len(self)
+        corners = np.concatenate([corners, np.ones((n, 8, 1))], axis=-1)
+        if self.cam_img.ndim == 2:
+            bbox_img = corners @ self.cam_img
+        else:
+            bbox_img = np.einsum('nki,nij->nkj', corners, self.cam_img)
+        bbox_img = bbox_img[..., :2] / bbox_img[..., 2:3]
+
+        minxy = np.min(bbox_img, axis=1)
+        maxxy = np.max(bbox_img, axis=1)
+
+        size = maxxy - minxy
+        center = minxy + size / 2
+
+        return np.concatenate([center, size], axis=-1)
+
+    def get_difficulty(self):
+        """
+        Difficulty depending on projected height of boxes, see
+        BEVBox3D.get_difficulty.
+        """
+        if self.cam_img is None:
+            return np.zeros((len(self),), dtype=np.int64)
+
+        height = self.to_img()[:, 3]
+        return np.where(height > 40, 0, np.where(height > 25, 1, -1))
+
+    def to_dicts(self):
+        """
+        Convert data for evaluation, see BEVBox3D.to_dicts.
+        """
+        return {
+            'bbox': self.to_camera(),
+            'label': self.label_class.astype('<U20'),
+            'score': self.confidence.copy(),
+            'difficulty': self.level.astype(np.float64)
+        }
+
+    def to_kitti_format(self):
+        """
+        Convert boxes to KITTI label lines, with the 2D boxes projected
+        from the 3D boxes.
+        """
+        cam = self.to_camera()
+        img = self.to_img()
+        if img is None:
+            box2d = np.full((len(self), 4), -1.0)
+        else:
+            box2d = np.concatenate(
+                [img[:, :2] - img[:, 2:] / 2, img[:, :2] + img[:, 2:] / 2],
+                axis=-1)
+        alpha = cam[:, 6] - np.arctan2(cam[:, 0], cam[:, 2])
+
+        lines = []
+        for i in range(len(self)):
+            lines.append(
+                '%s -1 -1 %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.2f %.4f'
+                % (self.label_class[i], alpha[i], *box2d[i], self.size[i, 1],
+                   self.size[i, 0], self.size[i, 2], *cam[i, :3], cam[i, 6],
+                   self.confidence[i]))
+        return lines
@@ -1,5 +1,6 @@
 import numpy as np
-import os, argparse, pickle, sys
+import pandas as pd
+import os, io, argparse, pickle, sys
 import open3d.core as o3c
 
 from os.path import exists, join, isfile, dirname, abspath, split
@@ -64,6 +65,115 @@ class DataProcessing:
         cloud_labels = label_pd.values
         return cloud_labels
 
+    @staticmethod
+    def count_lines(filename, block_size=1 << 24):
+        """Count the lines of a text file without parsing it."""
+        num_lines = 0
+        last = b'\n'
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                num_lines += block.count(b'\n')
+                last = block[-1:]
+
+        return num_lines + (last != b'\n')
+
+    @staticmethod
+    def text_to_npy(txt_path, npy_path, dtype=np.float32, chunk_size=1000000):
+        """Convert a whitespace separated text file to a .npy file.
+
+        The text is parsed in chunks which are written to a memory mapped
+        .npy file, so the memory used does not depend on the size of the
+        file. The output is written to a temporary file which is then
+        atomically renamed, an existing .npy file is therefore always
+        complete and can be loaded with np.load(npy_path, mmap_mode='r').
+
+        Args:
+            txt_path: Path of the text file, one row per line.
+            npy_path: Path of the .npy file to write. A single column is
+                stored as an array of shape (N,), otherwise (N, C).
+            dtype: Data type of the output.
+            chunk_size: Number of lines parsed at once.
+
+        Returns:
+            The number of rows written.
+        """
+        # an upper bound, blank lines are counted but skipped by the parser
+        num_lines = DataProcessing.count_lines(txt_path)
+        try:
+            reader = pd.read_csv(txt_path,
+                                 header=None,
+                                 sep=r'\s+',
+                                 dtype=dtype,
+                                 chunksize=chunk_size)
+        except pd.errors.EmptyDataError:
+            reader = []
+
+        tmp_path = '{}.{:d}.tmp.npy'.format(npy_path[:-4], os.getpid())
+        out = None
+        start = 0
+        for chunk in reader:
+            chunk = chunk.values
+            if out is None:
+                shape = (num_lines,) if chunk.shape[1] == 1 else (
+                    num_lines, chunk.shape[1])
+                out = np.lib.format.open_memmap(tmp_path,
+                                                mode='w+',
+                                                dtype=dtype,
+                                                shape=shape)
+            if start + len(chunk) > num_lines:
+                del out
+                os.remove(tmp_path)
+                raise ValueError(
+                    "Parsed more than {} rows from {} with {} lines.".format(
+                        start + len(chunk), txt_path, num_lines))
+            out[start:start + len(chunk)] = chunk.reshape((len(chunk),) +
+                                                          out.shape[1:])
+            start += len(chunk)
+
+        if out is None:
+            out = np.lib.format.open_memmap(tmp_path,
+                                            mode='w+',
+                                            dtype=dtype,
+                                            shape=(0,))
+        out.flush()
+        del out
+        if start < num_lines:
+            DataProcessing.truncate_npy(tmp_path, start)
+        os.replace(tmp_path, npy_path)
+
+        return start
+
+    @staticmethod
+    def truncate_npy(path, num_rows):
+        """Keep the first num_rows rows of a .npy file.
+
+        The header of the file is rewritten and the file truncated in place.
+        If the new header does not have the size of the old one, the rows
+        are copied to a new file instead.
+        """
+        arr = np.load(path, mmap_mode='r')
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            header, {
+                'descr': np.lib.format.dtype_to_descr(arr.dtype),
+                'fortran_order': False,
+                'shape': (num_rows,) + arr.shape[1:]
+            })
+        header = header.getvalue()
+        offset = arr.offset
+        size = offset + num_rows * arr[:1].nbytes
+        if len(header) != offset:
+            tmp_path = '{}.trunc.npy'.format(path[:-4])
+            np.save(tmp_path, arr[:num_rows])
+            del arr
+            os.replace(tmp_path, path)
+            return
+        del arr
+
+        with open(path, 'r+b') as f:
+            f.write(header)
+            f.truncate(size)
+
     @staticmethod
     def load_pc_kitti(pc_path):
         scan = np.fromfile(pc_path, dtype=np.float32)
@@ -166,8 +276,18 @@ class DataProcessing:
         return np.expand_dims(ce_label_weight, axis=0)
 
     @staticmethod
-    def remove_outside_points(points, world_cam, cam_img, image_shape):
+    def remove_outside_points(points,
+                              world_cam,
+                              cam_img,
+                              image_shape,
+                              near_clip=0.001,
+                              far_clip=100):
         """Remove points which are outside of image.
+
+        The points are projected to the image with world_cam @ cam_img and
+        kept if their depth is within the clipping range and their pixel is
+        inside the image.
+
         Args:
             points (np.ndarray, shape=[N, 3+dims]): Total points.
             world_cam (np.ndarray, shape=[4, 4]): Matrix to project points in
@@ -175,17 +295,20 @@ class DataProcessing:
             cam_img (p.array, shape=[4, 4]): Matrix to project points in
                 camera coordinates to image coordinates.
             image_shape (list[int]): Shape of image.
+            near_clip (float): Nearest depth of kept points.
+            far_clip (float): Farthest depth of kept points.
         Returns:
             np.ndarray, shape=[N, 3+dims]: Filtered points.
         """
-        C, R, T = projection_matrix_to_CRT_kitti(cam_img.T)
-        image_bbox = [0, 0, image_shape[1], image_shape[0]]
-        frustum = get_frustum(image_bbox, C)
-        frustum -= T
-        frustum = np.linalg.inv(R) @ frustum.T
-        frustum = camera_to_lidar(frustum.T, world_cam)
-        frustum_surfaces = corner_to_surfaces_3d(frustum[np.newaxis, ...])
-        indices = points_in_convex_polygon_3d(points[:, :3], frustum_surfaces)
-        points = points[indices.reshape([-1])]
+        world_img = np.asarray(world_cam, dtype=np.float64) @ cam_img
+        uvw = points[:, :3] @ world_img[:3, :3] + world_img[3, :3]
 
-        return points
+        depth = uvw[:, 2]
+        mask = (depth > near_clip) & (depth < far_clip)
+        uvw = uvw[mask]
+        u = uvw[:, 0] / uvw[:, 2]
+        v = uvw[:, 1] / uvw[:, 2]
+        mask[mask] = ((u >= 0) & (u <= image_shape[1]) & (v >= 0) &
+                      (v <= image_shape[0]))
+
+        return points[mask]
@@ -0,0 +1,92 @@
+import numpy as np
+import pickle
+from scipy.spatial.transform import Rotation as R
+
+
+class FrameInfos(object):
+    """Columnar frame infos of the NuScenes and Lyft info files.
+
+    The info files written by scripts/preprocess_nuscenes.py and
+    scripts/preprocess_lyft.py are lists of dicts, one per frame. Only the
+    columns used by the datasets are kept, as arrays:
+
+    - lidar_path: Paths of the point clouds (N,).
+    - world_cam: Lidar to ego transforms, transposed as expected by the
+      calib dicts of the datasets (N, 4, 4).
+    - gt_boxes, gt_names, num_lidar_pts: Ground truth boxes of all frames
+      (M, 7), (M,) and (M,), the boxes of frame i are
+      gt_boxes[box_offsets[i]:box_offsets[i + 1]].
+    """
+
+    def __init__(self, lidar_path, world_cam, gt_boxes, gt_names, num_lidar_pts,
+                 box_offsets):
+        """
+        Initialize
+
+        Args:
+            lidar_path: Paths of the point clouds (N,).
+            world_cam: Transposed lidar to ego transforms (N, 4, 4).
+            gt_boxes: Boxes of all frames (M, 7).
+            gt_names: Label names of the boxes (M,).
+            num_lidar_pts: Number of lidar points in the boxes (M,).
+            box_offsets: Offsets of the boxes of each frame (N + 1,).
+
+        Returns:
+            class: The corresponding class.
+        """
+        self.lidar_path = lidar_path
+        self.world_cam = world_cam
+        self.gt_boxes = gt_boxes
+        self.gt_names = gt_names
+        self.num_lidar_pts = num_lidar_pts
+        self.box_offsets = box_offsets
+
+    @classmethod
+    def from_infos(cls, infos):
+        """Convert a list of info dicts.
+
+        The transforms of all frames are computed at once. Frames without
+        ground truth, e.g. of the test split, have no boxes.
+        """
+        num_frames = len(infos)
+
+        world_cam = np.tile(np.eye(4), (num_frames, 1, 1))
+        if num_frames > 0:
+            world_cam[:, :3, :3] = R.from_quat(
+                np.array([info['lidar2ego_rot'] for info in infos
+                         ])).as_matrix()
+            world_cam[:, :3, 3] = [info['lidar2ego_tr'] for info in infos]
+        world_cam = np.ascontiguousarray(world_cam.transpose(0, 2, 1))
+
+        num_boxes = [len(info.get('gt_boxes', [])) for info in infos]
+        box_offsets = np.concatenate([[0],
+                                      np.cumsum(num_boxes)]).astype(np.int64)
+        labelled = [info for info in infos if len(info.get('gt_boxes', []))]
+
+        def cat(key, shape, dtype):
+            if len(labelled) == 0:
+                return np.zeros(shape, dtype=dtype)
+            return np.concatenate([np.asarray(info[key]) for info in labelled])
+
+        return cls(np.array([str(info['lidar_path']) for info in infos]),
+                   world_cam, cat('gt_boxes', (0, 7), np.float64),
+                   cat('gt_names', (0,), str),
+                   cat('num_lidar_pts', (0,), np.int64), box_offsets)
+
+    @classmethod
+    def load(cls, path):
+        """Load and convert a pickled info file."""
+        with open(path, 'rb') as f:
+            return cls.from_infos(pickle.load(f))
+
+    def __len__(self):
+        return len(self.lidar_path)
+
+    def get_boxes(self, idx):
+        """Ground truth of a frame as a dict like the info dicts."""
+        start, end = self.box_offsets[idx], self.box_offsets[idx + 1]
+        return {
+            'gt_boxes': self.gt_boxes[start:end],
+            'gt_names': self.gt_names[start:end],
+            'num_lidar_pts': self.num_lidar_pts[start:end]
+        }
@@ -0,0 +1,175 @@
+import numpy as np
+import pickle
+from os import makedirs
+from os.path import join, isdir
+
+from .bev_box import BoxArray
+from .operations import boxes_to_xyzwhlr, points_in_box_indices
+
+
+class GTDatabase(object):
+    """Packed database of ground truth boxes and the points inside them.
+
+    The database is stored as a directory of .npy files, one per column:
+
+    - boxes.npy: Boxes in the xyzwhlr representation (N, 7).
+    - labels.npy: Label classes (N,).
+    - offsets.npy: Offsets of the points of each box in points.npy (N + 1,).
+    - points.npy: Points of all boxes, stored contiguously (M, C).
+
+    The files are memory mapped, so sampling only reads the pages of the
+    sampled boxes and all DataLoader workers share them through the page
+    cache.
+    """
+
+    def __init__(self, boxes, label_class, points, offsets):
+        """
+        Initialize
+
+        Args:
+            boxes: Boxes in the xyzwhlr representation (N, 7).
+            label_class: Label classes (N,).
+            points: Points of all boxes (M, C).
+            offsets: Offsets of the points of each box (N + 1,), the points
+                of box i are points[offsets[i]:offsets[i + 1]].
+
+        Returns:
+            class: The corresponding class.
+        """
+        self.boxes = boxes
+        self.label_class = label_class
+        self.points = points
+        self.offsets = offsets
+        self.class_indices = {}
+
+    @classmethod
+    def from_boxes(cls, bboxes):
+        """Pack a list of BEVBox3D with points_inside_box set."""
+        points = [box.points_inside_box for box in bboxes]
+        num_points = [len(p) for p in points]
+        dim = points[0].shape[1] if len(points) else 4
+
+        return cls(
+            BoxArray.from_boxes(bboxes).to_xyzwhlr().astype(np.float32),
+            np.array([box.label_class for box in bboxes]),
+            np.concatenate(points, axis=0).astype(np.float32)
+            if len(points) else np.zeros((0, dim), dtype=np.float32),
+            np.concatenate([[0], np.cumsum(num_points)]).astype(np.int64))
+
+    @classmethod
+    def from_frame(cls, points, bboxes):
+        """Pack the boxes of a frame with the points inside them.
+
+        Args:
+            points: Points of the frame (N, C).
+            bboxes: Boxes of the frame, a BoxArray or a list of BEVBox3D.
+        """
+        xyzwhlr = boxes_to_xyzwhlr(bboxes).astype(np.float32)
+        if isinstance(bboxes, BoxArray):
+            label_class = bboxes.label_class
+        else:
+            label_class = np.array([box.label_class for box in bboxes])
+
+        if len(xyzwhlr) == 0:
+            return cls(xyzwhlr, label_class.astype(str),
+                       np.zeros((0, points.shape[1]), dtype=np.float32),
+                       np.zeros((1,), dtype=np.int64))
+
+        indices = points_in_box_indices(points, xyzwhlr)
+        num_points = [len(idx) for idx in indices]
+        points = points[np.concatenate(indices)].astype(np.float32)
+
+        return cls(
+            xyzwhlr, label_class, points,
+            np.concatenate([[0], np.cumsum(num_points)]).astype(np.int64))
+
+    @staticmethod
+    def concatenate(dbs):
+        """Concatenate databases, keeping their order."""
+        dbs = list(dbs)
+        offsets = [0]
+        for db in dbs:
+            offsets.append(offsets[-1] + len(db.points))
+
+        return GTDatabase(
+            np.concatenate([db.boxes for db in dbs]).reshape(-1, 7),
+            np.concatenate(
+                [np.asarray(db.label_class).astype(str) for db in dbs]),
+            np.concatenate([db.points for db in dbs]),
+            np.concatenate(
+                [[0]] +
+                [db.offsets[1:] + offset
+                 for db, offset in zip(dbs, offsets)]).astype(np.int64))
+
+    @classmethod
+    def load(cls, path):
+        """Load a database.
+
+        Args:
+            path: Directory of a packed database, or a pickled list of
+                BEVBox3D as written by earlier versions of
+                scripts/collect_bboxes.py.
+        """
+        if not isdir(path):
+            with open(path, 'rb') as f:
+                return cls.from_boxes(pickle.load(f))
+
+        return cls(*[
+            np.load(join(path, name + '.npy'), mmap_mode='r')
+            for name in ['boxes', 'labels', 'points', 'offsets']
+        ])
+
+    def save(self, path):
+        """Save the database as a directory of .npy files."""
+        makedirs(path, exist_ok=True)
+        for name, arr in zip(['boxes', 'labels', 'points', 'offsets'], [
+                self.boxes,
+                np.asarray(self.label_class).astype(str), self.points,
+                self.offsets
+        ]):
+            np.save(join(path, name + '.npy'), arr)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def num_points(self):
+        return np.diff(self.offsets)
+
+    def index_classes(self, class_names, min_points_dict=None):
+        """Build the index arrays of the boxes to sample for each class.
+
+        Args:
+            class_names: Classes to sample.
+            min_points_dict: Optional dict with the minimum number of points
+                per class; boxes with at most that many points are never
+                sampled.
+        """
+        label_class = np.asarray(self.label_class)
+        num_points = self.num_points
+        if min_points_dict is None:
+            min_points_dict = {}
+
+        self.class_indices = {}
+        for name in class_names:
+            mask = label_class == name
+            if name in min_points_dict:
+                mask &= num_points > min_points_dict[name]
+            self.class_indices[name] = np.nonzero(mask)[0]
+
+        return self.class_indices
+
+    def get_points(self, indices):
+        """Points of the boxes with the given indices, concatenated."""
+        if len(indices) == 0:
+            return np.zeros((0, self.points.shape[1]), dtype=np.float32)
+
+        return np.concatenate(
+            [self.points[self.offsets[i]:self.offsets[i + 1]] for i in indices],
+            axis=0)
+
+    def get_boxes(self, indices):
+        """Boxes with the given indices as a BoxArray."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return BoxArray.from_xyzwhlr(self.boxes[indices],
+                                     np.asarray(self.label_class[indices]))
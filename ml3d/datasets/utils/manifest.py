@@ -0,0 +1,262 @@
+import numpy as np
+import os
+from os.path import join, dirname, basename, splitext
+
+
+class Manifest(object):
+    """Index of the files of a dataset.
+
+    A manifest lists the items of a set of directories, sorted by path
+    within each directory, together with their sizes and whether they have
+    labels. The number of points and the per-class point histograms of the
+    items can be added once, see scripts/build_manifest.py.
+
+    The manifest is saved as a single .npz file. It is stale when the list
+    of directories or the modification time of one of them or of the label
+    directories checked by the label_fn changed, i.e. when files or labels
+    were added, removed or renamed.
+    """
+
+    def __init__(self,
+                 dirs,
+                 dir_mtimes,
+                 dir_offsets,
+                 paths,
+                 sizes,
+                 has_label,
+                 num_points=None,
+                 class_hist=None,
+                 label_dirs=(),
+                 label_mtimes=()):
+        """
+        Initialize
+
+        Args:
+            dirs: Scanned directories (D,).
+            dir_mtimes: Modification times of the directories in ns (D,), -1
+                for missing directories.
+            dir_offsets: Offsets of the items of each directory (D + 1,), the
+                items of dirs[i] are paths[dir_offsets[i]:dir_offsets[i + 1]].
+            paths: Paths of the items (N,).
+            sizes: Sizes of the items in bytes (N,).
+            has_label: Whether the items have labels (N,).
+            num_points: Optional number of points of the items (N,), -1 if
+                unknown.
+            class_hist: Optional number of points per class of the items
+                (N, C).
+            label_dirs: Label directories checked for has_label (L,).
+            label_mtimes: Modification times of the label directories in ns
+                (L,), -1 for missing directories.
+
+        Returns:
+            class: The corresponding class.
+        """
+        self.dirs = [str(d) for d in dirs]
+        self.dir_mtimes = np.asarray(dir_mtimes, dtype=np.int64)
+        self.dir_offsets = np.asarray(dir_offsets, dtype=np.int64)
+        self.paths = np.asarray(paths, dtype=str)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.has_label = np.asarray(has_label, dtype=bool)
+        self.num_points = np.full(
+            (len(self.paths),), -1,
+            dtype=np.int64) if num_points is None else np.asarray(
+                num_points, dtype=np.int64)
+        self.class_hist = np.zeros(
+            (len(self.paths),
+             0), dtype=np.int64) if class_hist is None else np.asarray(
+                 class_hist, dtype=np.int64)
+        self.label_dirs = [str(d) for d in label_dirs]
+        self.label_mtimes = np.asarray(label_mtimes, dtype=np.int64)
+        self._index = None
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return -1
+
+    @staticmethod
+    def listdir(path):
+        """Names of the files of a directory as a set, empty if it is
+        missing. Used to check for labels without a stat per file."""
+        try:
+            return set(os.listdir(path))
+        except FileNotFoundError:
+            return set()
+
+    @staticmethod
+    def ext_filter(ext):
+        """path_fn listing the files with the extension ext."""
+        return lambda d, name: d + os.sep + name if name.endswith(ext) else None
+
+    @classmethod
+    def sibling_label_fn(cls, label_dir, ext):
+        """label_fn checking for a label file with the name of the item and
+        the extension ext in the directory label_dir next to the directory of
+        the item, e.g. training/label_2 for training/velodyne.
+
+        The modification times of the label directories, taken before listing
+        them, are kept in the label_mtimes dict of the function."""
+        names = {}
+        label_mtimes = {}
+
+        def has_label(path):
+            d, name = path.rsplit(os.sep, 1)
+            if d not in names:
+                labels = join(dirname(d), label_dir)
+                label_mtimes[labels] = cls._mtime(labels)
+                names[d] = cls.listdir(labels)
+            return splitext(name)[0] + ext in names[d]
+
+        has_label.label_mtimes = label_mtimes
+        return has_label
+
+    @classmethod
+    def scan(cls, dirs, path_fn=None, label_fn=None, with_sizes=True):
+        """Scan directories.
+
+        Args:
+            dirs: Directories to scan, missing directories have no items.
+            path_fn: Optional function mapping a directory and a file name
+                to the path of the item, or to None to skip the file. Files
+                mapped to the same path are listed once, with the size of the
+                first one. Defaults to listing all files.
+            label_fn: Optional function returning whether the item with the
+                given path has labels. Defaults to False. The label
+                directories it checked are recorded from its label_mtimes
+                dict, see sibling_label_fn.
+            with_sizes: Get the sizes of the items, which needs a stat per
+                file. Otherwise the sizes are -1.
+        """
+        dirs = [str(d) for d in dirs]
+        dir_mtimes, dir_offsets, paths, sizes = [], [0], [], []
+        for d in dirs:
+            dir_mtimes.append(cls._mtime(d))
+            d = d.rstrip(os.sep) or os.sep
+            try:
+                entries = sorted(os.scandir(d), key=lambda e: e.name)
+            except FileNotFoundError:
+                entries = []
+
+            items = {}
+            for e in entries:
+                path = d + os.sep + e.name if path_fn is None else path_fn(
+                    d, e.name)
+                if path is not None and path not in items:
+                    items[path] = e.stat().st_size if with_sizes else -1
+            for path in sorted(items):
+                paths.append(path)
+                sizes.append(items[path])
+            dir_offsets.append(len(paths))
+
+        has_label = [False if label_fn is None else label_fn(p) for p in paths]
+        label_mtimes = getattr(label_fn, 'label_mtimes', {})
+
+        return cls(dirs,
+                   dir_mtimes,
+                   dir_offsets,
+                   paths,
+                   sizes,
+                   has_label,
+                   label_dirs=list(label_mtimes),
+                   label_mtimes=list(label_mtimes.values()))
+
+    def is_valid(self, dirs):
+        """Whether the manifest lists the current content of dirs."""
+        dirs = [str(d) for d in dirs]
+        return dirs == self.dirs and all(
+            self._mtime(d) == m for d, m in zip(
+                dirs + self.label_dirs,
+                np.concatenate([self.dir_mtimes, self.label_mtimes])))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['dirs'].tolist(), f['dir_mtimes'], f['dir_offsets'],
+                       f['paths'], f['sizes'], f['has_label'], f['num_points'],
+                       f['class_hist'], f['label_dirs'].tolist(),
+                       f['label_mtimes'])
+
+    def save(self, path):
+        """Save the manifest as a .npz file, atomically."""
+        tmp_path = '{}.{:d}.tmp.npz'.format(path[:-len('.npz')], os.getpid())
+        np.savez(tmp_path,
+                 dirs=np.asarray(self.dirs, dtype=str),
+                 dir_mtimes=self.dir_mtimes,
+                 dir_offsets=self.dir_offsets,
+                 paths=self.paths,
+                 sizes=self.sizes,
+                 has_label=self.has_label,
+                 num_points=self.num_points,
+                 class_hist=self.class_hist,
+                 label_dirs=np.asarray(self.label_dirs, dtype=str),
+                 label_mtimes=self.label_mtimes)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def index(self, path):
+        """Row of the item with the given path."""
+        if self._index is None:
+            self._index = {p: i for i, p in enumerate(self.paths.tolist())}
+        return self._index[path]
+
+    def files(self, dir=None, mask=None):
+        """Paths of the items as a list.
+
+        Args:
+            dir: Optional directory to list, one of dirs. Defaults to all
+                directories.
+            mask: Optional boolean mask over all items, e.g. has_label.
+        """
+        if dir is None:
+            start, end = 0, len(self.paths)
+        else:
+            i = self.dirs.index(str(dir))
+            start, end = self.dir_offsets[i], self.dir_offsets[i + 1]
+
+        paths = self.paths[start:end]
+        if mask is not None:
+            paths = paths[mask[start:end]]
+
+        return paths.tolist()
+
+    def set_stats(self, path, num_points, labels=None, num_classes=None):
+        """Set the number of points and the class histogram of an item.
+
+        Args:
+            path: Path of the item.
+            num_points: Number of points of the item.
+            labels: Optional labels of the points.
+            num_classes: Number of classes of the histogram.
+        """
+        row = self.index(path)
+        self.num_points[row] = num_points
+        if labels is not None:
+            labels = np.asarray(labels).reshape(-1)
+            labels = labels[labels >= 0]
+            num_classes = max(num_classes or 0, self.class_hist.shape[1],
+                              int(np.max(labels, initial=-1)) + 1)
+            if num_classes > self.class_hist.shape[1]:
+                self.class_hist = np.pad(
+                    self.class_hist,
+                    ((0, 0), (0, num_classes - self.class_hist.shape[1])))
+            self.class_hist[row] = np.bincount(labels, minlength=num_classes)
+
+    def copy_stats(self, other):
+        """Copy the statistics of the items of another manifest which have
+        the same path and size."""
+        if len(other) == 0 or len(self) == 0 or np.all(other.num_points < 0):
+            return
+        rows = {p: i for i, p in enumerate(other.paths.tolist())}
+        if other.class_hist.shape[1] > self.class_hist.shape[1]:
+            self.class_hist = np.zeros((len(self), other.class_hist.shape[1]),
+                                       dtype=np.int64)
+        for i, path in enumerate(self.paths.tolist()):
+            j = rows.get(path)
+            if j is not None and other.sizes[j] == self.sizes[i]:
+                self.num_points[i] = other.num_points[j]
+                self.class_hist[i, :other.class_hist.shape[1]] = \
+                    other.class_hist[j]
@@ -196,6 +196,19 @@ def center_to_corner_box3d(centers, dims, angles=None, origin=(0.5, 1.0, 0.5)):
     return corners
 
 
+def boxes_to_xyzwhlr(boxes):
+    """Boxes in the common 7-sized vector representation (N, 7).
+
+    Args:
+        boxes: List of BEVBox3D, a BoxArray or an array (N, 7).
+    """
+    if isinstance(boxes, np.ndarray):
+        return boxes.reshape(-1, 7)
+    if hasattr(boxes, 'to_xyzwhlr'):
+        return boxes.to_xyzwhlr()
+    return np.array([box.to_xyzwhlr() for box in boxes]).reshape(-1, 7)
+
+
 def center_to_corner_box2d(boxes, origin=0.5):
     """Convert kitti locations, dimensions and angles to corners.
     format: center(xy), dims(xy), angles(clockwise when positive)
@@ -206,7 +219,7 @@ def center_to_corner_box2d(boxes, origin=0.5):
     Returns:
         np.ndarray: Corners with the shape of (N, 4, 2).
     """
-    flat_boxes = np.array([box.to_xyzwhlr() for box in boxes])
+    flat_boxes = boxes_to_xyzwhlr(boxes)
     centers = flat_boxes[:, 0:2]
     dims = flat_boxes[:, 3:5]
     angles = flat_boxes[:, 6]
@@ -323,6 +336,53 @@ def points_in_box(points, rbbox, origin=(0.5, 0.5, 0)):
     return indices
 
 
+def points_in_box_indices(points, rbbox, origin=(0.5, 0.5, 0)):
+    """Indices of the points in each rotated bbox, see points_in_box.
+
+    Boxes are only rotated around z, so each box tests its points in the box
+    frame after rotating them by the yaw. Points are sorted along x once and
+    every box only looks at the points within its BEV radius, instead of
+    testing all N x M point-box pairs against 6 planes.
+
+    Args:
+        points (np.ndarray, shape=[N, 3+dim]): Points to query.
+        rbbox (np.ndarray, shape=[M, 7]): Boxes3d with rotation.
+        origin (tuple[int]): Indicate the position of box center.
+
+    Returns:
+        list[np.ndarray]: For each box, the sorted indices of the points
+            inside it.
+    """
+    rbbox = np.asarray(rbbox, dtype=np.float64).reshape(-1, 7)
+    xyz = points[:, :3]
+    order = np.argsort(xyz[:, 0], kind='stable')
+    sorted_x = xyz[order, 0]
+
+    lower = -np.asarray(origin) * rbbox[:, 3:6]
+    upper = lower + rbbox[:, 3:6]
+    radius = np.linalg.norm(np.maximum(-lower, upper)[:, :2], axis=-1)
+    start = np.searchsorted(sorted_x, rbbox[:, 0] - radius, side='left')
+    end = np.searchsorted(sorted_x, rbbox[:, 0] + radius, side='right')
+    rot_cos = np.cos(rbbox[:, 6])
+    rot_sin = np.sin(rbbox[:, 6])
+
+    indices = []
+    for i in range(len(rbbox)):
+        cand = order[start[i]:end[i]]
+        d = xyz[cand] - rbbox[i, :3]
+        near = np.abs(d[:, 1]) <= radius[i]
+        cand, d = cand[near], d[near]
+
+        local_x = d[:, 0] * rot_cos[i] - d[:, 1] * rot_sin[i]
+        local_y = d[:, 0] * rot_sin[i] + d[:, 1] * rot_cos[i]
+        mask = ((lower[i, 0] < local_x) & (local_x < upper[i, 0]) &
+                (lower[i, 1] < local_y) & (local_y < upper[i, 1]) &
+                (lower[i, 2] < d[:, 2]) & (d[:, 2] < upper[i, 2]))
+        indices.append(np.sort(cand[mask]))
+
+    return indices
+
+
 def filter_by_min_points(bboxes, min_points_dict):
     """Filter ground truths by number of points in the bbox."""
     filtered_boxes = []
@@ -369,8 +429,8 @@ def box_collision_test(boxes, qboxes):
         boxes (np.ndarray): Corners of current boxes.
         qboxes (np.ndarray): Boxes to be avoid colliding.
     """
-    boxes = np.array([box.to_xyzwhlr() for box in boxes], dtype=np.float32)
-    qboxes = np.array([box.to_xyzwhlr() for box in qboxes], dtype=np.float32)
+    boxes = boxes_to_xyzwhlr(boxes).astype(np.float32)
+    qboxes = boxes_to_xyzwhlr(qboxes).astype(np.float32)
 
     boxes = boxes[:, [0, 1, 3, 4, 6]]
     qboxes = qboxes[:, [0, 1, 3, 4, 6]]
@@ -412,6 +472,46 @@ def sample_class(class_name, num, gt_boxes, db_boxes):
     return valid_samples
 
 
+def sample_box_indices(num, gt_boxes, db_boxes, candidates):
+    """Sample boxes that collide neither with the ground truth nor with
+    each other.
+
+    Args:
+        num (int): Number of boxes to sample.
+        gt_boxes (np.ndarray): Ground truth boxes (M, 7).
+        db_boxes (np.ndarray): Database boxes (N, 7), only the sampled rows
+            are read.
+        candidates (np.ndarray): Indices of the boxes to sample from.
+
+    Returns:
+        np.ndarray: Indices of the sampled boxes in db_boxes.
+    """
+    if num <= 0 or len(candidates) == 0:
+        return np.zeros((0,), dtype=np.int64)
+
+    sampled = np.random.choice(candidates,
+                               min(num, len(candidates)),
+                               replace=False)
+
+    num_gt = len(gt_boxes)
+    boxes = np.concatenate([gt_boxes, db_boxes[sampled]], axis=0)
+
+    coll_mat = box_collision_test(boxes, boxes)
+
+    diag = np.arange(len(boxes))
+    coll_mat[diag, diag] = False
+
+    valid = []
+    for i in range(num_gt, len(boxes)):
+        if coll_mat[i].any():
+            coll_mat[i] = False
+            coll_mat[:, i] = False
+        else:
+            valid.append(i - num_gt)
+
+    return sampled[valid]
+
+
 def remove_points_in_boxes(points, boxes):
     """Remove the points in the sampled bounding boxes.
     Args:
@@ -420,8 +520,10 @@ def remove_points_in_boxes(points, boxes):
     Returns:
         np.ndarray: Points with those in the boxes removed.
     """
-    flat_boxes = [box.to_xyzwhlr() for box in boxes]
-    masks = points_in_box(points, flat_boxes)
-    points = points[np.logical_not(masks.any(-1))]
+    flat_boxes = boxes_to_xyzwhlr(boxes)
+    keep = np.ones((len(points),), dtype=bool)
+    for indices in points_in_box_indices(points, flat_boxes):
+        keep[indices] = False
+    points = points[keep]
 
     return points
@@ -3,6 +3,8 @@ import random
 import pickle
 import copy
 from .operations import *
+from .bev_box import BoxArray
+from .gt_database import GTDatabase
 
 
 def trans_normalize(pc, feat, t_normalize):
@@ -144,10 +146,15 @@ class ObjdetAugmentation():
         pcd_range = np.array(pcd_range)
         bev_range = pcd_range[[0, 1, 3, 4]]
 
-        filtered_boxes = []
-        for box in data['bbox_objs']:
-            if in_range_bev(bev_range, box.to_xyzwhlr()):
-                filtered_boxes.append(box)
+        bboxes = data['bbox_objs']
+        if isinstance(bboxes, BoxArray):
+            filtered_boxes = bboxes[in_range_bev(bev_range,
+                                                 bboxes.to_xyzwhlr().T)]
+        else:
+            filtered_boxes = []
+            for box in bboxes:
+                if in_range_bev(bev_range, box.to_xyzwhlr()):
+                    filtered_boxes.append(box)
 
         return {
             'point': data['point'],
@@ -161,7 +168,10 @@ class ObjdetAugmentation():
         points = data['point']
         bboxes = data['bbox_objs']
 
-        gt_labels_3d = [box.label_class for box in data['bbox_objs']]
+        if isinstance(bboxes, BoxArray):
+            gt_labels_3d = bboxes.label_class
+        else:
+            gt_labels_3d = [box.label_class for box in bboxes]
 
         sampled_num_dict = {}
 
@@ -173,6 +183,10 @@ class ObjdetAugmentation():
             sampled_num = np.round(rate * sampled_num).astype(np.int64)
             sampled_num_dict[class_name] = sampled_num
 
+        if isinstance(db_boxes_dict, GTDatabase):
+            return ObjdetAugmentation._sample_gt_database(
+                data, db_boxes_dict, sampled_num_dict)
+
         sampled = []
         avoid_coll_boxes = copy.deepcopy(data['bbox_objs'])
         for class_name in sampled_num_dict.keys():
@@ -199,6 +213,37 @@ class ObjdetAugmentation():
 
         return {'point': points, 'bbox_objs': bboxes, 'calib': data['calib']}
 
+    @staticmethod
+    def _sample_gt_database(data, db, sampled_num_dict):
+        """ObjectSample from a packed GTDatabase.
+
+        Sampling only slices the box and point arrays of the database, so
+        nothing is copied except the sampled points.
+        """
+        points = data['point']
+        bboxes = data['bbox_objs']
+
+        avoid_coll_boxes = boxes_to_xyzwhlr(bboxes)
+        sampled = []
+        for class_name, sampled_num in sampled_num_dict.items():
+            indices = sample_box_indices(sampled_num, avoid_coll_boxes,
+                                         db.boxes, db.class_indices[class_name])
+            sampled.append(indices)
+            avoid_coll_boxes = np.concatenate(
+                [avoid_coll_boxes, db.boxes[indices]], axis=0)
+
+        sampled = np.concatenate(sampled) if len(sampled) else []
+        if len(sampled) != 0:
+            sampled_points = db.get_points(sampled)
+            sampled_boxes = db.get_boxes(sampled)
+
+            points = remove_points_in_boxes(points, sampled_boxes)
+            points = np.concatenate(
+                [sampled_points.astype(points.dtype), points], axis=0)
+            bboxes = bboxes + sampled_boxes
+
+        return {'point': points, 'bbox_objs': bboxes, 'calib': data['calib']}
+
     @staticmethod
     def ObjectNoise(input,
                     trans_std=[0.25, 0.25, 0.25],
@@ -8,7 +8,7 @@ import yaml
 
 from .base_dataset import BaseDataset
 from ..utils import Config, make_dir, DATASET
-from .utils import BEVBox3D
+from .utils import BEVBox3D, Manifest
 
 logging.basicConfig(
     level=logging.INFO,
@@ -50,8 +50,14 @@ class Waymo(BaseDataset):
         self.num_classes = 4
         self.label_to_names = self.get_label_to_names()
 
-        self.all_files = sorted(
-            glob(join(cfg.dataset_path, 'velodyne', '*.bin')))
+        train_dir = join(cfg.dataset_path, 'velodyne')
+        test_dir = join(cfg.dataset_path, 'testing', 'velodyne')
+        self.manifest = self.get_manifest([train_dir, test_dir],
+                                          path_fn=Manifest.ext_filter('.bin'),
+                                          label_fn=Manifest.sibling_label_fn(
+                                              'label_all', '.txt'))
+
+        self.all_files = self.manifest.files(train_dir)
         self.train_files = []
         self.val_files = []
 
@@ -63,8 +69,7 @@ class Waymo(BaseDataset):
             else:
                 self.val_files.append(f)
 
-        self.test_files = glob(
-            join(cfg.dataset_path, 'testing', 'velodyne', '*.bin'))
+        self.test_files = self.manifest.files(test_dir)
 
     @staticmethod
     def get_label_to_names():
@@ -155,7 +160,7 @@ class Waymo(BaseDataset):
         elif split in ['test', 'testing']:
             return self.test_files
         elif split in ['val', 'validation']:
-            return val_files
+            return self.val_files
         elif split in ['all']:
             return self.train_files + self.val_files + self.test_files
         else:
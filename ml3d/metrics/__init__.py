@@ -8,6 +8,6 @@ else:
     from open3d.ml.contrib import iou_bev_cpu as iou_bev
     from open3d.ml.contrib import iou_3d_cpu as iou_3d
 
-from .mAP import precision_3d, mAP
+from .mAP import precision_3d, mAP, MAPEvaluator
 
-__all__ = ['precision_3d', 'mAP', 'iou_bev', 'iou_3d']
+__all__ = ['precision_3d', 'mAP', 'MAPEvaluator', 'iou_bev', 'iou_3d']
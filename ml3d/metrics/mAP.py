@@ -1,4 +1,6 @@
 import numpy as np
+from multiprocessing import Pool
+
 from . import iou_bev, iou_3d
 
 
@@ -35,6 +37,21 @@ def filter_data(data, labels, diffs=None):
     return result, idx
 
 
+def difficulty_masks(data, difficulties):
+    """Masks of the boxes for each difficulty, see filter_data.
+
+    Returns:
+        Boolean array (difficulties, N). A box belongs to a difficulty if its
+        difficulty is in [0, diff], all boxes belong to all difficulties if
+        the data has no difficulty.
+    """
+    if 'difficulty' not in data:
+        return np.ones((len(difficulties), len(data['label'])), dtype=bool)
+
+    diff = np.asarray(data['difficulty'])
+    return (diff >= 0) & (diff <= np.reshape(difficulties, (-1, 1)))
+
+
 def precision_3d(pred,
                  target,
                  classes=[0],
@@ -75,62 +92,113 @@ def precision_3d(pred,
         (score, true pos., false. pos) for each box
         and a list of the false negatives.
     """
+    detection, fns = match_boxes(pred, target, classes, difficulties,
+                                 [min_overlap], [bev], similar_classes)
+
+    return detection[0, 0], fns[0, 0]
+
+
+def match_boxes(pred,
+                target,
+                classes=[0],
+                difficulties=[0],
+                min_overlaps=[[0.5]],
+                bevs=[True],
+                similar_classes={}):
+    """Computes precision quantities for each predicted box for several IoU
+    types and overlaps at once, see precision_3d.
+
+    The boxes are filtered by class and difficulty once and each IoU matrix
+    is computed once, only the thresholding is done for each setting.
+
+    Args:
+        min_overlaps (number[][]): Lists of minimal overlaps, each with one
+            entry for each class. Default is [[0.5]].
+        bevs (boolean[]): For each entry use BEV IoU (else 3D IoU is used).
+            Default is [True].
+
+    Returns:
+        A tuple with the detection quantities (bevs, min_overlaps, classes,
+        difficulties, boxes, 3) and the false negatives (bevs, min_overlaps,
+        classes, difficulties, 1).
+    """
     sim_values = list(similar_classes.values())
 
     # pre-filter data, remove unknown classes
     pred = filter_data(pred, classes)[0]
     target = filter_data(target, classes + sim_values)[0]
 
-    if bev:
-        overlap = iou_bev(pred['bbox'][:, [0, 2, 3, 5, 6]].astype(np.float32),
-                          target['bbox'][:, [0, 2, 3, 5, 6]].astype(np.float32))
-    else:
-        overlap = iou_3d(pred['bbox'].astype(np.float32),
-                         target['bbox'].astype(np.float32))
+    overlaps = []
+    for bev in bevs:
+        if bev:
+            overlaps.append(
+                iou_bev(pred['bbox'][:, [0, 2, 3, 5, 6]].astype(np.float32),
+                        target['bbox'][:, [0, 2, 3, 5, 6]].astype(np.float32)))
+        else:
+            overlaps.append(
+                iou_3d(pred['bbox'].astype(np.float32),
+                       target['bbox'].astype(np.float32)))
+
+    # masks of the difficulties, shared by all classes
+    pred_diff = difficulty_masks(pred, difficulties)
+    target_diff = difficulty_masks(target, difficulties)
 
-    detection = np.zeros(
-        (len(classes), len(difficulties), len(pred['bbox']), 3))
-    fns = np.zeros((len(classes), len(difficulties), 1), dtype="int64")
+    detection = np.zeros((len(bevs), len(min_overlaps), len(classes),
+                          len(difficulties), len(pred['bbox']), 3))
+    fns = np.zeros(
+        (len(bevs), len(min_overlaps), len(classes), len(difficulties), 1),
+        dtype="int64")
     for i, label in enumerate(classes):
         # filter only with label
-        pred_label, pred_idx_l = filter_data(pred, [label])
-        target_label, target_idx_l = filter_data(
-            target, [label, similar_classes.get(label)])
-        overlap_label = overlap[pred_idx_l][:, target_idx_l]
-        for j, diff in enumerate(difficulties):
+        pred_idx_l = np.where(pred['label'] == label)[0]
+        target_cond = target['label'] == label
+        target_idx_l = np.where(target_cond | (
+            target['label'] == similar_classes.get(label)))[0]
+        target_cond = target_cond[target_idx_l]
+        overlaps_label = [
+            overlap[pred_idx_l][:, target_idx_l] for overlap in overlaps
+        ]
+        score = pred['score'][pred_idx_l]
+        for j in range(len(difficulties)):
             # filter with difficulty
-            pred_idx = filter_data(pred_label, [label], [diff])[1]
-            target_idx = filter_data(target_label, [label], [diff])[1]
+            pred_idx = np.where(pred_diff[j, pred_idx_l])[0]
+            target_idx = np.where(target_cond & target_diff[j, target_idx_l])[0]
 
-            if len(pred_idx) > 0:
-                # no matching gt box (filtered preds vs all targets)
-                fp = np.all(overlap_label[pred_idx] < min_overlap[i],
-                            axis=1).astype("float32")
+            if len(pred_idx) == 0:
+                fns[:, :, i, j] = len(target_idx)
+                continue
 
-                # identify all matches (filtered preds vs filtered targets)
-                match_cond = np.any(
-                    overlap_label[pred_idx][:, target_idx] >= min_overlap[i],
-                    axis=-1)
-                tp = np.zeros((len(pred_idx),))
-
-                # all matches first fp
-                fp[np.where(match_cond)] = 1
+            for b, overlap_label in enumerate(overlaps_label):
+                overlap_pred = overlap_label[pred_idx]
+                overlap_target = overlap_label[:, target_idx]
 
                 # only best match can be tp
-                max_idx = np.argmax(overlap_label[:, target_idx], axis=0)
-                max_cond = [idx in max_idx for idx in pred_idx]
-                match_cond = np.all([max_cond, match_cond], axis=0)
-                tp[match_cond] = 1
-                fp[match_cond] = 0
-
-                # no matching pred box (all preds vs filtered targets)
-                fns[i, j] = np.sum(
-                    np.all(overlap_label[:, target_idx] < min_overlap[i],
-                           axis=0))
-                detection[i, j, [pred_idx]] = np.stack(
-                    [pred_label['score'][pred_idx], tp, fp], axis=-1)
-            else:
-                fns[i, j] = len(target_idx)
+                max_cond = np.isin(pred_idx, np.argmax(overlap_target, axis=0))
+
+                for k, min_overlap in enumerate(min_overlaps):
+                    # no matching gt box (filtered preds vs all targets)
+                    fp = np.all(overlap_pred < min_overlap[i],
+                                axis=1).astype("float32")
+
+                    # identify all matches (filtered preds vs filtered
+                    # targets)
+                    match_cond = np.any(
+                        overlap_target[pred_idx] >= min_overlap[i], axis=-1)
+                    tp = np.zeros((len(pred_idx),))
+
+                    # all matches first fp
+                    fp[match_cond] = 1
+
+                    match_cond &= max_cond
+                    tp[match_cond] = 1
+                    fp[match_cond] = 0
+
+                    # no matching pred box (all preds vs filtered targets)
+                    missed = np.all(overlap_target < min_overlap[i], axis=0)
+                    fns[b, k, i, j] = np.sum(missed)
+                    detection[b, k, i, j,
+                              pred_idx] = np.stack([score[pred_idx], tp, fp],
+                                                   axis=-1)
 
     return detection, fns
 
@@ -159,6 +227,207 @@ def sample_thresholds(scores, gt_cnt, sample_cnt=41):
     return thresholds
 
 
+def match_frame(pred,
+                target,
+                classes=[0],
+                difficulties=[0],
+                min_overlaps=[[0.5]],
+                bevs=[True],
+                similar_classes={}):
+    """Matches the predictions of a single frame, see match_boxes.
+
+    Returns:
+        A tuple with the (score, true pos., false pos.) of the predictions
+        indexed by [bev][min_overlap][class][difficulty] and the amount of
+        gt samples (classes, difficulties).
+    """
+    detection = match_boxes(pred=pred,
+                            target=target,
+                            classes=classes,
+                            difficulties=difficulties,
+                            min_overlaps=min_overlaps,
+                            bevs=bevs,
+                            similar_classes=similar_classes)[0]
+
+    target_diff = difficulty_masks(target, difficulties)
+    gt_cnt = np.zeros((len(classes), len(difficulties)))
+    for i, c in enumerate(classes):
+        gt_cnt[i] = np.sum(target_diff[:, target['label'] == c], axis=-1)
+
+    # predictions of other classes or difficulties are neither tp nor fp
+    return [[[[det[det[:, 1] + det[:, 2] > 0]
+               for det in det_c]
+              for det_c in det_k]
+             for det_k in det_b]
+            for det_b in detection], gt_cnt
+
+
+def average_precision(det, gt_cnt, samples=41):
+    """Computes the AP of the detections of a class and difficulty.
+    Args:
+        det (np.ndarray): Detections (N, 3) as (score, true pos., false pos.).
+        gt_cnt (number): amount of gt samples
+        samples (number): Count of used samples for mAP calculation.
+            Default is 41.
+
+    Returns:
+        Returns the AP (11-point interpolation).
+    """
+    det = det[np.argsort(-det[:, 0], kind='stable')]
+    thresholds = sample_thresholds(det[det[:, 1] > 0, 0], gt_cnt, samples)
+    if len(thresholds) == 0:
+        return 0.0
+
+    # one cumulative sum for all thresholds
+    tp_acc = np.cumsum(det[:, 1])
+    fp_acc = np.cumsum(det[:, 2])
+    cnt = np.searchsorted(-det[:, 0], -np.array(thresholds), side='right')
+    prec = tp_acc[cnt - 1] / (tp_acc[cnt - 1] + fp_acc[cnt - 1])
+    prec = np.maximum.accumulate(prec[::-1])[::-1]
+
+    return np.sum(prec[::4]) / 11 * 100
+
+
+class MAPEvaluator(object):
+    """Computes the mAP incrementally, frame by frame.
+
+    Each frame is matched when it is added, only the score and the true and
+    false positive flags of its predictions are kept. The boxes of past
+    frames are not needed to compute the mAP.
+
+    Several IoU types (BEV and 3D) and sets of minimal overlaps can be
+    evaluated in the same pass, they share the filtering of the boxes and
+    each IoU matrix is only computed once per frame.
+
+    Example:
+        evaluator = MAPEvaluator(classes, difficulties, min_overlap,
+                                 bev=[True, False])
+        for pred, target in frames:
+            evaluator.add_frame(pred, target)
+        ap_bev, ap_3d = evaluator.compute()
+    """
+
+    def __init__(self,
+                 classes=[0],
+                 difficulties=[0],
+                 min_overlap=[0.5],
+                 bev=True,
+                 samples=41,
+                 similar_classes={},
+                 num_workers=0):
+        """
+        Initialize
+
+        Args:
+            classes (number[]): List of classes which should be evaluated.
+                Default is [0].
+            difficulties (number[]): List of difficulties which should
+                evaluated. Default is [0].
+            min_overlap (number[]): Minimal overlap required to match bboxes.
+                One entry for each class expected. Default is [0.5].
+                A list of such lists evaluates each of them.
+            bev (boolean): Use BEV IoU (else 3D IoU is used).
+                Default is True. A list of booleans evaluates each of them.
+            samples (number): Count of used samples for mAP calculation.
+                Default is 41.
+            similar_classes (dict): Assign classes to similar classes that
+                were not part of the training data so that they are not
+                counted as false negatives. Default is {}.
+            num_workers (number): Number of processes matching the frames.
+                Default is 0 (match in the calling process).
+
+        Returns:
+            class: The corresponding class.
+        """
+        if np.ndim(min_overlap[0]) == 0:
+            min_overlap = [min_overlap]
+        self.min_overlaps = []
+        for overlap in min_overlap:
+            overlap = list(overlap)
+            if len(overlap) != len(classes):
+                assert len(overlap) == 1
+                overlap = overlap * len(classes)
+            assert len(overlap) == len(classes)
+            self.min_overlaps.append(overlap)
+
+        self.classes = list(classes)
+        self.difficulties = list(difficulties)
+        self.bev = bev
+        self.bevs = [bev] if np.ndim(bev) == 0 else list(bev)
+        self.samples = samples
+        self.similar_classes = similar_classes
+        self.num_workers = num_workers
+        self.pool = None
+
+        self.reset()
+
+    def reset(self):
+        """Removes all frames."""
+        self.detection = [[[[[]
+                             for _ in self.difficulties]
+                            for _ in self.classes]
+                           for _ in self.min_overlaps]
+                          for _ in self.bevs]
+        self.gt_cnt = np.zeros((len(self.classes), len(self.difficulties)))
+        self.pending = []
+
+    def add_frame(self, pred, target):
+        """Adds a frame.
+        Args:
+            pred (dict): Dictionary with the prediction data of the frame
+                (as numpy arrays), see mAP.
+            target (dict): Dictionary with the target data of the frame
+                (as numpy arrays), see mAP.
+        """
+        args = (pred, target, self.classes, self.difficulties,
+                self.min_overlaps, self.bevs, self.similar_classes)
+        if self.num_workers > 0:
+            if self.pool is None:
+                self.pool = Pool(self.num_workers)
+            self.pending.append(self.pool.apply_async(match_frame, args))
+        else:
+            self._add_match(*match_frame(*args))
+
+    def _add_match(self, detection, gt_cnt):
+        for b, det_b in enumerate(detection):
+            for k, det_k in enumerate(det_b):
+                for i, det_c in enumerate(det_k):
+                    for j, det in enumerate(det_c):
+                        self.detection[b][k][i][j].append(det)
+        self.gt_cnt += gt_cnt
+
+    def compute(self):
+        """Computes the mAP of all frames added so far.
+
+        Returns:
+            Returns the mAP for each class, difficulty and set of minimal
+            overlaps (classes, difficulties, min_overlaps). If bev is a list,
+            a list with the mAP for each entry is returned.
+        """
+        for result in self.pending:
+            self._add_match(*result.get())
+        self.pending = []
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        maps = []
+        for det_b in self.detection:
+            mAP = np.zeros((len(self.classes), len(self.difficulties),
+                            len(self.min_overlaps)))
+            for k, det_k in enumerate(det_b):
+                for i, det_c in enumerate(det_k):
+                    for j, det in enumerate(det_c):
+                        det = np.concatenate(det + [np.zeros((0, 3))])
+                        mAP[i, j,
+                            k] = average_precision(det, self.gt_cnt[i, j],
+                                                   self.samples)
+            maps.append(mAP)
+
+        return maps[0] if np.ndim(self.bev) == 0 else maps
+
+
 def mAP(pred,
         target,
         classes=[0],
@@ -198,54 +467,9 @@ def mAP(pred,
     Returns:
         Returns the mAP for each class and difficulty specified.
     """
+    evaluator = MAPEvaluator(classes, difficulties, min_overlap, bev, samples,
+                             similar_classes)
+    for p, t in zip(pred, target):
+        evaluator.add_frame(p, t)
 
-    if len(min_overlap) != len(classes):
-        assert len(min_overlap) == 1
-        min_overlap = min_overlap * len(classes)
-    assert len(min_overlap) == len(classes)
-
-    cnt = 0
-    box_cnts = [0]
-    for p in pred:
-        cnt += len(filter_data(p, classes)[1])
-        box_cnts.append(cnt)
-
-    gt_cnt = np.empty((len(classes), len(difficulties)))
-    for i, c in enumerate(classes):
-        for j, d in enumerate(difficulties):
-            for t in target:
-                gt_cnt[i, j] += len(filter_data(t, [c], [d])[1])
-
-    detection = np.zeros((len(classes), len(difficulties), box_cnts[-1], 3))
-    fns = np.zeros((len(classes), len(difficulties), 1), dtype='int64')
-    for i in range(len(pred)):
-        d, f = precision_3d(pred=pred[i],
-                            target=target[i],
-                            classes=classes,
-                            difficulties=difficulties,
-                            min_overlap=min_overlap,
-                            bev=bev,
-                            similar_classes=similar_classes)
-        detection[:, :, box_cnts[i]:box_cnts[i + 1]] = d
-        fns += f
-
-    mAP = np.empty((len(classes), len(difficulties), 1))
-    for i in range(len(classes)):
-        for j in range(len(difficulties)):
-            det = detection[i, j, np.argsort(-detection[i, j, :, 0])]
-
-            #gt_cnt = np.sum(det[:,1]) + fns[i, j]
-            thresholds = sample_thresholds(det[np.where(det[:, 1] > 0)[0], 0],
-                                           gt_cnt[i, j], samples)
-
-            prec = np.zeros((len(thresholds),))
-            for ti in range(len(thresholds))[::-1]:
-                d = det[np.where(det[:, 0] >= thresholds[ti])]
-                tp_acc = np.sum(d[:, 1])
-                fp_acc = np.sum(d[:, 2])
-                prec[ti] = tp_acc / (tp_acc + fp_acc)
-                prec[ti] = np.max(prec[ti:], axis=-1)
-
-            mAP[i, j] = np.sum(prec[::4]) / 11 * 100
-
-    return mAP
+    return evaluator.compute()
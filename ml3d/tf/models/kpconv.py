@@ -77,6 +77,7 @@ class KPFCNN(BaseModel):
             num_layers=5,
             l_relu=0.1,
             reduce_fc=False,
+            conv_chunk_size=0,
             **kwargs):
 
         super().__init__(name=name,
@@ -119,6 +120,7 @@ class KPFCNN(BaseModel):
                          num_layers=num_layers,
                          l_relu=l_relu,
                          reduce_fc=reduce_fc,
+                         conv_chunk_size=conv_chunk_size,
                          **kwargs)
 
         cfg = self.cfg
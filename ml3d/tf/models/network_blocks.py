@@ -131,6 +131,7 @@ class KPConv(tf.keras.layers.Layer):
                  repulse_extent=1.2,
                  deform_fitting_power=1.0,
                  offset_param=False,
+                 chunk_size=0,
                  **kwargs):
         """
         Initialize parameters for Kernel Point Convolution.
@@ -145,6 +146,7 @@ class KPConv(tf.keras.layers.Layer):
         :param aggregation_mode: choose to sum influences, or only keep the closest ('closest', 'sum').
         :param deformable: choose deformable or not.
         :param modulated: choose if kernel weights are modulated in addition to deformed.
+        :param chunk_size: if > 0, number of query points convolved at once to limit memory.
         """
         super(KPConv, self).__init__(**kwargs)
 
@@ -159,6 +161,7 @@ class KPConv(tf.keras.layers.Layer):
         self.aggregation_mode = aggregation_mode
         self.deformable = deformable
         self.modulated = modulated
+        self.chunk_size = chunk_size
 
         self.min_d2 = None
         self.deformed_KP = None
@@ -193,7 +196,8 @@ class KPConv(tf.keras.layers.Layer):
                                       fixed_kernel_points=fixed_kernel_points,
                                       KP_influence=KP_influence,
                                       aggregation_mode=aggregation_mode,
-                                      offset_param=True)
+                                      offset_param=True,
+                                      chunk_size=chunk_size)
             self.offset_bias = self.add_weight(name="{}_b".format(self.name),
                                                shape=(self.offset_dim,),
                                                initializer='zeros',
@@ -252,8 +256,6 @@ class KPConv(tf.keras.layers.Layer):
 
     def call(self, query_points, support_points, neighbors_indices, features):
 
-        n_kp = int(self.kernel_points.shape[0])
-
         if self.deformable:
             # Get offsets with a KPConv that only takes part of the features
             self.offset_features = self.offset_conv(
@@ -289,15 +291,91 @@ class KPConv(tf.keras.layers.Layer):
         shadow_point = tf.ones_like(support_points[:1, :]) * 1e6
         support_points = tf.concat([support_points, shadow_point], axis=0)
 
+        # Add a zero feature for shadow neighbors
+        features = tf.concat([features, tf.zeros_like(features[:1, :])], axis=0)
+
+        # Apply offsets to kernel points [n_points, n_kpoints, dim]
+        if self.deformable:
+            self.deformed_KP = offsets + self.kernel_points
+        else:
+            self.deformed_KP = None
+
+        if self.chunk_size <= 0:
+            output_features, self.min_d2 = self.convolve(
+                query_points, support_points, neighbors_indices, features,
+                self.deformed_KP, modulations)
+        else:
+            output_features, self.min_d2 = self.convolve_chunked(
+                query_points, support_points, neighbors_indices, features,
+                self.deformed_KP, modulations)
+
+        self.add_loss(self.regular_loss())
+
+        return output_features
+
+    def convolve_chunked(self, query_points, support_points, neighbors_indices,
+                         features, deformed_KP, modulations):
+        """
+        Apply the convolution to slices of chunk_size query points, which
+        bounds the size of the [n_points, n_neighbors, n_kpoints, dim]
+        intermediate tensors. Results are identical to convolve().
+        """
+        n_points = tf.shape(query_points)[0]
+        n_chunks = (n_points + self.chunk_size - 1) // self.chunk_size
+
+        outputs = tf.TensorArray(tf.float32,
+                                 size=n_chunks,
+                                 infer_shape=False,
+                                 element_shape=tf.TensorShape(
+                                     [None, self.out_channels]))
+        min_d2 = tf.TensorArray(tf.float32,
+                                size=n_chunks,
+                                infer_shape=False,
+                                element_shape=tf.TensorShape([None, self.K]))
+
+        def body(i, outputs, min_d2):
+            i0 = i * self.chunk_size
+            i1 = tf.minimum(i0 + self.chunk_size, n_points)
+            chunk_KP = None if deformed_KP is None else deformed_KP[i0:i1]
+            chunk_mod = None if modulations is None else modulations[i0:i1]
+            out, d2 = self.convolve(query_points[i0:i1], support_points,
+                                    neighbors_indices[i0:i1], features,
+                                    chunk_KP, chunk_mod)
+            outputs = outputs.write(i, out)
+            if d2 is not None:
+                min_d2 = min_d2.write(i, d2)
+            return i + 1, outputs, min_d2
+
+        _, outputs, min_d2 = tf.while_loop(lambda i, *_: i < n_chunks, body,
+                                           (0, outputs, min_d2))
+
+        if deformed_KP is None:
+            return outputs.concat(), None
+        return outputs.concat(), min_d2.concat()
+
+    def convolve(self, query_points, support_points, neighbors_indices,
+                 features, deformed_KP, modulations):
+        """
+        Kernel point convolution of the given query points.
+        :param query_points: query points [n_points, dim].
+        :param support_points: support points, shadow point included [n0_points + 1, dim].
+        :param neighbors_indices: neighbors indices [n_points, n_neighbors].
+        :param features: support features, shadow feature included [n0_points + 1, in_fdim].
+        :param deformed_KP: deformed kernel points [n_points, n_kpoints, dim] or None.
+        :param modulations: kernel point modulations [n_points, n_kpoints] or None.
+        :return: output features [n_points, out_fdim] and, when deformable, the
+            minimum squared distances to each kernel point [n_points, n_kpoints].
+        """
+        n_kp = int(self.kernel_points.shape[0])
+
         # Get neighbor points [n_points, n_neighbors, dim]
         neighbors = tf.gather(support_points, neighbors_indices, axis=0)
 
         # Center every neighborhood
         neighbors = neighbors - tf.expand_dims(query_points, 1)
 
-        if (self.deformable):
-            self.deformed_KP = offsets + self.kernel_points
-            deformed_K_points = tf.expand_dims(self.deformed_KP, 1)
+        if deformed_KP is not None:
+            deformed_K_points = tf.expand_dims(deformed_KP, 1)
         else:
             deformed_K_points = self.kernel_points
 
@@ -314,7 +392,7 @@ class KPConv(tf.keras.layers.Layer):
         if self.deformable:
 
             # Save distances for loss
-            self.min_d2 = tf.reduce_min(sq_distances, axis=1)
+            min_d2 = tf.reduce_min(sq_distances, axis=1)
 
             # Boolean of the neighbors in range of a kernel point [n_points, n_neighbors]
             in_range = tf.cast(
@@ -344,6 +422,7 @@ class KPConv(tf.keras.layers.Layer):
                 1 - new_neighb_bool) * int(support_points.shape[0] - 1)
 
         else:
+            min_d2 = None
             new_neighbors_indices = neighbors_indices
 
         # Get Kernel point influences [n_points, n_kpoints, n_neighbors]
@@ -380,8 +459,6 @@ class KPConv(tf.keras.layers.Layer):
             raise ValueError(
                 "Unknown convolution mode. Should be 'closest' or 'sum'")
 
-        features = tf.concat([features, tf.zeros_like(features[:1, :])], axis=0)
-
         # Get the features of each neighborhood [n_points, n_neighbors, in_fdim]
         neighborhood_features = tf.gather(features,
                                           new_neighbors_indices,
@@ -401,9 +478,7 @@ class KPConv(tf.keras.layers.Layer):
         # Convolution sum to get [n_points, out_fdim]
         output_features = tf.reduce_sum(kernel_outputs, axis=0)
 
-        self.add_loss(self.regular_loss())
-
-        return output_features
+        return output_features, min_d2
 
     def __repr__(self):
         return 'KPConv(radius: {:.2f}, in_feat: {:d}, out_feat: {:d})'.format(
@@ -514,7 +589,8 @@ class SimpleBlock(tf.keras.layers.Layer):
                              radius,
                              fixed_kernel_points=cfg.fixed_kernel_points,
                              aggregation_mode=cfg.aggregation_mode,
-                             modulated=cfg.modulated)
+                             modulated=cfg.modulated,
+                             chunk_size=cfg.get('conv_chunk_size', 0))
 
         self.batch_norm = BatchNormBlock(out_dim // 2, self.use_bn,
                                          self.bn_momentum)
@@ -598,7 +674,8 @@ class ResnetBottleneckBlock(tf.keras.layers.Layer):
                              deformable='deform' in block_name,
                              modulated=cfg.modulated,
                              repulse_extent=cfg.repulse_extent,
-                             deform_fitting_power=cfg.deform_fitting_power)
+                             deform_fitting_power=cfg.deform_fitting_power,
+                             chunk_size=cfg.get('conv_chunk_size', 0))
 
         self.batch_norm_conv = BatchNormBlock(out_dim // 4, self.use_bn,
                                               self.bn_momentum)
@@ -15,8 +15,8 @@ from ..utils.objdet_helper import Anchor3DRangeGenerator, BBoxCoder, multiclass_
 from ..modules.losses.focal_loss import FocalLoss
 from ..modules.losses.smooth_L1 import SmoothL1Loss
 from ..modules.losses.cross_entropy import CrossEntropyLoss
-from ...datasets.utils import ObjdetAugmentation, BEVBox3D
-from ...datasets.utils.operations import filter_by_min_points
+from ...datasets.utils import ObjdetAugmentation, BEVBox3D, BoxArray
+from ...datasets.utils.gt_database import GTDatabase
 
 
 class PointPillars(BaseModel):
@@ -239,20 +239,10 @@ class PointPillars(BaseModel):
         return new_data
 
     def load_gt_database(self, pickle_path, min_points_dict, sample_dict):
-        db_boxes = pickle.load(open(pickle_path, 'rb'))
+        db = GTDatabase.load(pickle_path)
+        db.index_classes(sample_dict.keys(), min_points_dict)
 
-        if min_points_dict is not None:
-            db_boxes = filter_by_min_points(db_boxes, min_points_dict)
-
-        db_boxes_dict = {}
-        for key in sample_dict.keys():
-            db_boxes_dict[key] = []
-
-        for db_box in db_boxes:
-            if db_box.name in sample_dict.keys():
-                db_boxes_dict[db_box.name].append(db_box)
-
-        self.db_boxes_dict = db_boxes_dict
+        self.db_boxes_dict = db
 
     def augment_data(self, data, attr):
         cfg = self.cfg.augment
@@ -263,7 +253,9 @@ class PointPillars(BaseModel):
                 # remove tail of path to get root data path
                 for _ in range(3):
                     data_path = os.path.split(data_path)[0]
-                pickle_path = os.path.join(data_path, 'bboxes.pkl')
+                pickle_path = os.path.join(data_path, 'gt_database')
+                if not os.path.exists(pickle_path):
+                    pickle_path = os.path.join(data_path, 'bboxes.pkl')
                 self.load_gt_database(pickle_path, **cfg['ObjectSample'])
 
             data = ObjdetAugmentation.ObjectSample(
@@ -286,13 +278,12 @@ class PointPillars(BaseModel):
             data = self.augment_data(data, attr)
 
         points = tf.constant([data['point']], dtype=tf.float32)
+        bboxes, label_class = BEVBox3D.to_arrays(data['bbox_objs'])
         labels = tf.constant([
-            self.name2lbl.get(bb.label_class, len(self.classes))
-            for bb in data['bbox_objs']
+            self.name2lbl.get(name, len(self.classes)) for name in label_class
         ],
                              dtype=tf.int32)
-        bboxes = tf.constant([bb.to_xyzwhlr() for bb in data['bbox_objs']],
-                             dtype=tf.float32)
+        bboxes = tf.constant(bboxes, dtype=tf.float32)
 
         return {
             'point': points,
@@ -320,15 +311,11 @@ class PointPillars(BaseModel):
             bboxes = _bboxes.cpu().numpy()
             scores = _scores.cpu().numpy()
             labels = _labels.cpu().numpy()
-            inference_result.append([])
 
-            for bbox, score, label in zip(bboxes, scores, labels):
-                dim = bbox[[3, 5, 4]]
-                pos = bbox[:3] + [0, 0, dim[1] / 2]
-                yaw = bbox[-1]
-                name = self.lbl2name.get(label, "ignore")
-                inference_result[-1].append(
-                    BEVBox3D(pos, dim, yaw, name, score, world_cam, cam_img))
+            names = [self.lbl2name.get(label, "ignore") for label in labels]
+            inference_result.append(
+                BoxArray.from_xyzwhlr(bboxes, names, scores, world_cam,
+                                      cam_img))
 
         return inference_result
 
@@ -974,11 +961,11 @@ class Anchor3DHead(tf.keras.layers.Layer):
             pos_idx = max_overlaps >= pos_th
             neg_idx = (max_overlaps >= 0) & (max_overlaps < neg_th)
 
-            # low-quality matching
-            for k in range(len(target_bboxes)):
-                if gt_max_overlaps[k] >= neg_th:
-                    pos_idx = tf.where(overlaps[k, :] == gt_max_overlaps[k],
-                                       True, pos_idx)
+            # low-quality matching: every gt with an IoU above the negative
+            # threshold keeps the anchors it overlaps best
+            low_quality = (overlaps == gt_max_overlaps[:, None]) & (
+                gt_max_overlaps >= neg_th)[:, None]
+            pos_idx = pos_idx | tf.reduce_any(low_quality, axis=0)
 
             pos_idx = tf.where(pos_idx)[:, 0]
             neg_idx = tf.where(neg_idx)[:, 0]
@@ -25,10 +25,9 @@ import time
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
-from os import makedirs
-from os.path import join, exists
 
-from .....utils.ply import read_ply, write_ply
+from .....utils.kernel_cache import (read_kernel_disposition,
+                                     write_kernel_disposition)
 
 # ------------------------------------------------------------------------------------------
 #
@@ -430,22 +429,13 @@ def kernel_point_optimization_debug(radius,
 
 def load_kernels(radius, num_kpoints, dimension, fixed, lloyd=False):
 
-    # Kernel directory
-    kernel_dir = 'kernels/dispositions'
-    if not exists(kernel_dir):
-        makedirs(kernel_dir)
-
     # To many points switch to Lloyds
     if num_kpoints > 30:
         lloyd = True
 
-    # Kernel_file
-    kernel_file = join(
-        kernel_dir, 'k_{:03d}_{:s}_{:d}D.ply'.format(num_kpoints, fixed,
-                                                     dimension))
-
-    # Check if already done
-    if not exists(kernel_file):
+    # Check if already done (user cache or shipped dispositions)
+    kernel_points = read_kernel_disposition(num_kpoints, fixed, dimension)
+    if kernel_points is None:
         if lloyd:
             # Create kernels
             kernel_points = spherical_Lloyd(1.0,
@@ -470,11 +460,7 @@ def load_kernels(radius, num_kpoints, dimension, fixed, lloyd=False):
             # Save points
             kernel_points = kernel_points[best_k, :, :]
 
-        write_ply(kernel_file, kernel_points, ['x', 'y', 'z'])
-
-    else:
-        data = read_ply(kernel_file)
-        kernel_points = np.vstack((data['x'], data['y'], data['z'])).T
+        write_kernel_disposition(kernel_points, num_kpoints, fixed, dimension)
 
     # Random roations for the kernel
     # N.B. 4D random rotations not supported yet
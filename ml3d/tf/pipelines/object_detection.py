@@ -14,7 +14,7 @@ from ..dataloaders import TFDataloader
 from ...utils import make_dir, PIPELINE, LogRecord, get_runid, code2md
 from ...datasets.utils import BEVBox3D
 
-from ...metrics.mAP import mAP
+from ...metrics.mAP import MAPEvaluator
 
 logging.setLogRecordFactory(LogRecord)
 logging.basicConfig(
@@ -126,8 +126,18 @@ class ObjectDetection(BasePipeline):
 
         self.valid_losses = {}
 
-        pred = []
-        gt = []
+        overlaps = cfg.get("overlaps", [0.5])
+        similar_classes = cfg.get("similar_classes", {})
+        difficulties = cfg.get("difficulties", [0])
+
+        # frames are matched as they arrive, no boxes are kept. BEV and 3D
+        # share the matching of each frame.
+        evaluator = MAPEvaluator(model.classes,
+                                 difficulties,
+                                 overlaps,
+                                 bev=[True, False],
+                                 similar_classes=similar_classes,
+                                 num_workers=cfg.get('num_eval_workers', 0))
         for i in tqdm(range(len(valid_loader)), desc='validation'):
             data = valid_loader[i]['data']
             results = model(data['point'], training=False)
@@ -139,8 +149,9 @@ class ObjectDetection(BasePipeline):
 
             # convert to bboxes for mAP evaluation
             boxes = model.inference_end(results, data)
-            pred.append(BEVBox3D.to_dicts(boxes[0]))
-            gt.append(BEVBox3D.to_dicts(data['bbox_objs']))
+            pred = BEVBox3D.to_dicts(boxes[0])
+            gt = BEVBox3D.to_dicts(data['bbox_objs'])
+            evaluator.add_frame(pred, gt)
 
         sum_loss = 0
         desc = "validation - "
@@ -151,42 +162,21 @@ class ObjectDetection(BasePipeline):
 
         log.info(desc)
 
-        overlaps = cfg.get("overlaps", [0.5])
-        similar_classes = cfg.get("similar_classes", {})
-        difficulties = cfg.get("difficulties", [0])
-
-        ap = mAP(pred,
-                 gt,
-                 model.classes,
-                 difficulties,
-                 overlaps,
-                 similar_classes=similar_classes)
-        log.info("")
-        log.info("=============== mAP BEV ===============")
-        log.info(("class \\ difficulty  " +
-                  "{:>5} " * len(difficulties)).format(*difficulties))
-        for i, c in enumerate(model.classes):
-            log.info(("{:<20} " + "{:>5.2f} " * len(difficulties)).format(
-                c + ":", *ap[i, :, 0]))
-        log.info("Overall: {:.2f}".format(np.mean(ap[:, -1])))
-        self.valid_losses["mAP BEV"] = np.mean(ap[:, -1])
-
-        ap = mAP(pred,
-                 gt,
-                 model.classes,
-                 difficulties,
-                 overlaps,
-                 similar_classes=similar_classes,
-                 bev=False)
-        log.info("")
-        log.info("=============== mAP  3D ===============")
-        log.info(("class \\ difficulty  " +
-                  "{:>5} " * len(difficulties)).format(*difficulties))
-        for i, c in enumerate(model.classes):
-            log.info(("{:<20} " + "{:>5.2f} " * len(difficulties)).format(
-                c + ":", *ap[i, :, 0]))
-        log.info("Overall: {:.2f}".format(np.mean(ap[:, -1])))
-        self.valid_losses["mAP 3D"] = np.mean(ap[:, -1])
+        ap_bev, ap_3d = evaluator.compute()
+        for name, ap in [('BEV', ap_bev), (' 3D', ap_3d)]:
+            log.info("")
+            log.info("=============== mAP {} ===============".format(name))
+            log.info(("class \\ difficulty  " +
+                      "{:>5} " * len(difficulties)).format(*difficulties))
+            for i, c in enumerate(model.classes):
+                log.info(("{:<20} " + "{:>5.2f} " * len(difficulties)).format(
+                    c + ":", *ap[i, :, 0]))
+            log.info("Overall: {:.2f}".format(np.mean(ap[:, -1, 0])))
+            # further sets of overlaps, if given as a list of lists
+            for k in range(1, ap.shape[-1]):
+                log.info("Overall @ {}: {:.2f}".format(
+                    evaluator.min_overlaps[k], np.mean(ap[:, -1, k])))
+            self.valid_losses["mAP " + name.strip()] = np.mean(ap[:, -1, 0])
 
     def run_train(self):
         model = self.model
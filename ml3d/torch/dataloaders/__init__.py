@@ -4,5 +4,9 @@ from .torch_dataloader import TorchDataloader
 from .torch_sampler import get_sampler
 from .default_batcher import DefaultBatcher
 from .concat_batcher import ConcatBatcher
+from .objdet_batcher import ObjectDetectBatch, ObjectDetectBatcher
 
-__all__ = ['TorchDataloader', 'DefaultBatcher', 'ConcatBatcher', 'get_sampler']
+__all__ = [
+    'TorchDataloader', 'DefaultBatcher', 'ConcatBatcher', 'ObjectDetectBatch',
+    'ObjectDetectBatcher', 'get_sampler'
+]
@@ -0,0 +1,88 @@
+import torch
+
+
+class ObjectDetectBatch:
+    """Batched data for object detection models."""
+
+    def __init__(self, batches):
+        """
+        Initialize
+
+        Args:
+            batches: A list of samples, each a dict with 'data' and 'attr'.
+                The NumPy arrays returned by the model transform are
+                converted to CPU tensors, which the DataLoader pins with
+                pin_memory(). Points of different samples are kept in
+                separate tensors, labels and boxes are stacked per sample.
+
+        Returns:
+            class: The corresponding class.
+        """
+        self.point = []
+        self.labels = []
+        self.bboxes = []
+        self.bbox_objs = []
+        self.calib = []
+        self.attr = []
+
+        for batch in batches:
+            data = batch['data']
+            self.attr.append(batch['attr'])
+            self.point.append(
+                torch.as_tensor(data['point'], dtype=torch.float32))
+            self.labels.append(
+                torch.as_tensor(data['labels'], dtype=torch.int64
+                               ) if 'labels' in data else None)
+            self.bboxes.append(
+                torch.as_tensor(data['bboxes'], dtype=torch.float32
+                               ) if 'bboxes' in data else None)
+            self.bbox_objs.append(data.get('bbox_objs'))
+            self.calib.append(data.get('calib'))
+
+    def __len__(self):
+        return len(self.point)
+
+    def pin_memory(self):
+        """
+        Manual pinning of the memory
+        """
+        self.point = [p.pin_memory() for p in self.point]
+        self.labels = [
+            l.pin_memory() if l is not None else None for l in self.labels
+        ]
+        self.bboxes = [
+            b.pin_memory() if b is not None else None for b in self.bboxes
+        ]
+
+        return self
+
+    def to(self, device, non_blocking=False):
+        self.point = [
+            p.to(device, non_blocking=non_blocking) for p in self.point
+        ]
+        self.labels = [
+            l.to(device, non_blocking=non_blocking) if l is not None else None
+            for l in self.labels
+        ]
+        self.bboxes = [
+            b.to(device, non_blocking=non_blocking) if b is not None else None
+            for b in self.bboxes
+        ]
+
+        return self
+
+
+class ObjectDetectBatcher(object):
+    """ObjectDetectBatcher for object detection models"""
+
+    def collate_fn(self, batches):
+        """
+        collate_fn called by original PyTorch dataloader
+
+        Args:
+            batches: a batch of data
+
+        Returns:
+            class: the batched result
+        """
+        return ObjectDetectBatch(batches)
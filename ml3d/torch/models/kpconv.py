@@ -15,7 +15,9 @@ from open3d.ml.contrib import radius_search
 # use relative import for being compatible with Open3d main repo
 from .base_model import BaseModel
 from ..modules.losses import filter_valid_label
-from ...utils.ply import write_ply, read_ply
+from ..utils.helper_torch import checkpoint_bn
+from ...utils.kernel_cache import (read_kernel_disposition,
+                                   write_kernel_disposition)
 from ...utils import MODEL
 
 from ...datasets.utils import (DataProcessing, trans_normalize, trans_augment,
@@ -77,6 +79,8 @@ class KPFCNN(BaseModel):
             num_layers=5,
             l_relu=0.1,
             reduce_fc=False,
+            grad_checkpoint=False,
+            conv_chunk_size=0,
             **kwargs):
 
         super().__init__(name=name,
@@ -118,6 +122,8 @@ class KPFCNN(BaseModel):
                          num_layers=num_layers,
                          l_relu=l_relu,
                          reduce_fc=reduce_fc,
+                         grad_checkpoint=grad_checkpoint,
+                         conv_chunk_size=conv_chunk_size,
                          **kwargs)
 
         cfg = self.cfg
@@ -272,7 +278,11 @@ class KPFCNN(BaseModel):
         for block_i, block_op in enumerate(self.encoder_blocks):
             if block_i in self.encoder_skips:
                 skip_x.append(x)
-            x = block_op(x, batch)
+            if self.cfg.grad_checkpoint and self.training:
+                # Recompute the block activations during the backward pass
+                x = checkpoint_bn(block_op, block_op, x, batch)
+            else:
+                x = block_op(x, batch)
 
         for block_i, block_op in enumerate(self.decoder_blocks):
             if block_i in self.decoder_concats:
@@ -551,8 +561,9 @@ class KPFCNN(BaseModel):
 
     def update_probs(self, inputs, results, test_probs, test_labels):
         self.test_smooth = 0.95
-        stk_probs = torch.nn.functional.softmax(results, dim=-1)
-        stk_probs = results.cpu().data.numpy()
+        # accumulate in fp32 even if the network ran with autocast
+        stk_probs = torch.nn.functional.softmax(results.float(), dim=-1)
+        stk_probs = stk_probs.cpu().data.numpy()
 
         batch = inputs['data']
         stk_labels = batch.labels.cpu().data.numpy()
@@ -805,7 +816,8 @@ def radius_gaussian(sq_r, sig, eps=1e-9):
     :param sig: extents of gaussians [d1, d0] or [d0] or float
     :return: gaussian of sq_r [dn, ..., d1, d0]
     """
-    return torch.exp(-sq_r / (2 * sig**2 + eps))
+    # Always computed in fp32, the exponent underflows in half precision
+    return torch.exp(-sq_r.float() / (2 * sig**2 + eps))
 
 
 def closest_pool(x, inds):
@@ -885,7 +897,8 @@ class KPConv(nn.Module):
                  KP_influence='linear',
                  aggregation_mode='sum',
                  deformable=False,
-                 modulated=False):
+                 modulated=False,
+                 chunk_size=0):
         """
         Initialize parameters for KPConvDeformable.
         :param kernel_size: Number of kernel points.
@@ -899,6 +912,7 @@ class KPConv(nn.Module):
         :param aggregation_mode: choose to sum influences, or only keep the closest ('closest', 'sum').
         :param deformable: choose deformable or not
         :param modulated: choose if kernel weights are modulated in addition to deformed
+        :param chunk_size: if > 0, number of query points convolved at once to limit memory
         """
         super(KPConv, self).__init__()
 
@@ -914,6 +928,7 @@ class KPConv(nn.Module):
         self.aggregation_mode = aggregation_mode
         self.deformable = deformable
         self.modulated = modulated
+        self.chunk_size = chunk_size
 
         # Running variable containing deformed KP distance to input points. (used in regularization loss)
         self.min_d2 = None
@@ -939,7 +954,8 @@ class KPConv(nn.Module):
                                       radius,
                                       fixed_kernel_points=fixed_kernel_points,
                                       KP_influence=KP_influence,
-                                      aggregation_mode=aggregation_mode)
+                                      aggregation_mode=aggregation_mode,
+                                      chunk_size=chunk_size)
             self.offset_bias = Parameter(torch.zeros(self.offset_dim,
                                                      dtype=torch.float32),
                                          requires_grad=True)
@@ -1014,8 +1030,8 @@ class KPConv(nn.Module):
                 # No modulations
                 modulations = None
 
-            # Rescale offset for this layer
-            offsets = unscaled_offsets * self.KP_extent
+            # Rescale offset for this layer (kept in fp32 under autocast)
+            offsets = unscaled_offsets.float() * self.KP_extent
 
         else:
             offsets = None
@@ -1025,19 +1041,66 @@ class KPConv(nn.Module):
         # Deformed convolution
         ######################
 
+        # Kernel distances are computed in fp32, even with autocast
+        q_pts = q_pts.float()
+        s_pts = s_pts.float()
+
         # Add a fake point in the last row for shadow neighbors
         s_pts = torch.cat((s_pts, torch.zeros_like(s_pts[:1, :]) + 1e6), 0)
 
+        # Add a zero feature for shadow neighbors
+        x = torch.cat((x, torch.zeros_like(x[:1, :])), 0)
+
+        # Apply offsets to kernel points [n_points, n_kpoints, dim]
+        if self.deformable:
+            self.deformed_KP = offsets + self.kernel_points
+        else:
+            self.deformed_KP = None
+
+        n_points = q_pts.shape[0]
+        if self.chunk_size <= 0 or n_points <= self.chunk_size:
+            out, self.min_d2 = self.convolve(q_pts, s_pts, neighb_inds, x,
+                                             self.deformed_KP, modulations)
+            return out
+
+        # Process the query points in slices to bound the size of the
+        # [n_points, n_neighbors, n_kpoints, dim] intermediate tensors
+        outputs, min_d2 = [], []
+        for i0 in range(0, n_points, self.chunk_size):
+            i1 = i0 + self.chunk_size
+            out, chunk_min_d2 = self.convolve(
+                q_pts[i0:i1], s_pts, neighb_inds[i0:i1], x,
+                None if self.deformed_KP is None else self.deformed_KP[i0:i1],
+                None if modulations is None else modulations[i0:i1])
+            outputs.append(out)
+            min_d2.append(chunk_min_d2)
+
+        self.min_d2 = torch.cat(min_d2, 0) if self.deformable else None
+
+        return torch.cat(outputs, 0)
+
+    def convolve(self, q_pts, s_pts, neighb_inds, x, deformed_KP, modulations):
+        """
+        Kernel point convolution of a set of query points.
+        :param q_pts: query points [n_points, dim]
+        :param s_pts: support points with the shadow point appended [n_supports + 1, dim]
+        :param neighb_inds: neighbor indices of the query points [n_points, n_neighbors]
+        :param x: support features with the shadow feature appended [n_supports + 1, in_fdim]
+        :param deformed_KP: deformed kernel points [n_points, n_kpoints, dim] or None
+        :param modulations: kernel point modulations [n_points, n_kpoints] or None
+        :return: output features [n_points, out_fdim] and the square distance of
+        each deformed kernel point to its closest neighbor (None if not deformable)
+        """
+
         # Get neighbor points [n_points, n_neighbors, dim]
         neighbors = s_pts[neighb_inds, :]
 
         # Center every neighborhood
         neighbors = neighbors - q_pts.unsqueeze(1)
 
-        # Apply offsets to kernel points [n_points, n_kpoints, dim]
+        # Kernel points [n_points, n_kpoints, dim] or [n_kpoints, dim]
         if self.deformable:
-            self.deformed_KP = offsets + self.kernel_points
-            deformed_K_points = self.deformed_KP.unsqueeze(1)
+            deformed_K_points = deformed_KP.unsqueeze(1)
         else:
             deformed_K_points = self.kernel_points
 
@@ -1052,7 +1115,7 @@ class KPConv(nn.Module):
         if self.deformable:
 
             # Save distances for loss
-            self.min_d2, _ = torch.min(sq_distances, dim=1)
+            min_d2, _ = torch.min(sq_distances, dim=1)
 
             # Boolean of the neighbors in range of a kernel point [n_points, n_neighbors]
             in_range = torch.any(sq_distances < self.KP_extent**2,
@@ -1083,6 +1146,7 @@ class KPConv(nn.Module):
             new_neighb_inds -= (neighb_row_bool.type(torch.int64) -
                                 1) * int(s_pts.shape[0] - 1)
         else:
+            min_d2 = None
             new_neighb_inds = neighb_inds
 
         # Get Kernel point influences [n_points, n_kpoints, n_neighbors]
@@ -1117,9 +1181,6 @@ class KPConv(nn.Module):
             raise ValueError(
                 "Unknown convolution mode. Should be 'closest' or 'sum'")
 
-        # Add a zero feature for shadow neighbors
-        x = torch.cat((x, torch.zeros_like(x[:1, :])), 0)
-
         # Get the features of each neighborhood [n_points, n_neighbors, in_fdim]
         neighb_x = gather(x, new_neighb_inds)
 
@@ -1137,7 +1198,7 @@ class KPConv(nn.Module):
         kernel_outputs = torch.matmul(weighted_features, self.weights)
 
         # Convolution sum [n_points, out_fdim]
-        return torch.sum(kernel_outputs, dim=0)
+        return torch.sum(kernel_outputs, dim=0), min_d2
 
     def __repr__(self):
         return 'KPConv(radius: {:.2f}, in_feat: {:d}, out_feat: {:d})'.format(
@@ -1305,7 +1366,8 @@ class SimpleBlock(nn.Module):
                              KP_influence=config.KP_influence,
                              aggregation_mode=config.aggregation_mode,
                              deformable='deform' in block_name,
-                             modulated=config.modulated)
+                             modulated=config.modulated,
+                             chunk_size=config.get('conv_chunk_size', 0))
 
         # Other opperations
         self.batch_norm = BatchNormBlock(out_dim // 2, self.use_bn,
@@ -1375,7 +1437,8 @@ class ResnetBottleneckBlock(nn.Module):
                              KP_influence=config.KP_influence,
                              aggregation_mode=config.aggregation_mode,
                              deformable='deform' in block_name,
-                             modulated=config.modulated)
+                             modulated=config.modulated,
+                             chunk_size=config.get('conv_chunk_size', 0))
         self.batch_norm_conv = BatchNormBlock(out_dim // 4, self.use_bn,
                                               self.bn_momentum)
 
@@ -1506,8 +1569,6 @@ import time
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
-from os import makedirs
-from os.path import join, exists
 
 # ------------------------------------------------------------------------------------------
 #
@@ -1879,22 +1940,13 @@ def kernel_point_optimization_debug(radius,
 
 def load_kernels(radius, num_kpoints, dimension, fixed, lloyd=False):
 
-    # Kernel directory
-    kernel_dir = 'kernels/dispositions'
-    if not exists(kernel_dir):
-        makedirs(kernel_dir)
-
     # To many points switch to Lloyds
     if num_kpoints > 30:
         lloyd = True
 
-    # Kernel_file
-    kernel_file = join(
-        kernel_dir, 'k_{:03d}_{:s}_{:d}D.ply'.format(num_kpoints, fixed,
-                                                     dimension))
-
-    # Check if already done
-    if not exists(kernel_file):
+    # Check if already done (user cache or shipped dispositions)
+    kernel_points = read_kernel_disposition(num_kpoints, fixed, dimension)
+    if kernel_points is None:
         if lloyd:
             # Create kernels
             kernel_points = spherical_Lloyd(1.0,
@@ -1919,11 +1971,7 @@ def load_kernels(radius, num_kpoints, dimension, fixed, lloyd=False):
             # Save points
             kernel_points = kernel_points[best_k, :, :]
 
-        write_ply(kernel_file, kernel_points, ['x', 'y', 'z'])
-
-    else:
-        data = read_ply(kernel_file)
-        kernel_points = np.vstack((data['x'], data['y'], data['z'])).T
+        write_kernel_disposition(kernel_points, num_kpoints, fixed, dimension)
 
     # Random roations for the kernel
     # N.B. 4D random rotations not supported yet
@@ -34,12 +34,12 @@ from open3d.ml.torch.ops import voxelize, ragged_to_dense
 from .base_model_objdet import BaseModel
 
 from ...utils import MODEL
-from ..utils.objdet_helper import Anchor3DRangeGenerator, BBoxCoder, multiclass_nms, limit_period, get_paddings_indicator, bbox_overlaps, box3d_to_bev2d
+from ..utils.objdet_helper import Anchor3DRangeGenerator, BBoxCoder, batched_nms, limit_period, get_paddings_indicator, bbox_overlaps, box3d_to_bev2d, scatter_max_, scatter_min_
 from ..modules.losses.focal_loss import FocalLoss
 from ..modules.losses.smooth_L1 import SmoothL1Loss
 from ..modules.losses.cross_entropy import CrossEntropyLoss
-from ...datasets.utils import ObjdetAugmentation, BEVBox3D
-from ...datasets.utils.operations import filter_by_min_points
+from ...datasets.utils import ObjdetAugmentation, BEVBox3D, BoxArray
+from ...datasets.utils.gt_database import GTDatabase
 
 
 class PointPillars(BaseModel):
@@ -53,7 +53,10 @@ class PointPillars(BaseModel):
         voxel_size: voxel edge lengths with format [x, y, z].
         point_cloud_range: The valid range of point coordinates as
             [x_min, y_min, z_min, x_max, y_max, z_max].
-        voxelize: Config of PointPillarsVoxelization module.
+        voxelize: Config of PointPillarsVoxelization module. With
+            batched: True, the samples are voxelized at once with torch ops
+            instead of the voxelize op, see
+            PointPillarsVoxelization.forward_batch.
         voxelize_encoder: Config of PillarFeatureNet module.
         scatter: Config of PointPillarsScatter module.
         backbone: Config of backbone module (SECOND).
@@ -105,7 +108,7 @@ class PointPillars(BaseModel):
         """Extract features from points."""
         voxels, num_points, coors = self.voxelize(points)
         voxel_features = self.voxel_encoder(voxels, num_points, coors)
-        batch_size = coors[-1, 0].item() + 1
+        batch_size = len(points)
         x = self.middle_encoder(voxel_features, coors, batch_size)
         x = self.backbone(x)
         x = self.neck(x)
@@ -113,7 +116,21 @@ class PointPillars(BaseModel):
 
     @torch.no_grad()
     def voxelize(self, points):
-        """Apply hard voxelization to points."""
+        """Apply hard voxelization to points.
+
+        With the batched option of the voxelization, the points of all
+        samples are voxelized at once, see
+        PointPillarsVoxelization.forward_batch.
+        """
+        if self.voxel_layer.batched:
+            num_points = torch.tensor([len(p) for p in points],
+                                      device=points[0].device)
+            row_splits = F.pad(torch.cumsum(num_points, 0), (1, 0))
+
+            voxels, coors, num_points = self.voxel_layer.forward_batch(
+                torch.cat(points, dim=0), row_splits)
+            return voxels, num_points, coors
+
         voxels, coors, num_points = [], [], []
         for res in points:
             res_voxels, res_coors, res_num_points = self.voxel_layer(res)
@@ -140,13 +157,17 @@ class PointPillars(BaseModel):
 
     def loss(self, results, inputs):
         scores, bboxes, dirs = results
-        gt_labels = inputs['labels']
-        gt_bboxes = inputs['bboxes']
+        gt_labels = inputs.labels
+        gt_bboxes = inputs.bboxes
 
         # generate and filter bboxes
         target_bboxes, target_idx, pos_idx, neg_idx = self.bbox_head.assign_bboxes(
             bboxes, gt_bboxes)
 
+        # targets of all samples, indexed by target_idx
+        gt_labels = torch.cat(gt_labels, axis=0)
+        gt_bboxes = torch.cat(gt_bboxes, axis=0)
+
         avg_factor = pos_idx.size(0)
 
         # classification loss
@@ -237,20 +258,10 @@ class PointPillars(BaseModel):
         return new_data
 
     def load_gt_database(self, pickle_path, min_points_dict, sample_dict):
-        db_boxes = pickle.load(open(pickle_path, 'rb'))
-
-        if min_points_dict is not None:
-            db_boxes = filter_by_min_points(db_boxes, min_points_dict)
-
-        db_boxes_dict = {}
-        for key in sample_dict.keys():
-            db_boxes_dict[key] = []
+        db = GTDatabase.load(pickle_path)
+        db.index_classes(sample_dict.keys(), min_points_dict)
 
-        for db_box in db_boxes:
-            if db_box.label_class in sample_dict.keys():
-                db_boxes_dict[db_box.label_class].append(db_box)
-
-        self.db_boxes_dict = db_boxes_dict
+        self.db_boxes_dict = db
 
     def augment_data(self, data, attr):
         cfg = self.cfg.augment
@@ -261,7 +272,9 @@ class PointPillars(BaseModel):
                 # remove tail of path to get root data path
                 for _ in range(3):
                     data_path = os.path.split(data_path)[0]
-                pickle_path = os.path.join(data_path, 'bboxes.pkl')
+                pickle_path = os.path.join(data_path, 'gt_database')
+                if not os.path.exists(pickle_path):
+                    pickle_path = os.path.join(data_path, 'bboxes.pkl')
                 self.load_gt_database(pickle_path, **cfg['ObjectSample'])
 
             data = ObjdetAugmentation.ObjectSample(
@@ -283,19 +296,12 @@ class PointPillars(BaseModel):
         if attr['split'] not in ['test', 'testing', 'val', 'validation']:
             data = self.augment_data(data, attr)
 
-        points = torch.tensor([data['point']],
-                              dtype=torch.float32,
-                              device=self.device)
+        points = np.array(data['point'], dtype=np.float32)
 
-        labels = torch.tensor([
-            self.name2lbl.get(bb.label_class, len(self.classes))
-            for bb in data['bbox_objs']
-        ],
-                              dtype=torch.int64,
-                              device=self.device)
-        bboxes = torch.tensor([bb.to_xyzwhlr() for bb in data['bbox_objs']],
-                              dtype=torch.float32,
-                              device=self.device)
+        bboxes, label_class = BEVBox3D.to_arrays(data['bbox_objs'])
+        labels = np.full((len(bboxes),), len(self.classes), dtype=np.int64)
+        for i, name in enumerate(self.classes):
+            labels[label_class == name] = i
 
         return {
             'point': points,
@@ -306,29 +312,27 @@ class PointPillars(BaseModel):
         }
 
     def inference_end(self, results, inputs):
+        # decode and nms in fp32 in case the network ran with autocast
+        results = [r.float() for r in results]
         bboxes_b, scores_b, labels_b = self.bbox_head.get_bboxes(*results)
 
         inference_result = []
 
-        world_cam, cam_img = None, None
-        if 'calib' in inputs and inputs['calib'] is not None:
-            calib = inputs['calib']
-            world_cam = calib.get('world_cam', None)
-            cam_img = calib.get('cam_img', None)
-
-        for _bboxes, _scores, _labels in zip(bboxes_b, scores_b, labels_b):
+        for _bboxes, _scores, _labels, calib in zip(bboxes_b, scores_b,
+                                                    labels_b, inputs.calib):
             bboxes = _bboxes.cpu().numpy()
             scores = _scores.cpu().numpy()
             labels = _labels.cpu().numpy()
-            inference_result.append([])
 
-            for bbox, score, label in zip(bboxes, scores, labels):
-                dim = bbox[[3, 5, 4]]
-                pos = bbox[:3] + [0, 0, dim[1] / 2]
-                yaw = bbox[-1]
-                name = self.lbl2name.get(label, "ignore")
-                inference_result[-1].append(
-                    BEVBox3D(pos, dim, yaw, name, score, world_cam, cam_img))
+            world_cam, cam_img = None, None
+            if calib is not None:
+                world_cam = calib.get('world_cam', None)
+                cam_img = calib.get('cam_img', None)
+
+            names = [self.lbl2name.get(label, "ignore") for label in labels]
+            inference_result.append(
+                BoxArray.from_xyzwhlr(bboxes, names, scores, world_cam,
+                                      cam_img))
 
         return inference_result
 
@@ -342,7 +346,8 @@ class PointPillarsVoxelization(torch.nn.Module):
                  voxel_size,
                  point_cloud_range,
                  max_num_points=32,
-                 max_voxels=[16000, 40000]):
+                 max_voxels=[16000, 40000],
+                 batched=False):
         """Voxelization layer for the PointPillars model.
 
         Args:
@@ -352,6 +357,9 @@ class PointPillarsVoxelization(torch.nn.Module):
             max_num_points: The maximum number of points per voxel.
             max_voxels: The maximum number of voxels. May be a tuple with
                 values for training and testing.
+            batched: Voxelize all samples of a batch at once with
+                forward_batch instead of calling the voxelize op for each
+                sample. See forward_batch for the differences.
         """
         super().__init__()
         self.voxel_size = torch.Tensor(voxel_size)
@@ -360,6 +368,7 @@ class PointPillarsVoxelization(torch.nn.Module):
         self.points_range_max = torch.Tensor(point_cloud_range[3:])
 
         self.max_num_points = max_num_points
+        self.batched = batched
         if isinstance(max_voxels, tuple) or isinstance(max_voxels, list):
             self.max_voxels = max_voxels
         else:
@@ -407,6 +416,100 @@ class PointPillarsVoxelization(torch.nn.Module):
 
         return out_voxels, out_coords, out_num_points
 
+    def forward_batch(self, points_feats, row_splits):
+        """Voxelization of all point clouds of a batch in one call.
+
+        This is the voxelization of PointPillars.voxelize with the batched
+        option. The voxelize op handles a single point cloud, so this path
+        is implemented with torch operations. Points are in the range if
+        range_min <= p < range_max. max_voxels applies to each point cloud
+        and keeps the voxels with the smallest [z,y,x] coords. Each voxel
+        keeps its first max_num_points points. The op is not checked against
+        these rules, so the range bound and the voxels kept at max_voxels
+        may differ from it.
+
+        Args:
+            points_feats: Tensor with point coordinates and features of all
+                point clouds of the batch. The shape is [N, 3+C].
+            row_splits: 1D tensor with the start and end index of each point
+                cloud in points_feats. The shape is [batch_size+1].
+        Returns:
+            (out_voxels, out_coords, out_num_points).
+            - out_voxels is a dense list of point coordinates and features for
+              each voxel. The shape is [num_voxels, max_num_points, 3+C].
+            - out_coords is tensor with the integer voxel coords and shape
+              [num_voxels,4]. Note that the order of dims is [batch,z,y,x].
+            - out_num_points is a 1D tensor with the number of points for each
+              voxel.
+        """
+        if self.training:
+            max_voxels = self.max_voxels[0]
+        else:
+            max_voxels = self.max_voxels[1]
+
+        device = points_feats.device
+        batch_size = len(row_splits) - 1
+        voxel_size = self.voxel_size.to(device)
+        range_min = self.points_range_min.to(device)
+        range_max = self.points_range_max.to(device)
+        nx, ny, nz = (torch.floor(
+            (range_max - range_min) / voxel_size).long() + 1).tolist()
+
+        # batch index of each point
+        batch_inds = torch.repeat_interleave(
+            torch.arange(batch_size, device=device),
+            row_splits[1:] - row_splits[:-1])
+
+        # integer voxel coords of the points inside the range
+        points = points_feats[:, :3]
+        point_inds = torch.nonzero(
+            ((points >= range_min) & (points < range_max)).all(dim=1),
+            as_tuple=False).squeeze(-1)
+        coords = torch.floor(
+            (points[point_inds] - range_min) / voxel_size).long()
+        keys = ((batch_inds[point_inds] * nz + coords[:, 2]) * ny +
+                coords[:, 1]) * nx + coords[:, 0]
+
+        # voxels ordered by [batch,z,y,x]
+        voxel_keys, inverse, counts = torch.unique(keys,
+                                                   return_inverse=True,
+                                                   return_counts=True)
+        voxel_batch = voxel_keys // (nx * ny * nz)
+
+        # keep the first max_voxels voxels of each point cloud
+        batch_counts = torch.bincount(voxel_batch, minlength=batch_size)
+        batch_start = torch.cumsum(batch_counts, 0) - batch_counts
+        keep_voxel = (torch.arange(len(voxel_keys), device=device) -
+                      batch_start[voxel_batch]) < max_voxels
+
+        # rank of each point in its voxel, following the input order
+        order = torch.sort(inverse * len(keys) +
+                           torch.arange(len(keys), device=device))[1]
+        voxel_start = torch.cumsum(counts, 0) - counts
+        point_rank = torch.empty_like(order)
+        point_rank[order] = torch.arange(
+            len(order), device=device) - voxel_start[inverse[order]]
+        keep_point = (point_rank < self.max_num_points) & keep_voxel[inverse]
+
+        # gather the kept points in a dense [num_voxels, max_num_points] grid
+        voxel_ids = torch.cumsum(keep_voxel, 0) - 1
+        out_voxels = points_feats.new_zeros(
+            (int(keep_voxel.sum()), self.max_num_points, points_feats.shape[1]))
+        out_voxels[voxel_ids[inverse[keep_point]],
+                   point_rank[keep_point]] = points_feats[
+                       point_inds[keep_point]]
+
+        voxel_keys = voxel_keys[keep_voxel]
+        out_coords = torch.stack([
+            voxel_keys // (nx * ny * nz), voxel_keys //
+            (nx * ny) % nz, voxel_keys // nx % ny, voxel_keys % nx
+        ],
+                                 dim=1).int()
+        out_num_points = torch.clamp(counts[keep_voxel],
+                                     max=self.max_num_points)
+
+        return out_voxels, out_coords, out_num_points
+
 
 class PFNLayer(nn.Module):
     """Pillar Feature Net Layer.
@@ -601,39 +704,23 @@ class PointPillarsScatter(nn.Module):
 
     #@auto_fp16(apply_to=('voxel_features', ))
     def forward(self, voxel_features, coors, batch_size):
-        """Scatter features of single sample.
+        """Scatter features of all samples of the batch.
 
         Args:
-            voxel_features (torch.Tensor): Voxel features in shape (N, M, C).
+            voxel_features (torch.Tensor): Voxel features in shape (N, C).
             coors (torch.Tensor): Coordinates of each voxel in shape (N, 4).
                 The first column indicates the sample ID.
             batch_size (int): Number of samples in the current batch.
         """
-        # batch_canvas will be the final output.
-        batch_canvas = []
-        for batch_itt in range(batch_size):
-            # Create the canvas for this sample
-            canvas = torch.zeros(self.in_channels,
-                                 self.nx * self.ny,
-                                 dtype=voxel_features.dtype,
-                                 device=voxel_features.device)
-
-            # Only include non-empty pillars
-            batch_mask = coors[:, 0] == batch_itt
-            this_coors = coors[batch_mask, :]
-            indices = this_coors[:, 2] * self.nx + this_coors[:, 3]
-            indices = indices.type(torch.long)
-            voxels = voxel_features[batch_mask, :]
-            voxels = voxels.t()
-
-            # Now scatter the blob back to the canvas.
-            canvas[:, indices] = voxels
-
-            # Append to a list for later stacking.
-            batch_canvas.append(canvas)
-
-        # Stack to 3-dim tensor (batch-size, in_channels, nrows*ncols)
-        batch_canvas = torch.stack(batch_canvas, 0)
+        # Preallocate the canvas of the whole batch
+        batch_canvas = voxel_features.new_zeros(batch_size, self.in_channels,
+                                                self.ny * self.nx)
+
+        # Scatter the pillars of all samples at once, using the sample ID
+        # and the flattened y * nx + x position of each pillar
+        batch_inds = coors[:, 0].long()
+        indices = (coors[:, 2] * self.nx + coors[:, 3]).long()
+        batch_canvas[batch_inds, :, indices] = voxel_features
 
         # Undo the column stacking to final 4-dim tensor
         batch_canvas = batch_canvas.view(batch_size, self.in_channels, self.ny,
@@ -869,25 +956,39 @@ class Anchor3DHead(nn.Module):
     def assign_bboxes(self, pred_bboxes, target_bboxes):
         """Assigns target bboxes to given anchors.
 
+        The targets of all samples are assigned at once. IoUs are only
+        computed for the anchors near each target (see
+        ``Anchor3DRangeGenerator.overlapping_anchors``), so the cost scales
+        with the area covered by the targets instead of targets x anchors.
+
         Args:
-            pred_bboxes (torch.Tensor): Bbox predictions (anchors).
-            target_bboxes (torch.Tensor): Bbox targets.
+            pred_bboxes (torch.Tensor): Bbox predictions (anchors) of the
+                batch.
+            target_bboxes (list[torch.Tensor]): Bbox targets of each sample.
 
         Returns:
             torch.Tensor: Assigned target bboxes for each given anchor.
-            torch.Tensor: Flat index of matched targets.
-            torch.Tensor: Index of positive matches.
-            torch.Tensor: Index of negative matches.
+            torch.Tensor: Flat index of matched targets in the concatenated
+                targets of the batch.
+            torch.Tensor: Flat index of positive matches over the batch.
+            torch.Tensor: Flat index of negative matches over the batch.
         """
-
-        # compute all anchors
-        anchors = self.anchor_generator.grid_anchors(pred_bboxes.shape[-2:],
-                                                     device=pred_bboxes.device)
-
-        rot_angles = anchors[0].shape[-2]
-
-        # init the tensors for the final result
-        assigned_bboxes, target_idxs, pos_idxs, neg_idxs = [], [], [], []
+        featmap_size = pred_bboxes.shape[-2:]
+        device = pred_bboxes.device
+
+        # flattened anchors of each range and their BEV boxes (cached)
+        anchors, anchors_bev = self.anchor_generator.grid_anchors_per_range(
+            featmap_size, device=device)
+        num_anchors = sum(len(a) for a in anchors)
+        rot_angles = len(self.anchor_generator.rotations)
+
+        # targets of all samples and the sample of each target
+        batch_size = len(target_bboxes)
+        targets = torch.cat(target_bboxes, axis=0).to(device)
+        target_batch = torch.repeat_interleave(
+            torch.arange(batch_size, device=device),
+            torch.tensor([len(b) for b in target_bboxes], device=device))
+        target_bev = box3d_to_bev2d(targets)
 
         def flatten_idx(idx, j):
             """inject class dimension in the given indices (... z * rot_angles + x) --> (.. z * num_classes * rot_angles + j * rot_angles + x)"""
@@ -896,40 +997,61 @@ class Anchor3DHead(nn.Module):
 
             return z * self.num_classes * rot_angles + j * rot_angles + x
 
+        assigned_bboxes, target_idxs, pos_idxs, neg_idxs = [], [], [], []
         for i, (neg_th, pos_th) in enumerate(self.iou_thr):
-            anchors_stride = anchors[...,
-                                     i, :, :].reshape(-1, self.box_code_size)
-
-            # compute a fast approximation of IoU
-            overlaps = bbox_overlaps(box3d_to_bev2d(target_bboxes),
-                                     box3d_to_bev2d(anchors_stride))
-
-            # for each anchor the gt with max IoU
-            max_overlaps, argmax_overlaps = overlaps.max(dim=0)
+            anchors_stride = anchors[i]
+            range_anchors = len(anchors_stride)
+
+            # IoU of every (target, nearby anchor) pair, anchors are indexed
+            # over the batch
+            gt_idx, anchor_idx = self.anchor_generator.overlapping_anchors(
+                featmap_size, i, target_bev)
+            overlaps = bbox_overlaps(target_bev[gt_idx],
+                                     anchors_bev[i][anchor_idx],
+                                     is_aligned=True)
+            batch_anchor_idx = target_batch[gt_idx] * range_anchors + anchor_idx
+
+            # for each anchor the max IoU, anchors without a nearby gt have 0
+            max_overlaps = overlaps.new_zeros(batch_size * range_anchors)
+            scatter_max_(max_overlaps, batch_anchor_idx, overlaps)
+            # for each anchor the gt with max IoU (lowest index on ties)
+            is_max = overlaps == max_overlaps[batch_anchor_idx]
+            argmax_overlaps = torch.full((batch_size * range_anchors,),
+                                         len(targets),
+                                         dtype=torch.long,
+                                         device=device)
+            scatter_min_(argmax_overlaps, batch_anchor_idx[is_max],
+                         gt_idx[is_max])
             # for each gt the anchor with max IoU
-            gt_max_overlaps = overlaps.max(dim=1)[0]
+            gt_max_overlaps = overlaps.new_zeros(len(targets))
+            scatter_max_(gt_max_overlaps, gt_idx, overlaps)
 
             pos_idx = max_overlaps >= pos_th
-            neg_idx = (max_overlaps >= 0) & (max_overlaps < neg_th)
+            neg_idx = max_overlaps < neg_th
 
-            # low-quality matching
-            for k in range(len(target_bboxes)):
-                if gt_max_overlaps[k] >= neg_th:
-                    pos_idx[overlaps[k, :] == gt_max_overlaps[k]] = True
+            # low-quality matching: every gt with an IoU above the negative
+            # threshold keeps the anchors it overlaps best
+            low_quality = (overlaps == gt_max_overlaps[gt_idx]) & (
+                gt_max_overlaps[gt_idx] >= neg_th)
+            pos_idx[batch_anchor_idx[low_quality]] = True
+
+            pos_idx = pos_idx.nonzero(as_tuple=False).squeeze(-1)
+            neg_idx = neg_idx.nonzero(as_tuple=False).squeeze(-1)
+            max_idx = argmax_overlaps[pos_idx]
 
             # encode bbox for positive matches
             assigned_bboxes.append(
-                self.bbox_coder.encode(anchors_stride[pos_idx],
-                                       target_bboxes[argmax_overlaps[pos_idx]]))
-            target_idxs.append(argmax_overlaps[pos_idx])
+                self.bbox_coder.encode(anchors_stride[pos_idx % range_anchors],
+                                       targets[max_idx]))
+            target_idxs.append(max_idx)
 
             # store global indices in list
-            pos_idx = flatten_idx(
-                pos_idx.nonzero(as_tuple=False).squeeze(-1), i)
-            neg_idx = flatten_idx(
-                neg_idx.nonzero(as_tuple=False).squeeze(-1), i)
-            pos_idxs.append(pos_idx)
-            neg_idxs.append(neg_idx)
+            pos_idxs.append(
+                flatten_idx(pos_idx % range_anchors, i) +
+                pos_idx // range_anchors * num_anchors)
+            neg_idxs.append(
+                flatten_idx(neg_idx % range_anchors, i) +
+                neg_idx // range_anchors * num_anchors)
 
         return (torch.cat(assigned_bboxes,
                           axis=0), torch.cat(target_idxs, axis=0),
@@ -938,75 +1060,73 @@ class Anchor3DHead(nn.Module):
     def get_bboxes(self, cls_scores, bbox_preds, dir_preds):
         """Get bboxes of anchor head.
 
-        Args:
-            cls_scores (list[torch.Tensor]): Class scores.
-            bbox_preds (list[torch.Tensor]): Bbox predictions.
-            dir_cls_preds (list[torch.Tensor]): Direction
-                class predictions.
-
-        Returns:
-            tuple[torch.Tensor]: Prediction results of batches 
-                (bboxes, scores, labels).
-        """
-        bboxes, scores, labels = [], [], []
-        for cls_score, bbox_pred, dir_pred in zip(cls_scores, bbox_preds,
-                                                  dir_preds):
-            b, s, l = self.get_bboxes_single(cls_score, bbox_pred, dir_pred)
-            bboxes.append(b)
-            scores.append(s)
-            labels.append(l)
-        return bboxes, scores, labels
-
-    def get_bboxes_single(self, cls_scores, bbox_preds, dir_preds):
-        """Get bboxes of anchor head.
+        All samples are decoded together and one batched nms covers the
+        boxes of every (sample, class) pair (see ``batched_nms``).
 
         Args:
-            cls_scores (list[torch.Tensor]): Class scores.
-            bbox_preds (list[torch.Tensor]): Bbox predictions.
-            dir_cls_preds (list[torch.Tensor]): Direction
-                class predictions.
+            cls_scores (torch.Tensor): Class scores of the batch.
+            bbox_preds (torch.Tensor): Bbox predictions of the batch.
+            dir_cls_preds (torch.Tensor): Direction
+                class predictions of the batch.
 
         Returns:
-            tuple[torch.Tensor]: Prediction results of batches 
+            tuple[list[torch.Tensor]]: Prediction results of each sample
                 (bboxes, scores, labels).
         """
         assert cls_scores.size()[-2:] == bbox_preds.size()[-2:]
         assert cls_scores.size()[-2:] == dir_preds.size()[-2:]
 
+        batch_size, _, ny, nx = cls_scores.shape
         anchors = self.anchor_generator.grid_anchors(cls_scores.shape[-2:],
                                                      device=cls_scores.device)
         anchors = anchors.reshape(-1, self.box_code_size)
+        num_base_anchors = len(anchors) // (ny * nx)
+
+        # [batch_size, anchors per location, channels, ny, nx], the anchors
+        # are flattened in (ny, nx, anchors per location) order
+        cls_scores = cls_scores.reshape(batch_size, num_base_anchors,
+                                        self.num_classes, ny, nx)
+        bbox_preds = bbox_preds.reshape(batch_size, num_base_anchors,
+                                        self.box_code_size, ny, nx)
+        dir_preds = dir_preds.reshape(batch_size, num_base_anchors, 2, ny, nx)
+
+        # select the top anchors before gathering the predictions, the
+        # sigmoid is monotonic so it only needs the per-anchor maximum
+        max_scores = cls_scores.max(dim=2)[0].sigmoid().permute(0, 2, 3, 1)
+        max_scores = max_scores.reshape(batch_size, -1)
+        if max_scores.shape[1] > self.nms_pre:
+            _, topk_inds = max_scores.topk(self.nms_pre, dim=1)
+        else:
+            topk_inds = torch.arange(max_scores.shape[1],
+                                     device=max_scores.device).expand(
+                                         batch_size, -1)
 
-        dir_preds = dir_preds.permute(1, 2, 0).reshape(-1, 2)
-        dir_scores = torch.max(dir_preds, dim=-1)[1]
-
-        cls_scores = cls_scores.permute(1, 2, 0).reshape(-1, self.num_classes)
-        scores = cls_scores.sigmoid()
-
-        bbox_preds = bbox_preds.permute(1, 2, 0).reshape(-1, self.box_code_size)
+        a = topk_inds % num_base_anchors
+        y = topk_inds // num_base_anchors // nx
+        x = topk_inds // num_base_anchors % nx
+        b = torch.arange(batch_size, device=a.device)[:, None]
 
-        if scores.shape[0] > self.nms_pre:
-            max_scores, _ = scores.max(dim=1)
-            _, topk_inds = max_scores.topk(self.nms_pre)
-            anchors = anchors[topk_inds, :]
-            bbox_preds = bbox_preds[topk_inds, :]
-            scores = scores[topk_inds, :]
-            dir_scores = dir_scores[topk_inds]
+        anchors = anchors[topk_inds.reshape(-1)]
+        scores = cls_scores[b, a, :, y, x].reshape(-1,
+                                                   self.num_classes).sigmoid()
+        bbox_preds = bbox_preds[b, a, :, y, x].reshape(-1, self.box_code_size)
+        dir_scores = torch.max(dir_preds[b, a, :, y, x], dim=-1)[1].reshape(-1)
 
         bboxes = self.bbox_coder.decode(anchors, bbox_preds)
 
-        idxs = multiclass_nms(bboxes, scores, self.score_thr)
-
-        labels = [
-            torch.full((len(idxs[i]),), i, dtype=torch.long)
-            for i in range(self.num_classes)
-        ]
-        labels = torch.cat(labels)
+        # one nms over all (sample, class) pairs above the threshold
+        idxs, labels = (scores > self.score_thr).nonzero(as_tuple=True)
+        batch_idxs = idxs // topk_inds.shape[1]
+        groups = batch_idxs * self.num_classes + labels
+        keep = batched_nms(bboxes[idxs], scores[idxs, labels], groups)
 
-        scores = [scores[idxs[i], i] for i in range(self.num_classes)]
-        scores = torch.cat(scores)
+        # order the kept boxes by sample and class, then by score, the
+        # position in the key keeps the score order without a stable sort
+        keep = keep[torch.argsort(groups[keep] * len(keep) +
+                                  torch.arange(len(keep), device=keep.device))]
+        idxs, labels, batch_idxs = idxs[keep], labels[keep], batch_idxs[keep]
 
-        idxs = torch.cat(idxs)
+        scores = scores[idxs, labels]
         bboxes = bboxes[idxs]
         dir_scores = dir_scores[idxs]
 
@@ -1015,4 +1135,7 @@ class Anchor3DHead(nn.Module):
             bboxes[..., 6] = (dir_rot + self.dir_offset +
                               np.pi * dir_scores.to(bboxes.dtype))
 
-        return bboxes, scores, labels
+        # split the results by sample
+        counts = torch.bincount(batch_idxs, minlength=batch_size).tolist()
+        return (list(bboxes.split(counts)), list(scores.split(counts)),
+                list(labels.split(counts)))
@@ -41,6 +41,7 @@ class RandLANet(BaseModel):
             batcher='DefaultBatcher',
             ckpt_path=None,
             weight_decay=0.0,
+            grad_checkpoint=False,  # Recompute encoder activations in backward
             **kwargs):
 
         super().__init__(name=name,
@@ -57,6 +58,7 @@ class RandLANet(BaseModel):
                          batcher=batcher,
                          ckpt_path=ckpt_path,
                          weight_decay=weight_decay,
+                         grad_checkpoint=grad_checkpoint,
                          **kwargs)
         cfg = self.cfg
 
@@ -135,9 +137,11 @@ class RandLANet(BaseModel):
 
         for b in range(results.size()[0]):
 
-            result = torch.reshape(results[b], (-1, self.cfg.num_classes))
+            # accumulate in fp32 even if the network ran with autocast
+            result = torch.reshape(results[b].float(),
+                                   (-1, self.cfg.num_classes))
             probs = torch.nn.functional.softmax(result, dim=-1)
-            probs = result.cpu().data.numpy()
+            probs = probs.cpu().data.numpy()
             labels = np.argmax(probs, 1)
             inds = inputs['data']['point_inds'][b]
 
@@ -357,14 +361,30 @@ class RandLANet(BaseModel):
     def forward_gather_neighbour(self, pc, neighbor_idx):
         # pc:           BxNxd
         # neighbor_idx: BxNxK
+        # returns:      BxdxNxK
+        features = self.gather_neighbour(pc, neighbor_idx)
+        return features.permute(0, 3, 1, 2)
+
+    @staticmethod
+    def gather_neighbour(pc, neighbor_idx):
+        """
+        Gathers neighbours with a single index_select on the flattened batch.
+        This avoids building expanded BxdxNxK index tensors.
+        :param pc: [B, N, d] point coordinates or features
+        :param neighbor_idx: [B, N', K] neighbour indices
+        :return: [B, N', K, d] neighbour coordinates or features
+        """
         B, N, K = neighbor_idx.size()
-        d = pc.size()[2]
+        num_points, d = pc.size()[1:]
+
+        if B > 1:
+            offsets = torch.arange(B, device=neighbor_idx.device) * num_points
+            neighbor_idx = neighbor_idx + offsets.view(B, 1, 1)
 
-        extended_idx = neighbor_idx.unsqueeze(1).expand(B, d, N, K)
-        extended_coords = pc.transpose(-2, -1).unsqueeze(-1).expand(B, d, N, K)
-        features = torch.gather(extended_coords, 2, extended_idx)
+        features = pc.reshape(B * num_points,
+                              d).index_select(0, neighbor_idx.reshape(-1))
 
-        return features
+        return features.view(B, N, K, d)
 
     def forward_att_pooling(self, feature_set, name):
         # feature_set: BxdxNxK
@@ -395,18 +415,18 @@ class RandLANet(BaseModel):
 
     def forward_relative_pos_encoding(self, xyz, neigh_idx):
         B, N, K = neigh_idx.size()
-        neighbor_xyz = self.forward_gather_neighbour(xyz, neigh_idx)
+        neighbor_xyz = self.gather_neighbour(xyz, neigh_idx)
 
-        xyz_tile = xyz.transpose(-2, -1).unsqueeze(-1).expand(B, 3, N, K)
-        #xyz_tile = xyz.unsqueeze(2).repeat(1, 1, neigh_idx.size()[-1], 1)
+        # Broadcast instead of tiling, all parts are written by a single cat
+        xyz_tile = xyz.unsqueeze(2).expand(B, N, K, 3)
 
         relative_xyz = xyz_tile - neighbor_xyz
         relative_dis = torch.sqrt(
-            torch.sum(torch.square(relative_xyz), dim=1, keepdim=True))
+            torch.sum(torch.square(relative_xyz), dim=-1, keepdim=True))
         relative_feature = torch.cat(
-            [relative_dis, relative_xyz, xyz_tile, neighbor_xyz], axis=1)
+            [relative_dis, relative_xyz, xyz_tile, neighbor_xyz], dim=-1)
 
-        return relative_feature
+        return relative_feature.permute(0, 3, 1, 2)
 
     def forward_building_block(self, xyz, feature, neigh_idx, name):
         f_xyz = self.forward_relative_pos_encoding(xyz, neigh_idx)
@@ -472,8 +492,13 @@ class RandLANet(BaseModel):
         f_encoder_list = []
         for i in range(self.cfg.num_layers):
             name = 'Encoder_layer_' + str(i)
-            f_encoder_i = self.forward_dilated_res_block(
-                feature, xyz[i], neigh_idx[i], self.cfg.dim_output[i], name)
+            if self.cfg.grad_checkpoint and self.training:
+                f_encoder_i = helper_torch.checkpoint_bn(
+                    self, self.forward_dilated_res_block, feature, xyz[i],
+                    neigh_idx[i], self.cfg.dim_output[i], name)
+            else:
+                f_encoder_i = self.forward_dilated_res_block(
+                    feature, xyz[i], neigh_idx[i], self.cfg.dim_output[i], name)
             f_sampled_i = self.random_sample(f_encoder_i, sub_idx[i])
             feature = f_sampled_i
             if i == 0:
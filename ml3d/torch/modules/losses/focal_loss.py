@@ -29,7 +29,8 @@ class FocalLoss(nn.Module):
         self.loss_weight = loss_weight
 
     def forward(self, pred, target, weight=None, avg_factor=None):
-
+        # the focal weight pow() is unstable in half precision
+        pred = pred.float()
         pred_sigmoid = pred.sigmoid()
 
         target = one_hot(target, int(pred.shape[-1])).type_as(pred)
@@ -1,6 +1,7 @@
 import numpy as np
 import yaml
 import torch
+import contextlib
 from abc import ABC, abstractmethod
 
 from os.path import join, exists, dirname, abspath
@@ -49,6 +50,85 @@ class BasePipeline(ABC):
             self.device = torch.device('cuda' if len(device.split(':')) ==
                                        1 else 'cuda:' + device.split(':')[1])
 
+        self.amp_dtype = self.get_amp_dtype()
+        self.scaler = self.get_scaler()
+
+    def get_amp_dtype(self):
+        """Returns the dtype used for mixed precision or None if disabled.
+
+        Mixed precision is enabled with ``mixed_precision: true`` in the
+        pipeline config. ``amp_dtype`` can be 'float16' or 'bfloat16'. By
+        default bfloat16 is used on CPU and float16 on accelerators. Before
+        torch 1.10 only float16 on CUDA is supported.
+        """
+        if not self.cfg.get('mixed_precision', False):
+            return None
+
+        amp_dtype = self.cfg.get('amp_dtype', None)
+        if amp_dtype is None:
+            amp_dtype = 'bfloat16' if self.device.type == 'cpu' else 'float16'
+        if amp_dtype not in ['float16', 'bfloat16']:
+            raise ValueError(f"Unsupported amp_dtype {amp_dtype}, "
+                             "should be 'float16' or 'bfloat16'.")
+        if amp_dtype == 'float16' and self.device.type == 'cpu':
+            raise ValueError("float16 autocast is not supported on CPU, "
+                             "use amp_dtype 'bfloat16'.")
+        if not hasattr(torch, 'autocast') and (amp_dtype != 'float16' or
+                                               self.device.type != 'cuda'):
+            raise ValueError(f"{amp_dtype} autocast on {self.device.type} "
+                             "needs torch >= 1.10.")
+
+        return getattr(torch, amp_dtype)
+
+    def get_scaler(self):
+        """Returns the gradient scaler, or None if the gradients are not
+        scaled. Only float16 gradients on CUDA are scaled.
+        """
+        if self.amp_dtype != torch.float16 or self.device.type != 'cuda':
+            return None
+        if hasattr(torch, 'amp') and hasattr(torch.amp, 'GradScaler'):
+            return torch.amp.GradScaler('cuda')
+
+        return torch.cuda.amp.GradScaler()
+
+    def autocast(self):
+        """Returns the autocast context for the forward pass.
+
+        The context is a no-op if mixed precision is disabled.
+        """
+        if self.amp_dtype is None:
+            return contextlib.nullcontext()
+        if not hasattr(torch, 'autocast'):
+            return torch.cuda.amp.autocast()
+
+        return torch.autocast(device_type=self.device.type,
+                              dtype=self.amp_dtype)
+
+    def optimizer_step(self, loss):
+        """Runs the backward pass of loss and steps the optimizer.
+
+        The gradients go through the gradient scaler if there is one, they
+        are unscaled before clipping them to ``grad_clip_norm`` of the model
+        config.
+        """
+        model = self.model
+        scaler = self.scaler
+        self.optimizer.zero_grad()
+        if scaler is None:
+            loss.backward()
+        else:
+            scaler.scale(loss).backward()
+        if model.cfg.get('grad_clip_norm', -1) > 0:
+            if scaler is not None:
+                scaler.unscale_(self.optimizer)
+            torch.nn.utils.clip_grad_value_(model.parameters(),
+                                            model.cfg.grad_clip_norm)
+        if scaler is None:
+            self.optimizer.step()
+        else:
+            scaler.step(self.optimizer)
+            scaler.update()
+
     @abstractmethod
     def run_inference(self, data):
         """
@@ -7,17 +7,17 @@ import re
 from datetime import datetime
 
 from os.path import exists, join
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, RandomSampler
 from pathlib import Path
 
 from .base_pipeline import BasePipeline
-from ..dataloaders import TorchDataloader
+from ..dataloaders import TorchDataloader, ObjectDetectBatcher
 from torch.utils.tensorboard import SummaryWriter
 from ..utils import latest_torch_ckpt
 from ...utils import make_dir, PIPELINE, LogRecord, get_runid, code2md
 from ...datasets.utils import BEVBox3D
 
-from ...metrics.mAP import mAP
+from ...metrics.mAP import MAPEvaluator
 
 logging.setLogRecordFactory(LogRecord)
 logging.basicConfig(
@@ -27,9 +27,22 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
+def worker_init_fn(worker_id):
+    """Seed numpy in each DataLoader worker so that random augmentations
+    differ between workers."""
+    np.random.seed(torch.initial_seed() % 2**32)
+
+
 class ObjectDetection(BasePipeline):
     """
     Pipeline for object detection. 
+
+    Set ``mixed_precision: true`` in the pipeline config to train and run
+    inference with autocast. ``amp_dtype`` selects 'float16' or 'bfloat16'.
+
+    Training and validation samples are loaded by a DataLoader with
+    ``batch_size``/``val_batch_size`` samples per step and ``num_workers``
+    worker processes.
     """
 
     def __init__(self,
@@ -61,13 +74,14 @@ class ObjectDetection(BasePipeline):
 
         model.eval()
 
+        batcher = ObjectDetectBatcher()
+        inputs = batcher.collate_fn([{'data': data, 'attr': {}}])
+        inputs.to(self.device)
+
         with torch.no_grad():
-            inputs = torch.tensor(data['point'],
-                                  dtype=torch.float32,
-                                  device=self.device)
-            inputs = torch.reshape(inputs, (1, -1, inputs.shape[-1]))
-            results = model(inputs)
-            boxes = model.inference_end(results, data)
+            with self.autocast():
+                results = model(inputs.point)
+            boxes = model.inference_end(results, inputs)
 
         return boxes
 
@@ -129,26 +143,44 @@ class ObjectDetection(BasePipeline):
         log.info("Logging in file : {}".format(log_file_path))
         log.addHandler(logging.FileHandler(log_file_path))
 
+        batcher = ObjectDetectBatcher()
+
         valid_dataset = dataset.get_split('validation')
-        valid_loader = TorchDataloader(dataset=valid_dataset,
-                                       preprocess=model.preprocess,
-                                       transform=model.transform,
-                                       use_cache=dataset.cfg.use_cache,
-                                       shuffle=True,
-                                       steps_per_epoch=dataset.cfg.get(
-                                           'steps_per_epoch_valid', None))
+        valid_split = TorchDataloader(dataset=valid_dataset,
+                                      preprocess=model.preprocess,
+                                      transform=model.transform,
+                                      use_cache=dataset.cfg.use_cache,
+                                      steps_per_epoch=dataset.cfg.get(
+                                          'steps_per_epoch_valid', None))
+        valid_loader = DataLoader(valid_split,
+                                  batch_size=cfg.get('val_batch_size', 1),
+                                  num_workers=cfg.get('num_workers', 0),
+                                  pin_memory=device.type == 'cuda',
+                                  collate_fn=batcher.collate_fn,
+                                  worker_init_fn=worker_init_fn)
 
         log.info("Started validation")
 
         self.valid_losses = {}
 
-        pred = []
-        gt = []
+        overlaps = cfg.get("overlaps", [0.5])
+        similar_classes = cfg.get("similar_classes", {})
+        difficulties = cfg.get("difficulties", [0])
+
+        # frames are matched as they arrive, no boxes are kept. BEV and 3D
+        # share the matching of each frame.
+        evaluator = MAPEvaluator(model.classes,
+                                 difficulties,
+                                 overlaps,
+                                 bev=[True, False],
+                                 similar_classes=similar_classes,
+                                 num_workers=cfg.get('num_eval_workers', 0))
         with torch.no_grad():
-            for i in tqdm(range(len(valid_loader)), desc='validation'):
-                data = valid_loader[i]['data']
-                results = model(data['point'])
-                loss = model.loss(results, data)
+            for data in tqdm(valid_loader, desc='validation'):
+                data.to(device, non_blocking=True)
+                with self.autocast():
+                    results = model(data.point)
+                    loss = model.loss(results, data)
                 for l, v in loss.items():
                     if not l in self.valid_losses:
                         self.valid_losses[l] = []
@@ -156,8 +188,9 @@ class ObjectDetection(BasePipeline):
 
                 # convert to bboxes for mAP evaluation
                 boxes = model.inference_end(results, data)
-                pred.append(BEVBox3D.to_dicts(boxes[0]))
-                gt.append(BEVBox3D.to_dicts(data['bbox_objs']))
+                for p, t in zip(boxes, data.bbox_objs):
+                    pred, gt = BEVBox3D.to_dicts(p), BEVBox3D.to_dicts(t)
+                    evaluator.add_frame(pred, gt)
 
         sum_loss = 0
         desc = "validation - "
@@ -168,43 +201,21 @@ class ObjectDetection(BasePipeline):
 
         log.info(desc)
 
-        overlaps = cfg.get("overlaps", [0.5])
-        similar_classes = cfg.get("similar_classes", {})
-        difficulties = cfg.get("difficulties", [0])
-
-        ap = mAP(pred,
-                 gt,
-                 model.classes,
-                 difficulties,
-                 overlaps,
-                 similar_classes=similar_classes)
-
-        log.info("")
-        log.info("=============== mAP BEV ===============")
-        log.info(("class \\ difficulty  " +
-                  "{:>5} " * len(difficulties)).format(*difficulties))
-        for i, c in enumerate(model.classes):
-            log.info(("{:<20} " + "{:>5.2f} " * len(difficulties)).format(
-                c + ":", *ap[i, :, 0]))
-        log.info("Overall: {:.2f}".format(np.mean(ap[:, -1])))
-        self.valid_losses["mAP BEV"] = np.mean(ap[:, -1])
-
-        ap = mAP(pred,
-                 gt,
-                 model.classes,
-                 difficulties,
-                 overlaps,
-                 similar_classes=similar_classes,
-                 bev=False)
-        log.info("")
-        log.info("=============== mAP  3D ===============")
-        log.info(("class \\ difficulty  " +
-                  "{:>5} " * len(difficulties)).format(*difficulties))
-        for i, c in enumerate(model.classes):
-            log.info(("{:<20} " + "{:>5.2f} " * len(difficulties)).format(
-                c + ":", *ap[i, :, 0]))
-        log.info("Overall: {:.2f}".format(np.mean(ap[:, -1])))
-        self.valid_losses["mAP 3D"] = np.mean(ap[:, -1])
+        ap_bev, ap_3d = evaluator.compute()
+        for name, ap in [('BEV', ap_bev), (' 3D', ap_3d)]:
+            log.info("")
+            log.info("=============== mAP {} ===============".format(name))
+            log.info(("class \\ difficulty  " +
+                      "{:>5} " * len(difficulties)).format(*difficulties))
+            for i, c in enumerate(model.classes):
+                log.info(("{:<20} " + "{:>5.2f} " * len(difficulties)).format(
+                    c + ":", *ap[i, :, 0]))
+            log.info("Overall: {:.2f}".format(np.mean(ap[:, -1, 0])))
+            # further sets of overlaps, if given as a list of lists
+            for k in range(1, ap.shape[-1]):
+                log.info("Overall @ {}: {:.2f}".format(
+                    evaluator.min_overlaps[k], np.mean(ap[:, -1, k])))
+            self.valid_losses["mAP " + name.strip()] = np.mean(ap[:, -1, 0])
 
     def run_train(self):
         """
@@ -223,13 +234,22 @@ class ObjectDetection(BasePipeline):
         log.info("Logging in file : {}".format(log_file_path))
         log.addHandler(logging.FileHandler(log_file_path))
 
+        batcher = ObjectDetectBatcher()
+
         train_dataset = dataset.get_split('training')
-        train_loader = TorchDataloader(dataset=train_dataset,
-                                       preprocess=model.preprocess,
-                                       transform=model.transform,
-                                       use_cache=dataset.cfg.use_cache,
-                                       steps_per_epoch=dataset.cfg.get(
-                                           'steps_per_epoch_train', None))
+        train_split = TorchDataloader(dataset=train_dataset,
+                                      preprocess=model.preprocess,
+                                      transform=model.transform,
+                                      use_cache=dataset.cfg.use_cache,
+                                      steps_per_epoch=dataset.cfg.get(
+                                          'steps_per_epoch_train', None))
+        train_loader = DataLoader(train_split,
+                                  batch_size=cfg.get('batch_size', 1),
+                                  sampler=RandomSampler(train_split),
+                                  num_workers=cfg.get('num_workers', 0),
+                                  pin_memory=device.type == 'cuda',
+                                  collate_fn=batcher.collate_fn,
+                                  worker_init_fn=worker_init_fn)
 
         self.optimizer, self.scheduler = model.get_optimizer(cfg.optimizer)
 
@@ -254,20 +274,16 @@ class ObjectDetection(BasePipeline):
             model.train()
 
             self.losses = {}
-            process_bar = tqdm(range(len(train_loader)), desc='training')
-            for i in process_bar:
-                data = train_loader[i]['data']
-
-                results = model(data['point'])
-                loss = model.loss(results, data)
-                loss_sum = sum(loss.values())
-
-                self.optimizer.zero_grad()
-                loss_sum.backward()
-                if model.cfg.get('grad_clip_norm', -1) > 0:
-                    torch.nn.utils.clip_grad_value_(model.parameters(),
-                                                    model.cfg.grad_clip_norm)
-                self.optimizer.step()
+            process_bar = tqdm(train_loader, desc='training')
+            for data in process_bar:
+                data.to(device, non_blocking=True)
+
+                with self.autocast():
+                    results = model(data.point)
+                    loss = model.loss(results, data)
+                    loss_sum = sum(loss.values())
+
+                self.optimizer_step(loss_sum)
                 desc = "training - "
                 for l, v in loss.items():
                     if not l in self.losses:
@@ -81,6 +81,8 @@ class SemanticSegmentation(BasePipeline):
             device: The device to be used for training.
             split: The dataset split to be used. In this example, we have used "train".
             train_sum_dir: The directory where the trainig summary is stored.
+            mixed_precision: Run the forward pass with autocast and scale the gradients. Defaults to False.
+            amp_dtype: The autocast dtype, 'float16' or 'bfloat16'. Defaults to bfloat16 on CPU and float16 otherwise.
             
     **Returns:**
             class: The corresponding class.
@@ -226,7 +228,8 @@ class SemanticSegmentation(BasePipeline):
 
         with torch.no_grad():
             for step, inputs in enumerate(test_loader):
-                results = model(inputs['data'])
+                with self.autocast():
+                    results = model(inputs['data'])
                 self.update_tests(test_sampler, inputs, results)
 
                 if self.complete_infer:
@@ -367,19 +370,15 @@ class SemanticSegmentation(BasePipeline):
             model.trans_point_sampler = train_sampler.get_point_sampler()
 
             for step, inputs in enumerate(tqdm(train_loader, desc='training')):
-                results = model(inputs['data'])
-                loss, gt_labels, predict_scores = model.get_loss(
-                    Loss, results, inputs, device)
+                with self.autocast():
+                    results = model(inputs['data'])
+                    loss, gt_labels, predict_scores = model.get_loss(
+                        Loss, results, inputs, device)
 
                 if predict_scores.size()[-1] == 0:
                     continue
 
-                self.optimizer.zero_grad()
-                # loss.backward()
-                if model.cfg.get('grad_clip_norm', -1) > 0:
-                    torch.nn.utils.clip_grad_value_(model.parameters(),
-                                                    model.cfg.grad_clip_norm)
-                self.optimizer.step()
+                self.optimizer_step(loss)
 
                 conf_m = metric.confusion_matrix(predict_scores, gt_labels)
                 acc = metric.acc(predict_scores, gt_labels)
@@ -403,9 +402,10 @@ class SemanticSegmentation(BasePipeline):
             with torch.no_grad():
                 for step, inputs in enumerate(
                         tqdm(valid_loader, desc='validation')):
-                    results = model(inputs['data'])
-                    loss, gt_labels, predict_scores = model.get_loss(
-                        Loss, results, inputs, device)
+                    with self.autocast():
+                        results = model(inputs['data'])
+                        loss, gt_labels, predict_scores = model.get_loss(
+                            Loss, results, inputs, device)
 
                     if predict_scores.size()[-1] == 0:
                         continue
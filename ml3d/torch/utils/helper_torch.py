@@ -1,6 +1,12 @@
 import torch
+import inspect
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
+
+# torch < 1.11 only has the reentrant checkpoint
+_REENTRANT_ONLY = 'use_reentrant' not in inspect.signature(
+    checkpoint).parameters
 
 
 class conv2d_transpose(nn.Module):
@@ -73,3 +79,49 @@ class conv2d(nn.Module):
             x = self.batch_normalization(x)
         x = self.activation_fn(x)
         return x
+
+
+def checkpoint_bn(module, function, *args):
+    """Gradient checkpoint of function, which runs the layers of module.
+
+    The checkpointed forward runs again during the backward pass. The batch
+    norm layers of module update copies of their running statistics during
+    the recomputation, so the statistics are updated once per step as
+    without checkpointing.
+
+    Args:
+        module: Module with the batch norm layers run by function.
+        function: Checkpointed function.
+        args: Arguments of function.
+    """
+    bns = [
+        m for m in module.modules() if
+        isinstance(m, nn.modules.batchnorm._BatchNorm) and m.track_running_stats
+    ]
+    calls = [0]
+
+    def run(*args):
+        calls[0] += 1
+        if calls[0] == 1:
+            return function(*args)
+
+        # update copies, the buffers may be saved for the backward pass
+        saved = [dict(bn.named_buffers(recurse=False)) for bn in bns]
+        for bn, buffers in zip(bns, saved):
+            for name, b in buffers.items():
+                setattr(bn, name, b.clone())
+        try:
+            return function(*args)
+        finally:
+            for bn, buffers in zip(bns, saved):
+                for name, b in buffers.items():
+                    setattr(bn, name, b)
+
+    if not _REENTRANT_ONLY:
+        return checkpoint(run, *args, use_reentrant=False)
+
+    # The reentrant checkpoint only back propagates to the parameters of
+    # module if one of the inputs requires grad.
+    if not any(torch.is_tensor(a) and a.requires_grad for a in args):
+        return function(*args)
+    return checkpoint(run, *args)
@@ -154,6 +154,11 @@ class Anchor3DRangeGenerator(object):
         self.ranges = ranges
         self.rotations = rotations
 
+        # anchors only depend on the feature map, so they are cached per
+        # (featmap_size, device, dtype)
+        self._anchors_cache = {}
+        self._anchors_per_range_cache = {}
+
     @property
     def num_base_anchors(self):
         """list[int]: Total number of base anchors in a feature grid."""
@@ -161,19 +166,26 @@ class Anchor3DRangeGenerator(object):
         num_size = torch.tensor(self.sizes).reshape(-1, 3).size(0)
         return num_rot * num_size
 
-    def grid_anchors(self, featmap_size, device='cuda'):
+    def grid_anchors(self, featmap_size, device='cuda', dtype=torch.float32):
         """Generate grid anchors of a single level feature map.
 
-        This function is usually called by method ``self.grid_anchors``.
+        The anchors are computed once per (featmap_size, device, dtype) and
+        cached. The returned tensor is shared and must not be modified in
+        place.
 
         Args:
             featmap_size (tuple[int]): Size of the feature map.
             device (str, optional): Device the tensor will be put on.
                 Defaults to 'cuda'.
+            dtype (torch.dtype, optional): Data type of the anchors.
+                Defaults to torch.float32.
 
         Returns:
             torch.Tensor: Anchors in the overall feature map.
         """
+        key = (tuple(featmap_size), torch.device(device), dtype)
+        if key in self._anchors_cache:
+            return self._anchors_cache[key]
 
         mr_anchors = []
         for anchor_range, anchor_size in zip(self.ranges, self.sizes):
@@ -183,9 +195,102 @@ class Anchor3DRangeGenerator(object):
                                           anchor_size,
                                           self.rotations,
                                           device=device))
-        mr_anchors = torch.cat(mr_anchors, dim=-3)
+        mr_anchors = torch.cat(mr_anchors, dim=-3).to(dtype)
+
+        self._anchors_cache[key] = mr_anchors
         return mr_anchors
 
+    def grid_anchors_per_range(self,
+                               featmap_size,
+                               device='cuda',
+                               dtype=torch.float32):
+        """Flattened grid anchors of each range and their BEV boxes.
+
+        Like ``grid_anchors`` the result is cached per
+        (featmap_size, device, dtype).
+
+        Args:
+            featmap_size (tuple[int]): Size of the feature map.
+            device (str, optional): Device the tensor will be put on.
+                Defaults to 'cuda'.
+            dtype (torch.dtype, optional): Data type of the anchors.
+                Defaults to torch.float32.
+
+        Returns:
+            list[torch.Tensor]: Anchors of each range with shape \
+                [num_anchors, 7].
+            list[torch.Tensor]: Nearest BEV boxes of these anchors in XYXY \
+                format (see ``box3d_to_bev2d``) with shape [num_anchors, 4].
+        """
+        key = (tuple(featmap_size), torch.device(device), dtype)
+        if key in self._anchors_per_range_cache:
+            return self._anchors_per_range_cache[key]
+
+        anchors = self.grid_anchors(featmap_size, device=device, dtype=dtype)
+        anchors = [
+            anchors[..., i, :, :].reshape(-1, anchors.shape[-1])
+            for i in range(anchors.shape[-3])
+        ]
+        anchors_bev = [box3d_to_bev2d(a) for a in anchors]
+
+        self._anchors_per_range_cache[key] = (anchors, anchors_bev)
+        return anchors, anchors_bev
+
+    def overlapping_anchors(self, featmap_size, range_idx, bev_boxes):
+        """Candidate anchors of a range overlapping each of the given boxes.
+
+        Anchors of a range lie on a regular grid, so the anchors that can
+        overlap a box are found from its extent instead of testing every
+        anchor. The candidates are a superset of the overlapping anchors.
+
+        Args:
+            featmap_size (tuple[int]): Size of the feature map.
+            range_idx (int): Index of the anchor range.
+            bev_boxes (torch.Tensor): BEV boxes in XYXY format [N, 4].
+
+        Returns:
+            torch.Tensor: Index of the box of each candidate pair.
+            torch.Tensor: Index of the anchor of each candidate pair in the
+                flattened anchors of the range (see ``grid_anchors_per_range``).
+        """
+        ny, nx = featmap_size[-2:]
+        num_rot = len(self.rotations)
+        anchor_range = self.ranges[range_idx]
+        size = self.sizes[range_idx]
+        device = bev_boxes.device
+
+        # grid step and largest BEV half extent of the anchors
+        dx = (anchor_range[3] - anchor_range[0]) / max(nx - 1, 1)
+        dy = (anchor_range[4] - anchor_range[1]) / max(ny - 1, 1)
+        half = max(size[0], size[1]) / 2
+
+        # window of grid cells around each box, with one cell of margin
+        x_lo = torch.floor((bev_boxes[:, 0] - half - anchor_range[0]) / dx)
+        x_hi = torch.ceil((bev_boxes[:, 2] + half - anchor_range[0]) / dx)
+        y_lo = torch.floor((bev_boxes[:, 1] - half - anchor_range[1]) / dy)
+        y_hi = torch.ceil((bev_boxes[:, 3] + half - anchor_range[1]) / dy)
+        x_lo = x_lo.clamp(0, nx - 1).long()
+        x_hi = x_hi.clamp(0, nx - 1).long()
+        y_lo = y_lo.clamp(0, ny - 1).long()
+        y_hi = y_hi.clamp(0, ny - 1).long()
+
+        num_x = x_hi - x_lo + 1
+        num_y = y_hi - y_lo + 1
+        num_pairs = num_x * num_y * num_rot
+
+        box_idx = torch.repeat_interleave(
+            torch.arange(len(bev_boxes), device=device), num_pairs)
+        offsets = torch.cumsum(num_pairs, 0) - num_pairs
+        local = torch.arange(len(box_idx), device=device) - offsets[box_idx]
+
+        rot = local % num_rot
+        cell = local // num_rot
+        x = x_lo[box_idx] + cell % num_x[box_idx]
+        y = y_lo[box_idx] + cell // num_x[box_idx]
+        anchor_idx = (y * nx + x) * num_rot + rot
+
+        return box_idx, anchor_idx
+
     def anchors_single_range(self,
                              feature_size,
                              anchor_range,
@@ -314,6 +419,121 @@ class BBoxCoder(object):
         return torch.cat([xg, yg, zg, wg, lg, hg, rg], dim=-1)
 
 
+def scatter_max_(out, index, src):
+    """Sets out[i] to the max of out[i] and src[index == i], in place.
+
+    Same as out.scatter_reduce_(0, index, src, reduce='amax'), which needs
+    torch >= 1.12. Older versions sort the pairs instead.
+
+    Args:
+        out (torch.Tensor): 1D tensor to update.
+        index (torch.Tensor): Index into out of each element of src.
+        src (torch.Tensor): Values, same length as index.
+
+    Returns:
+        torch.Tensor: out.
+    """
+    if hasattr(out, 'scatter_reduce_'):
+        return out.scatter_reduce_(0, index, src, reduce='amax')
+
+    return _scatter_max_sorted(out, index, src)
+
+
+def scatter_min_(out, index, src):
+    """Sets out[i] to the min of out[i] and src[index == i], in place.
+
+    Same as out.scatter_reduce_(0, index, src, reduce='amin'), see
+    scatter_max_.
+    """
+    if hasattr(out, 'scatter_reduce_'):
+        return out.scatter_reduce_(0, index, src, reduce='amin')
+
+    return out.copy_(-_scatter_max_sorted(-out, index, -src))
+
+
+def _scatter_max_sorted(out, index, src):
+    if len(src) == 0:
+        return out
+
+    # sort by index and then by value, the int64 key of the index and the
+    # rank of the value is exact and needs no stable sort
+    rank = torch.empty_like(index)
+    rank[torch.argsort(src)] = torch.arange(len(src), device=src.device)
+    order = torch.argsort(index * len(src) + rank)
+    index = index[order]
+
+    # the last element of each index has the max value
+    last = torch.ones_like(index, dtype=torch.bool)
+    last[:-1] = index[1:] != index[:-1]
+    index = index[last]
+    out[index] = torch.max(out[index], src[order[last]])
+
+    return out
+
+
+def offset_groups(bev, groups):
+    """Moves the BEV boxes of each group apart along x, so that boxes of
+    different groups never overlap.
+
+    Args:
+        bev (torch.Tensor): Rotated BEV boxes with shape (N, 5) in XYXYR
+            format.
+        groups (torch.Tensor): Group of each box with shape (N, ).
+
+    Returns:
+        torch.Tensor: The moved boxes.
+    """
+    # rotated boxes stay within their XYXY extent plus their size
+    size = (bev[:, 2:4] - bev[:, :2]).max()
+    offset = bev[:, :4].max() - bev[:, :4].min() + 2 * size + 1
+    bev = bev.clone()
+    bev[:, [0, 2]] += (groups.to(bev.dtype) * offset)[:, None]
+
+    return bev
+
+
+def batched_nms(boxes, scores, groups, iou_threshold=0.01, offset=None):
+    """Rotated BEV nms of 3D boxes, independently for each group.
+
+    With offset, the groups are moved apart with offset_groups and a single
+    nms runs over all of them. Otherwise nms runs once per group, which is
+    faster on CPU where the cost of nms grows with the square of the number
+    of boxes.
+
+    Args:
+        boxes (torch.Tensor): Boxes with shape (N, M) in XYZWHDR format.
+        scores (torch.Tensor): Scores of the boxes with shape (N, ).
+        groups (torch.Tensor): Group of each box with shape (N, ), e.g. the
+            class or (sample, class) of the box.
+        iou_threshold (float): IoU threshold for suppression.
+        offset (bool): Run a single nms over the offset groups. Defaults to
+            True on GPU and False on CPU.
+
+    Returns:
+        torch.Tensor: Indices of the kept boxes in descending order of
+            scores.
+    """
+    if boxes.shape[0] == 0:
+        return torch.tensor([], dtype=torch.long, device=boxes.device)
+
+    bev = xywhr_to_xyxyr(box3d_to_bev(boxes))
+    if offset is None:
+        offset = boxes.device.type != 'cpu'
+
+    if offset:
+        return nms(offset_groups(bev, groups), scores, iou_threshold)
+
+    keep = []
+    for group in torch.unique(groups):
+        idx = (groups == group).nonzero(as_tuple=False).squeeze(-1)
+        keep.append(idx[nms(bev[idx], scores[idx], iou_threshold)])
+    keep = torch.cat(keep)
+
+    # stable, equal scores keep the order of the groups
+    order = np.argsort(-scores[keep].cpu().numpy(), kind='stable')
+    return keep[torch.from_numpy(order).to(keep.device)]
+
+
 def multiclass_nms(boxes, scores, score_thr):
     """Multi-class nms for 3D boxes.
 
@@ -329,27 +549,12 @@ def multiclass_nms(boxes, scores, score_thr):
         list[torch.Tensor]: Return a list of indices after nms,
             with an entry for each class.
     """
+    box_idx, cls_idx = (scores > score_thr).nonzero(as_tuple=True)
+    keep = batched_nms(boxes[box_idx], scores[box_idx, cls_idx], cls_idx)
 
-    idxs = []
-    for i in range(scores.shape[1]):
-        cls_inds = scores[:, i] > score_thr
-        if not cls_inds.any():
-            idxs.append(
-                torch.tensor([], dtype=torch.long, device=cls_inds.device))
-            continue
-
-        orig_idx = torch.arange(cls_inds.shape[0],
-                                device=cls_inds.device,
-                                dtype=torch.long)[cls_inds]
-        _scores = scores[cls_inds, i]
-        _boxes = boxes[cls_inds, :]
-        _bev = xywhr_to_xyxyr(box3d_to_bev(_boxes))
-
-        idx = nms(_bev, _scores, 0.01)
-
-        idxs.append(orig_idx[idx])
-
-    return idxs
+    # split by class, keeping the order of scores within each class
+    box_idx, cls_idx = box_idx[keep], cls_idx[keep]
+    return [box_idx[cls_idx == i] for i in range(scores.shape[1])]
 
 
 def bbox_overlaps(bboxes1, bboxes2, mode='iou', is_aligned=False, eps=1e-6):
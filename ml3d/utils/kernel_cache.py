@@ -0,0 +1,77 @@
+import os
+import numpy as np
+
+from os import makedirs
+from os.path import exists, join, dirname, abspath, expanduser
+
+from .ply import read_ply, write_ply
+
+# Dispositions shipped with the package for the common configurations.
+_shipped_kernel_dir = join(dirname(abspath(__file__)), 'kernels',
+                           'dispositions')
+
+
+def get_kernel_dir():
+    """Return the user-level directory caching kernel point dispositions.
+
+    The directory is $OPEN3D_ML_KERNEL_DIR if set, otherwise
+    $XDG_CACHE_HOME/open3d_ml/kernels/dispositions (defaulting to
+    ~/.cache). It does not depend on the current working directory, so all
+    jobs of a user share the same dispositions.
+    """
+    kernel_dir = os.environ.get('OPEN3D_ML_KERNEL_DIR')
+    if kernel_dir is None:
+        cache_home = os.environ.get('XDG_CACHE_HOME',
+                                    join(expanduser('~'), '.cache'))
+        kernel_dir = join(cache_home, 'open3d_ml', 'kernels', 'dispositions')
+    return kernel_dir
+
+
+def _kernel_file_name(num_kpoints, fixed, dimension):
+    return 'k_{:03d}_{:s}_{:d}D.ply'.format(num_kpoints, fixed, dimension)
+
+
+def read_kernel_disposition(num_kpoints, fixed, dimension):
+    """Read a kernel point disposition of unit radius.
+
+    The user cache is searched first, then the dispositions shipped with
+    the package.
+
+    Args:
+        num_kpoints: Number of kernel points.
+        fixed: Fixed kernel points ('none', 'center' or 'verticals').
+        dimension: Dimension of the point space.
+
+    Returns:
+        The kernel points [num_kpoints, dimension], or None if no
+        disposition is available for this configuration.
+    """
+    file_name = _kernel_file_name(num_kpoints, fixed, dimension)
+    for kernel_dir in [get_kernel_dir(), _shipped_kernel_dir]:
+        kernel_file = join(kernel_dir, file_name)
+        if exists(kernel_file):
+            data = read_ply(kernel_file)
+            return np.vstack((data['x'], data['y'], data['z'])).T
+    return None
+
+
+def write_kernel_disposition(kernel_points, num_kpoints, fixed, dimension):
+    """Store a kernel point disposition in the user cache.
+
+    The points are written to a temporary file which is then atomically
+    renamed, so concurrent jobs never read a partially written file.
+
+    Args:
+        kernel_points: Kernel points of unit radius [num_kpoints, dimension].
+        num_kpoints: Number of kernel points.
+        fixed: Fixed kernel points ('none', 'center' or 'verticals').
+        dimension: Dimension of the point space.
+    """
+    kernel_dir = get_kernel_dir()
+    makedirs(kernel_dir, exist_ok=True)
+
+    kernel_file = join(kernel_dir,
+                       _kernel_file_name(num_kpoints, fixed, dimension))
+    tmp_file = '{}.{:d}.tmp.ply'.format(kernel_file[:-4], os.getpid())
+    write_ply(tmp_file, kernel_points, ['x', 'y', 'z'])
+    os.replace(tmp_file, kernel_file)
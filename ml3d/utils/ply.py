@@ -23,6 +23,7 @@
 # Basic libs
 import numpy as np
 import sys
+from numpy.lib.recfunctions import structured_to_unstructured
 
 # Define PLY types
 ply_dtypes = dict([(b'int8', 'i1'), (b'char', 'i1'), (b'uint8', 'u1'),
@@ -100,7 +101,7 @@ def parse_mesh_header(plyfile, ext):
     return num_points, num_faces, vertex_properties
 
 
-def read_ply(filename, triangular_mesh=False):
+def read_ply(filename, triangular_mesh=False, mmap=False):
     """
     Read ".ply" files
 
@@ -109,6 +110,14 @@ def read_ply(filename, triangular_mesh=False):
     filename : string
         the name of the file to read.
 
+    triangular_mesh : bool
+        read the faces of a triangular mesh as well.
+
+    mmap : bool
+        memory map the vertex data instead of reading it. The result is a
+        read-only np.memmap structured view of the file, so only the pages of
+        the accessed columns are read. Use ply_columns to get columns from it.
+
     Returns
     -------
     result : array
@@ -158,9 +167,12 @@ def read_ply(filename, triangular_mesh=False):
             num_points, num_faces, properties = parse_mesh_header(plyfile, ext)
 
             # Get point data
-            vertex_data = np.fromfile(plyfile,
-                                      dtype=properties,
-                                      count=num_points)
+            if mmap:
+                vertex_data = _memmap(filename, plyfile, properties, num_points)
+            else:
+                vertex_data = np.fromfile(plyfile,
+                                          dtype=properties,
+                                          count=num_points)
 
             # Get face data
             face_properties = [('k', ext + 'u1'), ('v1', ext + 'i4'),
@@ -180,11 +192,76 @@ def read_ply(filename, triangular_mesh=False):
             num_points, properties = parse_header(plyfile, ext)
 
             # Get data
-            data = np.fromfile(plyfile, dtype=properties, count=num_points)
+            if mmap:
+                data = _memmap(filename, plyfile, properties, num_points)
+            else:
+                data = np.fromfile(plyfile, dtype=properties, count=num_points)
 
     return data
 
 
+def _memmap(filename, plyfile, properties, num_points):
+    """Memory map the data following the header and seek past it."""
+    offset = plyfile.tell()
+    data = np.memmap(filename,
+                     dtype=properties,
+                     mode='r',
+                     offset=offset,
+                     shape=(num_points,))
+    plyfile.seek(offset + data.nbytes)
+
+    return data
+
+
+def ply_columns(data, names, dtype=None):
+    """
+    Get columns of the structured array returned by read_ply
+
+    Parameters
+    ----------
+    data : array
+        structured array returned by read_ply.
+
+    names : string or list
+        name of a column, or names of the columns to stack.
+
+    dtype : numpy dtype
+        optional type of the result.
+
+    Returns
+    -------
+    result : array
+        array of shape (N,) for a single name, (N, len(names)) otherwise.
+        Consecutive columns of the same type, like x, y, z or red, green,
+        blue in most files, are returned as a view of data without copying
+        them. A copy is only made to convert to dtype.
+    """
+
+    if isinstance(names, str):
+        columns = data[names]
+    else:
+        names = list(names)
+        # Keep the byte order of the file, so big endian columns are viewed
+        # as well.
+        field_dtypes = set(data.dtype[name] for name in names)
+        columns = structured_to_unstructured(
+            data[names],
+            dtype=field_dtypes.pop() if len(field_dtypes) == 1 else None,
+            copy=False)
+
+    return np.asarray(columns, dtype=dtype)
+
+
+def ply_xyz(data, dtype=None):
+    """Get the x, y, z columns of a read_ply result as an (N, 3) array."""
+    return ply_columns(data, ['x', 'y', 'z'], dtype)
+
+
+def ply_rgb(data, dtype=None):
+    """Get the red, green, blue columns of a read_ply result as an (N, 3) array."""
+    return ply_columns(data, ['red', 'green', 'blue'], dtype)
+
+
 def header_properties(field_list, field_names):
 
     # List of lines to write
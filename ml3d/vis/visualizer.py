@@ -263,11 +263,13 @@ class DatasetModel(Model):
                 indices = range(0, len(self._dataset))
             # Some results from get_split() (like "training") are randomized.
             # Sort, so that the same index always returns the same piece of data.
-            path2idx = {}
-            for i in range(0, len(self._dataset.path_list)):
-                path2idx[self._dataset.path_list[i]] = i
-            real_indices = [path2idx[p] for p in sorted(path2idx.keys())]
-            indices = [real_indices[idx] for idx in indices]
+            # Lists from a dataset manifest are sorted already.
+            paths = np.asarray(self._dataset.path_list, dtype=str)
+            if np.all(paths[:-1] < paths[1:]):
+                real_indices = np.arange(len(paths))
+            else:
+                real_indices = np.argsort(paths, kind='stable')
+            indices = [int(real_indices[idx]) for idx in indices]
 
             # SemanticKITTI names its items <sequence#>_<timeslice#>,
             # "mm_nnnnnn". We'd like to use the hierarchical feature of the tree
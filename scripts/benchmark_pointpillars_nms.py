@@ -0,0 +1,165 @@
+import argparse
+import time
+
+import numpy as np
+import torch
+
+import open3d.ml.torch as ml3d
+from open3d.ml.torch.ops import nms
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the batched PointPillars box decoding and nms.')
+    parser.add_argument('--device', help='cpu or cuda', default='cpu')
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--num_classes', type=int, default=10)
+    parser.add_argument('--nms_pre',
+                        help='number of boxes per sample before nms',
+                        type=int,
+                        default=100)
+    parser.add_argument('--featmap_size',
+                        help='feature map size (ny nx)',
+                        type=int,
+                        nargs=2,
+                        default=[200, 200])
+    parser.add_argument('--repeat', type=int, default=10)
+
+    return parser.parse_args()
+
+
+def get_bboxes_loop(head, cls_scores, bbox_preds, dir_preds):
+    """Reference with one decoding per sample and one nms per class."""
+    pp = ml3d.models.point_pillars
+    bboxes_b, scores_b, labels_b = [], [], []
+    for cls_score, bbox_pred, dir_pred in zip(cls_scores, bbox_preds,
+                                              dir_preds):
+        anchors = head.anchor_generator.grid_anchors(
+            cls_score.shape[-2:],
+            device=cls_score.device).reshape(-1, head.box_code_size)
+        dir_scores = dir_pred.permute(1, 2, 0).reshape(-1, 2).max(dim=-1)[1]
+        scores = cls_score.permute(1, 2, 0).reshape(-1,
+                                                    head.num_classes).sigmoid()
+        bbox_pred = bbox_pred.permute(1, 2, 0).reshape(-1, head.box_code_size)
+
+        if scores.shape[0] > head.nms_pre:
+            _, topk_inds = scores.max(dim=1)[0].topk(head.nms_pre)
+            anchors = anchors[topk_inds]
+            bbox_pred = bbox_pred[topk_inds]
+            scores = scores[topk_inds]
+            dir_scores = dir_scores[topk_inds]
+
+        bboxes = head.bbox_coder.decode(anchors, bbox_pred)
+
+        idxs = []
+        for i in range(head.num_classes):
+            cls_inds = (scores[:, i] > head.score_thr).nonzero(
+                as_tuple=False).squeeze(-1)
+            bev = bboxes[cls_inds][:, [0, 1, 3, 4, 6]]
+            bev = torch.cat([
+                bev[:, :2] - bev[:, 2:4] / 2, bev[:, :2] + bev[:, 2:4] / 2,
+                bev[:, 4:]
+            ], -1)
+            idxs.append(cls_inds[nms(bev, scores[cls_inds, i], 0.01)])
+
+        labels = torch.cat([
+            torch.full((len(idx),), i, dtype=torch.long, device=bboxes.device)
+            for i, idx in enumerate(idxs)
+        ])
+        scores = torch.cat([scores[idx, i] for i, idx in enumerate(idxs)])
+        idxs = torch.cat(idxs)
+        bboxes = bboxes[idxs]
+        dir_scores = dir_scores[idxs]
+
+        if bboxes.shape[0] > 0:
+            dir_rot = pp.limit_period(bboxes[..., 6] - head.dir_offset, 1,
+                                      np.pi)
+            bboxes[..., 6] = (dir_rot + head.dir_offset +
+                              np.pi * dir_scores.to(bboxes.dtype))
+
+        bboxes_b.append(bboxes)
+        scores_b.append(scores)
+        labels_b.append(labels)
+
+    return bboxes_b, scores_b, labels_b
+
+
+def timeit(func, repeat, device):
+    func()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(args):
+    device = torch.device(args.device)
+    num_classes = args.num_classes
+    head = ml3d.models.point_pillars.Anchor3DHead(
+        num_classes=num_classes,
+        nms_pre=args.nms_pre,
+        ranges=[[-50, -50, -1.8, 50, 50, -1.8]] * num_classes,
+        sizes=[[1.9, 4.7, 1.7]] * num_classes,
+        iou_thr=[[0.4, 0.6]] * num_classes).to(device)
+
+    num_anchors = head.anchor_generator.num_base_anchors
+    ny, nx = args.featmap_size
+    cls_scores = torch.randn(args.batch_size,
+                             num_anchors * num_classes,
+                             ny,
+                             nx,
+                             device=device)
+    bbox_preds = 0.1 * torch.randn(
+        args.batch_size, num_anchors * 7, ny, nx, device=device)
+    dir_preds = torch.randn(args.batch_size,
+                            num_anchors * 2,
+                            ny,
+                            nx,
+                            device=device)
+
+    ref = get_bboxes_loop(head, cls_scores, bbox_preds, dir_preds)
+    res = head.get_bboxes(cls_scores, bbox_preds, dir_preds)
+    for r, b in zip(ref, res):
+        assert all(torch.allclose(x.float(), y.float()) for x, y in zip(r, b))
+
+    t_loop = timeit(
+        lambda: get_bboxes_loop(head, cls_scores, bbox_preds, dir_preds),
+        args.repeat, device)
+    t_batched = timeit(
+        lambda: head.get_bboxes(cls_scores, bbox_preds, dir_preds), args.repeat,
+        device)
+    print("{} classes x {} boxes x batch {}: loop {:.2f} ms, batched {:.2f} ms".
+          format(num_classes, args.nms_pre, args.batch_size, t_loop, t_batched))
+
+    # nms alone, once per (sample, class) group or once over the offset groups
+    num_boxes = args.batch_size * args.nms_pre * num_classes
+    boxes = torch.cat([
+        100 * torch.rand(num_boxes, 3, device=device) - 50,
+        torch.tensor([1.9, 4.7, 1.7], device=device) *
+        (1 + 0.1 * torch.randn(num_boxes, 3, device=device)),
+        2 * np.pi * torch.rand(num_boxes, 1, device=device)
+    ], -1)
+    scores = torch.rand(num_boxes, device=device)
+    groups = torch.randint(args.batch_size * num_classes, (num_boxes,),
+                           device=device)
+    batched_nms = ml3d.models.point_pillars.batched_nms
+
+    keep_groups = batched_nms(boxes, scores, groups, offset=False)
+    keep_offset = batched_nms(boxes, scores, groups, offset=True)
+    assert torch.equal(keep_groups.sort()[0], keep_offset.sort()[0])
+
+    t_groups = timeit(lambda: batched_nms(boxes, scores, groups, offset=False),
+                      args.repeat, device)
+    t_offset = timeit(lambda: batched_nms(boxes, scores, groups, offset=True),
+                      args.repeat, device)
+    print("nms of {} boxes in {} groups: per group {:.2f} ms, offset {:.2f} ms".
+          format(num_boxes, args.batch_size * num_classes, t_groups, t_offset))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,103 @@
+import argparse
+import time
+
+import torch
+
+import open3d.ml.torch as ml3d
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the PointPillars scatter across batch sizes.')
+    parser.add_argument('--device', help='cpu or cuda', default='cpu')
+    parser.add_argument('--batch_sizes',
+                        help='batch sizes to benchmark',
+                        type=int,
+                        nargs='+',
+                        default=[1, 2, 4, 8, 16])
+    parser.add_argument('--num_pillars',
+                        help='number of non-empty pillars per sample',
+                        type=int,
+                        default=12000)
+    parser.add_argument('--output_shape',
+                        help='pseudo image size (ny nx)',
+                        type=int,
+                        nargs=2,
+                        default=[496, 432])
+    parser.add_argument('--in_channels', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=10)
+
+    return parser.parse_args()
+
+
+def scatter_loop(scatter, voxel_features, coors, batch_size):
+    """Reference scatter with one canvas per sample."""
+    batch_canvas = []
+    for i in range(batch_size):
+        canvas = voxel_features.new_zeros(scatter.in_channels,
+                                          scatter.ny * scatter.nx)
+        batch_mask = coors[:, 0] == i
+        this_coors = coors[batch_mask, :]
+        indices = (this_coors[:, 2] * scatter.nx + this_coors[:, 3]).long()
+        canvas[:, indices] = voxel_features[batch_mask, :].t()
+        batch_canvas.append(canvas)
+
+    return torch.stack(batch_canvas, 0).view(batch_size, scatter.in_channels,
+                                             scatter.ny, scatter.nx)
+
+
+def random_pillars(batch_size, num_pillars, ny, nx, in_channels, device):
+    coors = []
+    for i in range(batch_size):
+        cells = torch.randperm(ny * nx, device=device)[:num_pillars]
+        coors.append(
+            torch.stack([
+                torch.full_like(cells, i),
+                torch.zeros_like(cells), cells // nx, cells % nx
+            ], 1))
+    coors = torch.cat(coors).int()
+    voxel_features = torch.randn(len(coors), in_channels, device=device)
+
+    return voxel_features, coors
+
+
+def timeit(func, repeat, device):
+    func()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(args):
+    device = torch.device(args.device)
+    ny, nx = args.output_shape
+    scatter = ml3d.models.point_pillars.PointPillarsScatter(
+        args.in_channels, [ny, nx]).to(device)
+
+    print("{:>5} {:>12} {:>12} {:>16}".format('batch', 'loop [ms]',
+                                              'scatter [ms]', 'scatter/sample'))
+    for batch_size in args.batch_sizes:
+        voxel_features, coors = random_pillars(batch_size, args.num_pillars, ny,
+                                               nx, args.in_channels, device)
+
+        assert torch.equal(
+            scatter(voxel_features, coors, batch_size),
+            scatter_loop(scatter, voxel_features, coors, batch_size))
+
+        t_loop = timeit(
+            lambda: scatter_loop(scatter, voxel_features, coors, batch_size),
+            args.repeat, device)
+        t_scatter = timeit(lambda: scatter(voxel_features, coors, batch_size),
+                           args.repeat, device)
+        print("{:>5d} {:>12.2f} {:>12.2f} {:>16.2f}".format(
+            batch_size, t_loop, t_scatter, t_scatter / batch_size))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import numpy as np
+
+from open3d.ml.datasets import utils
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the points in rotated boxes test.')
+    parser.add_argument('--num_points', type=int, default=100000)
+    parser.add_argument('--num_boxes',
+                        help='numbers of boxes to benchmark',
+                        type=int,
+                        nargs='+',
+                        default=[10, 50, 200])
+    parser.add_argument('--range',
+                        help='half size of the scene in x and y',
+                        type=float,
+                        default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+
+    return parser.parse_args()
+
+
+def random_scene(num_points, num_boxes, scene_range):
+    points = np.random.uniform([-scene_range, -scene_range, -3, 0],
+                               [scene_range, scene_range, 1, 1],
+                               (num_points, 4)).astype(np.float32)
+    boxes = np.concatenate([
+        np.random.uniform([-scene_range, -scene_range, -2],
+                          [scene_range, scene_range, -1], (num_boxes, 3)),
+        np.random.uniform([0.5, 0.5, 1.5], [2.5, 5, 2.5], (num_boxes, 3)),
+        np.random.uniform(-np.pi, np.pi, (num_boxes, 1))
+    ],
+                           axis=1)
+
+    return points, boxes
+
+
+def timeit(func, repeat):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(args):
+    ops = utils.operations
+
+    print("{:>6} {:>12} {:>12}".format('boxes', 'dense [ms]', 'sparse [ms]'))
+    for num_boxes in args.num_boxes:
+        points, boxes = random_scene(args.num_points, num_boxes, args.range)
+
+        dense = ops.points_in_box(points, boxes)
+        sparse = ops.points_in_box_indices(points, boxes)
+        for i, indices in enumerate(sparse):
+            assert np.array_equal(np.nonzero(dense[:, i])[0], indices)
+
+        t_dense = timeit(lambda: ops.points_in_box(points, boxes), args.repeat)
+        t_sparse = timeit(lambda: ops.points_in_box_indices(points, boxes),
+                          args.repeat)
+        print("{:>6d} {:>12.2f} {:>12.2f}".format(num_boxes, t_dense, t_sparse))
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,93 @@
+import numpy as np
+import os
+import argparse
+from multiprocessing import Pool
+
+from tqdm import tqdm
+import open3d.ml as _ml3d
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Build the manifest of a dataset with point statistics.')
+    parser.add_argument('--dataset_path',
+                        help='path to Dataset root',
+                        required=True)
+    parser.add_argument(
+        '--dataset_type',
+        help='Name of the dataset class (SemanticKITTI, Semantic3D, S3DIS, '
+        'KITTI, ...)',
+        required=True)
+    parser.add_argument('--cache_dir',
+                        help='Cache directory of the manifest',
+                        default='./logs/cache')
+    parser.add_argument('--num_cpus',
+                        help='Number of worker processes',
+                        default=os.cpu_count(),
+                        type=int)
+
+    args = parser.parse_args()
+
+    dict_args = vars(args)
+    for k in dict_args:
+        v = dict_args[k]
+        print("{}: {}".format(k, v) if v is not None else "{} not given".
+              format(k))
+
+    return args
+
+
+_split = None
+
+
+def init_worker(dataset_type, dataset_path, cache_dir):
+    global _split
+    dataset = _ml3d.utils.get_module("dataset",
+                                     dataset_type)(dataset_path,
+                                                   cache_dir=cache_dir,
+                                                   use_manifest=True)
+    _split = dataset.get_split('all')
+
+
+def get_stats(i):
+    """Number of points and labels of a frame."""
+    data = _split.get_data(i)
+    labels = data.get('label', None)
+    if labels is not None:
+        labels = np.asarray(labels).reshape(-1)
+
+    return _split.get_attr(i)['path'], len(data['point']), labels
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    dataset = _ml3d.utils.get_module("dataset", args.dataset_type)(
+        args.dataset_path, cache_dir=args.cache_dir, use_manifest=True)
+    manifest = dataset.manifest
+    num_frames = len(dataset.get_split('all'))
+    num_classes = len(dataset.label_to_names)
+
+    with Pool(args.num_cpus,
+              initializer=init_worker,
+              initargs=(args.dataset_type, args.dataset_path,
+                        args.cache_dir)) as p:
+        for path, num_points, labels in tqdm(p.imap_unordered(
+                get_stats, range(num_frames)),
+                                             total=num_frames):
+            try:
+                row = manifest.index(str(path))
+            except KeyError:
+                continue
+            if not manifest.has_label[row]:
+                labels = None
+            manifest.set_stats(str(path), num_points, labels, num_classes)
+
+    manifest.save(dataset.get_manifest_path())
+
+    print("Wrote the manifest of {} files to {}.".format(
+        len(manifest), dataset.get_manifest_path()))
+    if manifest.class_hist.shape[1] > 0:
+        print("Points per class:")
+        for label, count in enumerate(manifest.class_hist.sum(0)):
+            print("{:>4d} {:>14d}".format(label, count))
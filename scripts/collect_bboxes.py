@@ -1,14 +1,14 @@
 import numpy as np
-import os, sys, glob, pickle
-from pathlib import Path
-from os.path import join, exists, dirname, abspath
+import os
+from os.path import join, exists
 from os import makedirs
-import random
 import argparse
-import pickle
+import shutil
+from multiprocessing import Pool
 
 from tqdm import tqdm
-from open3d.ml.datasets import KITTI, utils
+import open3d.ml as _ml3d
+from open3d.ml.datasets import utils
 
 
 def parse_args():
@@ -19,9 +19,27 @@ def parse_args():
                         required=True)
     parser.add_argument(
         '--out_path',
-        help='Output path to store pickle (default to dataet_path)',
+        help='Output path to store the gt_database (default to dataet_path)',
         default=None,
         required=False)
+    parser.add_argument(
+        '--dataset_type',
+        help='Name of the dataset class (KITTI, Waymo, NuScenes, Lyft, '
+        'Argoverse, ...)',
+        default='KITTI',
+        required=False)
+    parser.add_argument('--split',
+                        help='Split to collect the boxes from',
+                        default='train',
+                        required=False)
+    parser.add_argument('--num_cpus',
+                        help='Number of worker processes',
+                        default=os.cpu_count(),
+                        type=int)
+    parser.add_argument('--chunk_size',
+                        help='Number of frames per resumable chunk',
+                        default=100,
+                        type=int)
 
     args = parser.parse_args()
 
@@ -34,26 +52,89 @@ def parse_args():
     return args
 
 
+_split = None
+
+
+def init_worker(dataset_type, dataset_path, split):
+    global _split
+    dataset = _ml3d.utils.get_module("dataset", dataset_type)(dataset_path)
+    _split = dataset.get_split(split)
+
+
+def collect_chunk(job):
+    """Collect the boxes of a chunk of frames into a chunk file.
+
+    Chunks written by an earlier run with the same split and chunk size
+    are skipped, so an interrupted run can be resumed. Each chunk is written
+    to a temporary file which is then atomically renamed, a chunk file is
+    therefore always complete.
+    """
+    chunk_file, frames = job
+    if exists(chunk_file):
+        return chunk_file
+
+    dbs = []
+    for i in frames:
+        data = _split.get_data(i)
+        dbs.append(
+            utils.GTDatabase.from_frame(data['point'], data['bounding_boxes']))
+    db = utils.GTDatabase.concatenate(dbs)
+
+    tmp_file = '{}.{:d}.tmp.npz'.format(chunk_file[:-4], os.getpid())
+    np.savez(tmp_file,
+             boxes=db.boxes,
+             labels=db.label_class,
+             points=db.points,
+             offsets=db.offsets)
+    os.replace(tmp_file, chunk_file)
+
+    return chunk_file
+
+
+def load_chunk(chunk_file):
+    with np.load(chunk_file) as f:
+        return utils.GTDatabase(f['boxes'], f['labels'], f['points'],
+                                f['offsets'])
+
+
 if __name__ == '__main__':
     args = parse_args()
     out_path = args.out_path
     if out_path is None:
         out_path = args.dataset_path
 
-    dataset = KITTI(args.dataset_path)
-    train = dataset.get_split('train')
+    dataset = _ml3d.utils.get_module("dataset",
+                                     args.dataset_type)(args.dataset_path)
+    num_frames = len(dataset.get_split(args.split))
+
+    chunk_dir = join(out_path, 'gt_database_chunks')
+    makedirs(chunk_dir, exist_ok=True)
+    jobs = []
+    for start in range(0, num_frames, args.chunk_size):
+        end = min(start + args.chunk_size, num_frames)
+        chunk_file = join(
+            chunk_dir,
+            'chunk_{}_{:d}_{:06d}_{:06d}.npz'.format(args.split,
+                                                     args.chunk_size, start,
+                                                     end))
+        jobs.append((chunk_file, range(start, end)))
+
+    # Chunks of a run with another split or chunk size cover other frames,
+    # remove them so no box is collected twice.
+    expected = set(chunk_file for chunk_file, _ in jobs)
+    for name in os.listdir(chunk_dir):
+        if join(chunk_dir, name) not in expected:
+            os.remove(join(chunk_dir, name))
 
-    bboxes = []
-    for i in tqdm(range(len(train))):
-        data = train.get_data(i)
-        bbox = data['bounding_boxes']
-        flat_bbox = [box.to_xyzwhlr() for box in bbox]
+    # imap keeps the order of the chunks, so the database is the same for
+    # any number of workers.
+    with Pool(args.num_cpus,
+              initializer=init_worker,
+              initargs=(args.dataset_type, args.dataset_path, args.split)) as p:
+        chunk_files = list(tqdm(p.imap(collect_chunk, jobs), total=len(jobs)))
 
-        indices = utils.operations.points_in_box(data['point'], flat_bbox)
-        for i, box in enumerate(bbox):
-            pts = data['point'][indices[:, i]]
-            box.points_inside_box = pts
-            bboxes.append(box)
+    db = utils.GTDatabase.concatenate([load_chunk(f) for f in chunk_files])
+    db.save(join(out_path, 'gt_database'))
+    shutil.rmtree(chunk_dir)
 
-    file = open(join(out_path, 'bboxes.pkl'), 'wb')
-    pickle.dump(bboxes, file)
+    print("Collected {} boxes from {} frames.".format(len(db), num_frames))
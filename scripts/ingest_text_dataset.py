@@ -0,0 +1,34 @@
+import argparse
+
+import open3d.ml as _ml3d
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Convert the text point clouds of a dataset to .npy files.')
+    parser.add_argument('--dataset_type',
+                        help='Name of the dataset class (Semantic3D, Custom3D)',
+                        default='Semantic3D')
+    parser.add_argument('--dataset_path',
+                        help='path to Dataset root',
+                        required=True)
+    parser.add_argument('--overwrite',
+                        help='Convert files that already have a .npy version',
+                        action='store_true')
+
+    args = parser.parse_args()
+
+    dict_args = vars(args)
+    for k in dict_args:
+        v = dict_args[k]
+        print("{}: {}".format(k, v) if v is not None else "{} not given".
+              format(k))
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    dataset = _ml3d.utils.get_module("dataset",
+                                     args.dataset_type)(args.dataset_path)
+    dataset.ingest(overwrite=args.overwrite)
@@ -1,12 +1,9 @@
 import numpy as np
-import pandas as pd
-import os, sys, glob, pickle
+import os, glob
+import time
 from pathlib import Path
-from os.path import join, exists, dirname, abspath
-from tqdm import tqdm
-import random
-import shutil
-from tqdm import tqdm
+from os.path import join, exists
+from multiprocessing import Pool
 import argparse
 from open3d.ml.datasets import utils
 
@@ -24,6 +21,14 @@ def parse_args():
         help='Maximum size of processed pointcloud in Megabytes.',
         default=2000,
         type=int)
+    parser.add_argument('--num_cpus',
+                        help='Number of worker processes',
+                        default=os.cpu_count(),
+                        type=int)
+    parser.add_argument('--chunk_size',
+                        help='Number of points read at once',
+                        default=10000000,
+                        type=int)
 
     args = parser.parse_args()
 
@@ -36,6 +41,99 @@ def parse_args():
     return args
 
 
+sub_grid_size = 0.01
+axis = 1  # Longest axis.
+
+
+def iter_chunks(arr, chunk_size):
+    for start in range(0, len(arr), chunk_size):
+        yield start, arr[start:start + chunk_size]
+
+
+def split_bounds(pc, parts, chunk_size, bins_per_part=4096):
+    """Bounds along the split axis dividing the cloud into parts of about
+    the same number of points.
+
+    The bounds are found with a histogram which is accumulated chunk by
+    chunk, so the cloud never has to be sorted or loaded at once.
+    """
+    if parts == 1:
+        return np.zeros((0,), dtype=np.float32)
+
+    lo, hi = np.inf, -np.inf
+    for _, chunk in iter_chunks(pc, chunk_size):
+        lo = min(lo, chunk[:, axis].min())
+        hi = max(hi, chunk[:, axis].max())
+
+    edges = np.linspace(lo, hi, parts * bins_per_part + 1)
+    hist = np.zeros((len(edges) - 1,), dtype=np.int64)
+    for _, chunk in iter_chunks(pc, chunk_size):
+        hist += np.histogram(chunk[:, axis], edges)[0]
+
+    cdf = np.cumsum(hist)
+    targets = len(pc) * np.arange(1, parts) / parts
+    return edges[np.searchsorted(cdf, targets) + 1].astype(np.float32)
+
+
+def ingest(job):
+    """Convert the text files of a cloud to .npy files if necessary and
+    compute the bounds of its parts."""
+    key, parts, chunk_size = job
+    start = time.perf_counter()
+    npy_path, label_path = key + '.npy', key + '.labels.npy'
+    if not exists(npy_path):
+        utils.DataProcessing.text_to_npy(key + '.txt', npy_path, np.float32)
+    if not exists(label_path):
+        utils.DataProcessing.text_to_npy(key + '.labels', label_path, np.int32)
+
+    pc = np.load(npy_path, mmap_mode='r')
+    bounds = split_bounds(pc, parts, chunk_size)
+
+    return key, len(pc), bounds, time.perf_counter() - start
+
+
+def save_npy(path, arr):
+    tmp_path = '{}.{:d}.tmp.npy'.format(path[:-4], os.getpid())
+    np.save(tmp_path, arr)
+    os.replace(tmp_path, path)
+
+
+def process_part(job):
+    """Grid subsample one part of a cloud and save it as .npy files."""
+    key, name, bounds, part, chunk_size = job
+    start = time.perf_counter()
+    pc = np.load(key + '.npy', mmap_mode='r')
+    labels = np.load(key + '.labels.npy', mmap_mode='r')
+
+    if len(bounds) == 0:
+        part_pc, part_labels = np.asarray(pc), np.asarray(labels)
+    else:
+        pcs, lbls = [], []
+        for offset, chunk in iter_chunks(pc, chunk_size):
+            mask = np.searchsorted(bounds, chunk[:, axis], side='right') == part
+            pcs.append(chunk[mask])
+            lbls.append(labels[offset:offset + len(chunk)][mask])
+        part_pc, part_labels = np.concatenate(pcs), np.concatenate(lbls)
+
+    points, feat, part_labels = utils.DataProcessing.grid_subsampling(
+        np.ascontiguousarray(part_pc[:, :3]),
+        features=np.ascontiguousarray(part_pc[:, 3:]),
+        labels=np.ascontiguousarray(part_labels),
+        grid_size=sub_grid_size)
+    out = np.concatenate([points, feat], 1).astype(np.float32)
+    part_labels = part_labels.astype(np.int32).reshape((-1,))
+
+    if len(bounds) > 0:
+        shuf = np.arange(out.shape[0])
+        np.random.shuffle(shuf)
+        out, part_labels = out[shuf], part_labels[shuf]
+
+    save_npy(name + '.npy', out)
+    save_npy(name + '.labels.npy', part_labels)
+
+    return key, len(out), time.perf_counter() - start
+
+
 def preprocess(args):
     # Split large pointclouds into multiple point clouds.
 
@@ -47,101 +145,57 @@ def preprocess(args):
         out_path = Path(dataset_path) / 'processed'
         print("out_path not give, Saving output in {}".format(out_path))
 
-    all_files = glob.glob(str(Path(dataset_path) / '*.txt'))
-
-    train_files = [
-        f for f in all_files
-        if exists(str(Path(f).parent / Path(f).name.replace('.txt', '.labels')))
-    ]
+    keys = set()
+    for f in glob.glob(str(Path(dataset_path) / '*.txt')):
+        if exists(str(Path(f).parent /
+                      Path(f).name.replace('.txt', '.labels'))):
+            keys.add(f[:-len('.txt')])
+    for f in glob.glob(str(Path(dataset_path) / '*.labels.npy')):
+        if exists(f[:-len('.labels.npy')] + '.npy'):
+            keys.add(f[:-len('.labels.npy')])
 
     files = {}
-    for f in train_files:
-        size = Path(f).stat().st_size / 1e6
-        if size <= size_limit:
-            files[f] = 1
-            continue
-        else:
-            parts = int(size / size_limit) + 1
-            files[f] = parts
+    for key in sorted(keys):
+        src = key + '.txt' if exists(key + '.txt') else key + '.npy'
+        size = Path(src).stat().st_size / 1e6
+        files[key] = 1 if size <= size_limit else int(size / size_limit) + 1
 
     os.makedirs(out_path, exist_ok=True)
-
-    sub_grid_size = 0.01
-
-    for key, parts in tqdm(files.items()):
-
-        if parts == 1:
-            if dataset_path != out_path:
-                pc = pd.read_csv(key,
-                                 header=None,
-                                 delim_whitespace=True,
-                                 dtype=np.float32).values
-
-                labels = pd.read_csv(key.replace(".txt", ".labels"),
-                                     header=None,
-                                     delim_whitespace=True,
-                                     dtype=np.int32).values
-                labels = np.array(labels, dtype=np.int32).reshape((-1,))
-
-                print(pc.shape, labels.shape)
-                points, feat, labels = utils.DataProcessing.grid_subsampling(
-                    pc[:, :3],
-                    features=pc[:, 3:],
-                    labels=labels,
-                    grid_size=sub_grid_size)
-                pc = np.concatenate([points, feat], 1)
-                print(pc.shape, labels.shape)
-
-                name = join(out_path, Path(key).name.replace('.txt', '.txt'))
-                name_lbl = name.replace('.txt', '.labels')
-
-                np.savetxt(name, pc, fmt='%.3f %.3f %.3f %i %i %i %i')
-                np.savetxt(name_lbl, labels, fmt='%i')
-
-            continue
-        print("Splitting {} into {} parts".format(Path(key).name, parts))
-        pc = pd.read_csv(key,
-                         header=None,
-                         delim_whitespace=True,
-                         dtype=np.float32).values
-
-        labels = pd.read_csv(key.replace(".txt", ".labels"),
-                             header=None,
-                             delim_whitespace=True,
-                             dtype=np.int32).values
-        labels = np.array(labels, dtype=np.int32).reshape((-1,))
-
-        axis = 1  # Longest axis.
-
-        inds = pc[:, axis].argsort()
-        pc = pc[inds]
-        labels = labels[inds]
-        pcs = np.array_split(pc, parts)
-        lbls = np.array_split(labels, parts)
-
-        for i, pc in enumerate(pcs):
-            lbl = lbls[i]
-            print(pc.shape, lbl.shape)
-            pc, feat, lbl = utils.DataProcessing.grid_subsampling(
-                pc[:, :3],
-                features=pc[:, 3:],
-                labels=lbl,
-                grid_size=sub_grid_size)
-            pcs[i] = np.concatenate([pc, feat], 1)
-            lbls[i] = lbl
-            print(pc.shape, lbl.shape)
-
-        for i in range(parts):
-            name = join(
-                out_path,
-                Path(key).name.replace('.txt', '_part_{}.txt'.format(i)))
-            name_lbl = name.replace('.txt', '.labels')
-
-            shuf = np.arange(pcs[i].shape[0])
-            np.random.shuffle(shuf)
-
-            np.savetxt(name, pcs[i][shuf], fmt='%.3f %.3f %.3f %i %i %i %i')
-            np.savetxt(name_lbl, lbls[i][shuf], fmt='%i')
+    in_place = Path(dataset_path).resolve() == Path(out_path).resolve()
+
+    stats = {key: [0, 0, 0.0] for key in files}
+    with Pool(args.num_cpus) as p:
+        jobs = []
+        for key, num_points, bounds, seconds in p.imap_unordered(
+                ingest,
+            [(key, parts, args.chunk_size) for key, parts in files.items()]):
+            stats[key][0] = num_points
+            stats[key][2] += seconds
+            parts = files[key]
+            if parts == 1 and in_place:
+                continue
+            if parts > 1:
+                print("Splitting {} into {} parts".format(
+                    Path(key).name, parts))
+            for i in range(parts):
+                name = join(
+                    out_path,
+                    Path(key).name +
+                    ('_part_{}'.format(i) if parts > 1 else ''))
+                jobs.append((key, name, bounds, i, args.chunk_size))
+
+        for key, num_out, seconds in p.imap_unordered(process_part, jobs):
+            stats[key][1] += num_out
+            stats[key][2] += seconds
+
+    # The time is summed over the workers which processed the file.
+    print("{:<45} {:>12} {:>12} {:>10} {:>12}".format('file', 'points',
+                                                      'subsampled', 'time [s]',
+                                                      'Mpoints/s'))
+    for key, (num_in, num_out, seconds) in stats.items():
+        print("{:<45} {:>12d} {:>12d} {:>10.1f} {:>12.2f}".format(
+            Path(key).name, num_in, num_out, seconds,
+            num_in / seconds / 1e6 if seconds > 0 else 0))
 
 
 if __name__ == '__main__':
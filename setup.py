@@ -16,4 +16,5 @@ if __name__ == '__main__':
         description='Open MMLab Detection Toolbox and Benchmark',
         author='yi',
         packages=find_packages(exclude=('configs', 'tools', 'demo')),
+        package_data={'ml3d.utils': ['kernels/dispositions/*.ply']},
     )
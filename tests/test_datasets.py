@@ -0,0 +1,513 @@
+import os
+import numpy as np
+
+
+def test_box_array():
+    import open3d.ml.torch as ml3d
+    BEVBox3D = ml3d.datasets.utils.BEVBox3D
+    BoxArray = ml3d.datasets.utils.BoxArray
+
+    world_cam = np.array([[0, -1, 0, 0], [0, 0, -1, -0.08], [1, 0, 0, -0.27],
+                          [0, 0, 0, 1.]]).T
+    cam_img = np.array([[721.5, 0, 609.5, 44.8], [0, 721.5, 172.8, 0.2],
+                        [0, 0, 1, 0.003], [0, 0, 0, 1.]]).T
+
+    boxes = [
+        BEVBox3D(np.random.uniform([5, -20, -2], [60, 20, 0]),
+                 np.random.uniform(0.5, 4, 3),
+                 np.random.uniform(-3, 3), ['Car', 'Pedestrian'][i % 2],
+                 np.random.random(), world_cam, cam_img) for i in range(20)
+    ]
+    box_array = BoxArray.from_boxes(boxes)
+    assert len(box_array) == 20
+
+    np.testing.assert_allclose(box_array.to_xyzwhlr(),
+                               [bb.to_xyzwhlr() for bb in boxes],
+                               rtol=1e-6)
+    np.testing.assert_allclose(box_array.generate_corners3d(),
+                               [bb.generate_corners3d() for bb in boxes],
+                               rtol=1e-6)
+    np.testing.assert_allclose(box_array.to_img(),
+                               [bb.to_img() for bb in boxes],
+                               rtol=1e-4)
+
+    dicts = BEVBox3D.to_dicts(boxes)
+    array_dicts = BEVBox3D.to_dicts(box_array)
+    np.testing.assert_array_equal(dicts['label'], array_dicts['label'])
+    np.testing.assert_array_equal(dicts['difficulty'],
+                                  array_dicts['difficulty'])
+    np.testing.assert_allclose(dicts['bbox'], array_dicts['bbox'], rtol=1e-6)
+    np.testing.assert_allclose(dicts['score'], array_dicts['score'])
+
+    # indexing materializes boxes, masks and slices keep the arrays
+    assert isinstance(box_array[3], BEVBox3D)
+    np.testing.assert_allclose(box_array[3].front, boxes[3].front, atol=1e-6)
+    cars = box_array[box_array.label_class == 'Car']
+    assert isinstance(cars, BoxArray) and len(cars) == 10
+    assert len(box_array + boxes[:5]) == 25
+
+    # round trip through KITTI labels
+    kitti = BoxArray.from_kitti_format(box_array.to_kitti_format(), {
+        'world_cam': world_cam,
+        'cam_img': cam_img
+    })
+    np.testing.assert_allclose(kitti.to_camera(),
+                               box_array.to_camera(),
+                               atol=1e-2)
+    np.testing.assert_array_equal(kitti.label_class, box_array.label_class)
+
+
+def test_gt_database(tmp_path):
+    import open3d.ml.torch as ml3d
+    utils = ml3d.datasets.utils
+
+    boxes = []
+    for i in range(30):
+        box = utils.BEVBox3D(np.random.uniform([0, -40, -1],
+                                               [70, 40, 0]), [1.6, 1.5, 3.9],
+                             np.random.uniform(-3, 3),
+                             ['Car', 'Pedestrian'][i % 2], -1)
+        box.points_inside_box = (np.random.random(
+            (i, 4)) + box.to_xyzwhlr()[[0, 1, 2, 2]]).astype(np.float32)
+        boxes.append(box)
+
+    utils.GTDatabase.from_boxes(boxes).save(str(tmp_path / 'gt_database'))
+    db = utils.GTDatabase.load(str(tmp_path / 'gt_database'))
+    assert len(db) == 30
+    np.testing.assert_allclose(db.boxes, [bb.to_xyzwhlr() for bb in boxes],
+                               rtol=1e-6)
+    np.testing.assert_array_equal(
+        db.get_points([5, 2]),
+        np.concatenate([boxes[5].points_inside_box,
+                        boxes[2].points_inside_box]))
+
+    db.index_classes(['Car', 'Pedestrian'], {'Car': 10})
+    assert np.all(db.class_indices['Car'] % 2 == 0)
+    assert np.all(db.num_points[db.class_indices['Car']] > 10)
+    assert len(db.class_indices['Pedestrian']) == 15
+
+    data = {
+        'point':
+            np.random.uniform([0, -40, -1, 0], [70, 40, 0, 1],
+                              (1000, 4)).astype(np.float32),
+        'bbox_objs':
+            utils.BoxArray.from_boxes(boxes[:2]),
+        'calib':
+            None
+    }
+    data = utils.ObjdetAugmentation.ObjectSample(data, db, {
+        'Car': 5,
+        'Pedestrian': 4
+    })
+    bboxes = data['bbox_objs']
+    assert 2 < len(bboxes) <= 9
+    assert np.sum(bboxes.label_class == 'Car') <= 5
+    assert not utils.operations.box_collision_test(
+        bboxes.to_xyzwhlr(), bboxes.to_xyzwhlr())[np.triu_indices(
+            len(bboxes), 1)].any()
+
+
+def test_points_in_box_indices():
+    import open3d.ml.torch as ml3d
+    ops = ml3d.datasets.utils.operations
+
+    points = np.random.uniform([-20, -20, -2, 0], [20, 20, 1, 1],
+                               (20000, 4)).astype(np.float32)
+    boxes = np.concatenate([
+        np.random.uniform([-20, -20, -2], [20, 20, -1], (30, 3)),
+        np.random.uniform(0.5, 5, (30, 3)),
+        np.random.uniform(-np.pi, np.pi, (30, 1))
+    ],
+                           axis=1)
+
+    dense = ops.points_in_box(points, boxes)
+    indices = ops.points_in_box_indices(points, boxes)
+    assert len(indices) == 30
+    for i, idx in enumerate(indices):
+        np.testing.assert_array_equal(np.nonzero(dense[:, i])[0], idx)
+
+    np.testing.assert_array_equal(ops.remove_points_in_boxes(points, boxes),
+                                  points[~dense.any(-1)])
+
+
+def test_kitti_read_label(tmp_path):
+    import open3d.ml.torch as ml3d
+
+    world_cam = np.array([[0, -1, 0, 0], [0, 0, -1, -0.08], [1, 0, 0, -0.27],
+                          [0, 0, 0, 1.]]).T
+    cam_img = np.array([[721.5, 0, 609.5, 44.8], [0, 721.5, 172.8, 0.2],
+                        [0, 0, 1, 0.003], [0, 0, 0, 1.]]).T
+    calib = {'world_cam': world_cam, 'cam_img': cam_img}
+
+    # ground truth lines have no score
+    lines = [
+        'Car 0.00 0 -1.58 587.01 173.33 614.12 200.12 1.65 1.67 3.64 '
+        '-0.65 1.71 46.70 -1.59\n',
+        'Pedestrian 0.00 0 -0.20 712.40 143.00 810.73 307.92 1.89 0.48 1.20 '
+        '1.84 1.47 8.41 0.01\n', 'DontCare -1 -1 -10 503.89 169.71 590.61 '
+        '190.13 -1 -1 -1 -1000 -1000 -1000 -10\n'
+    ]
+    path = tmp_path / '000000.txt'
+    path.write_text(''.join(lines))
+
+    boxes = ml3d.datasets.KITTI.read_label(str(path), calib)
+    assert len(boxes) == 3
+    np.testing.assert_array_equal(boxes.label_class,
+                                  ['Car', 'Pedestrian', 'DontCare'])
+    np.testing.assert_array_equal(boxes.confidence, [-1, -1, -1])
+    np.testing.assert_array_equal(boxes.level[:2], [1, 0])
+    for box, line in zip(boxes, lines):
+        label = line.split()
+        size = [float(label[9]), float(label[8]), float(label[10])]
+        points = np.array([float(v) for v in label[11:14]] +
+                          [1.0]) @ np.linalg.inv(world_cam)
+        np.testing.assert_allclose(box.size, size)
+        np.testing.assert_allclose(
+            box.center, [points[0], points[1], points[2] + size[1] / 2],
+            rtol=1e-6)
+
+    # detections add a score
+    boxes = ml3d.datasets.utils.BoxArray.from_kitti_format(
+        [lines[0].strip() + ' 0.87'], calib)
+    np.testing.assert_allclose(boxes.confidence, [0.87])
+    assert len(
+        ml3d.datasets.KITTI.read_label(str(tmp_path / 'missing.txt'),
+                                       calib)) == 0
+
+
+def test_kitti_culled_points(tmp_path):
+    import open3d.ml.torch as ml3d
+
+    calib = [
+        'P0: ' + ' '.join(['0'] * 12), 'P1: ' + ' '.join(['0'] * 12),
+        'P2: 721.5377 0 609.5593 44.85728 0 721.5377 172.854 0.2163791 '
+        '0 0 1 0.002745884', 'P3: ' + ' '.join(['0'] * 12),
+        'R0_rect: 0.9999239 0.00983776 -0.007445048 -0.009869795 0.9999421 '
+        '-0.004278459 0.007402527 0.004351614 0.9999631',
+        'Tr_velo_to_cam: 0.007533745 -0.9999714 -0.000616602 -0.004069766 '
+        '0.01480249 0.0007280733 -0.9998902 -0.07631618 0.9998621 '
+        '0.00752379 0.01480755 -0.2717806'
+    ]
+    for d in ['velodyne', 'calib', 'label_2']:
+        os.makedirs(str(tmp_path / 'training' / d))
+    with open(str(tmp_path / 'training' / 'calib' / '000000.txt'), 'w') as f:
+        f.write('\n'.join(calib))
+    points = np.random.uniform([-80, -80, -3, 0], [80, 80, 2, 1],
+                               (10000, 4)).astype(np.float32)
+    points.tofile(str(tmp_path / 'training' / 'velodyne' / '000000.bin'))
+
+    dataset = ml3d.datasets.KITTI(str(tmp_path))
+    data = dataset.get_split('train').get_data(0)
+    calib = data['calib']
+
+    # reference: points inside the camera frustum
+    ops = ml3d.datasets.utils.operations
+    C, R, T = ops.projection_matrix_to_CRT_kitti(calib['cam_img'].T)
+    frustum = ops.get_frustum([0, 0, 1224, 370], C) - T
+    frustum = ops.camera_to_lidar((np.linalg.inv(R) @ frustum.T).T,
+                                  calib['world_cam'])
+    inside = ops.points_in_convex_polygon_3d(
+        points[:, :3], ops.corner_to_surfaces_3d(frustum[np.newaxis]))
+    np.testing.assert_array_equal(data['point'], points[inside[:, 0]])
+
+    dataset = ml3d.datasets.KITTI(str(tmp_path),
+                                  cache_dir=str(tmp_path / 'cache'),
+                                  cache_culled_points=True)
+    for _ in range(2):
+        cached = dataset.get_split('train').get_data(0)
+        np.testing.assert_array_equal(cached['point'], data['point'])
+    assert os.listdir(str(tmp_path / 'cache' / 'KITTI' /
+                          'culled_points')) == ['training_000000.npy']
+
+
+def test_semantic3d_ingest(tmp_path):
+    import open3d.ml.torch as ml3d
+
+    pc = np.concatenate([
+        np.random.uniform(-10, 10, (1000, 3)).round(3),
+        np.random.randint(-2000, 2000, (1000, 1)),
+        np.random.randint(0, 256, (1000, 3))
+    ],
+                        axis=1)
+    labels = np.random.randint(0, 9, (1000,))
+    np.savetxt(str(tmp_path / 'scene.txt'),
+               pc,
+               fmt='%.3f %.3f %.3f %i %i %i %i')
+    np.savetxt(str(tmp_path / 'scene.labels'), labels, fmt='%i')
+
+    dataset = ml3d.datasets.Semantic3D(str(tmp_path), val_files=[])
+    ref = dataset.get_split('train').get_data(0)
+
+    dataset.ingest()
+    assert sorted(os.listdir(str(tmp_path))) == [
+        'scene.labels', 'scene.labels.npy', 'scene.npy', 'scene.txt'
+    ]
+    assert np.load(str(tmp_path / 'scene.npy')).shape == (1000, 7)
+    np.testing.assert_array_equal(np.load(str(tmp_path / 'scene.labels.npy')),
+                                  labels)
+
+    # the text files are not read anymore
+    with open(str(tmp_path / 'scene.txt'), 'w') as f:
+        f.write('')
+    data = dataset.get_split('train').get_data(0)
+    for key in ['point', 'feat', 'intensity', 'label']:
+        assert data[key].dtype == ref[key].dtype
+        np.testing.assert_array_equal(data[key], ref[key])
+
+    # clouds which only exist as .npy files are found as well
+    np.save(str(tmp_path / 'binary.npy'), np.load(str(tmp_path / 'scene.npy')))
+    np.save(str(tmp_path / 'binary.labels.npy'), labels.astype(np.int32))
+    dataset = ml3d.datasets.Semantic3D(str(tmp_path), val_files=['binary'])
+    assert [os.path.basename(f) for f in dataset.get_split_list('val')
+           ] == ['binary.txt']
+    data = dataset.get_split('val').get_data(0)
+    np.testing.assert_array_equal(data['label'], ref['label'])
+
+    # chunked conversion gives the same array
+    utils = ml3d.datasets.utils
+    np.savetxt(str(tmp_path / 'custom.txt'),
+               pc,
+               fmt='%.3f %.3f %.3f %i %i %i %i')
+    assert utils.DataProcessing.text_to_npy(str(tmp_path / 'custom.txt'),
+                                            str(tmp_path / 'custom.npy'),
+                                            chunk_size=64) == 1000
+    np.testing.assert_array_equal(np.load(str(tmp_path / 'custom.npy')),
+                                  np.load(str(tmp_path / 'scene.npy')))
+
+    # blank lines are skipped
+    for text, ref in [('1 2 3\n4 5 6\n\n', [[1, 2, 3], [4, 5, 6]]),
+                      ('1 2\n\n3 4', [[1, 2], [3, 4]]), ('7\n\n8\n', [7, 8]),
+                      ('\n\n', np.zeros((0,)))]:
+        (tmp_path / 'blank.txt').write_text(text)
+        assert utils.DataProcessing.text_to_npy(str(tmp_path / 'blank.txt'),
+                                                str(tmp_path / 'blank.npy'),
+                                                chunk_size=1) == len(ref)
+        np.testing.assert_array_equal(np.load(str(tmp_path / 'blank.npy')), ref)
+
+
+def test_read_ply_mmap(tmp_path):
+    import importlib
+    from plyfile import PlyData, PlyElement
+    import open3d.ml.torch as ml3d
+    ply = importlib.import_module(
+        ml3d.datasets.__name__.rsplit('.', 1)[0] + '.utils.ply')
+
+    n = 1000
+    vertex = np.zeros(n,
+                      dtype=[('x', 'f8'), ('y', 'f8'), ('z', 'f8'),
+                             ('red', 'u1'), ('green', 'u1'), ('blue', 'u1'),
+                             ('scalar_Label', 'f4')])
+    for name, (lo, hi) in zip(['x', 'y', 'z'], [(627000, 628000),
+                                                (4841000, 4842000), (0, 50)]):
+        vertex[name] = np.random.uniform(lo, hi, n)
+    for name in ['red', 'green', 'blue']:
+        vertex[name] = np.random.randint(0, 256, n)
+    vertex['scalar_Label'] = np.random.randint(0, 9, n)
+
+    for byte_order in ['<', '>']:
+        path = str(tmp_path / 'L002.ply')
+        PlyData([PlyElement.describe(vertex, 'vertex')],
+                byte_order=byte_order).write(path)
+
+        data = ply.read_ply(path, mmap=True)
+        assert isinstance(data, np.memmap)
+        np.testing.assert_array_equal(data, ply.read_ply(path))
+
+        xyz = ply.ply_xyz(data)
+        assert np.shares_memory(xyz, data)
+        np.testing.assert_array_equal(
+            xyz, np.stack([vertex['x'], vertex['y'], vertex['z']], 1))
+        np.testing.assert_array_equal(
+            ply.ply_rgb(data),
+            np.stack([vertex['red'], vertex['green'], vertex['blue']], 1))
+
+        # reference: the former PlyData implementation
+        ref = PlyData.read(path)['vertex']
+        ref_points = np.float32(
+            np.vstack((ref['x'], ref['y'], ref['z'])).astype(np.float64).T -
+            [627285, 4841948, 0])
+
+        dataset = ml3d.datasets.Toronto3D(str(tmp_path))
+        pc = dataset.get_split('val').get_data(0)
+        np.testing.assert_array_equal(pc['point'], ref_points)
+        np.testing.assert_array_equal(pc['feat'], ply.ply_rgb(data))
+        np.testing.assert_array_equal(pc['label'], vertex['scalar_Label'])
+        assert pc['point'].flags.writeable and pc['feat'].flags.writeable
+        del data, xyz
+
+
+def test_s3dis_create_ply_files(tmp_path):
+    import importlib
+    import open3d.ml.torch as ml3d
+    ply = importlib.import_module(
+        ml3d.datasets.__name__.rsplit('.', 1)[0] + '.utils.ply')
+
+    rooms = {
+        'Area_1/conferenceRoom_1': ['chair_1', 'wall_1', 'stairs_1'],
+        'Area_1/conferenceRoom_2': ['table_1', 'floor_1']
+    }
+    objects = {}
+    for room, names in rooms.items():
+        os.makedirs(str(tmp_path / room / 'Annotations'))
+        for name in names:
+            pc = np.concatenate([
+                np.random.uniform(-10, 10, (100, 3)).round(3),
+                np.random.randint(0, 256, (100, 3))
+            ],
+                                axis=1)
+            # the parser falls back to arbitrary whitespace
+            fmt = '%.3f\t%.3f  %.3f %i %i %i' if name == 'floor_1' else \
+                '%.3f %.3f %.3f %i %i %i'
+            np.savetxt(str(tmp_path / room / 'Annotations' / (name + '.txt')),
+                       pc,
+                       fmt=fmt)
+            objects[room, name] = pc
+
+    dataset = ml3d.datasets.S3DIS(str(tmp_path), num_cpus=2)
+    assert len(dataset.all_files) == 2
+
+    label_to_idx = {v: k for k, v in dataset.label_to_names.items()}
+    for room, names in rooms.items():
+        data = ply.read_ply(
+            str(tmp_path / 'original_ply' / (room.replace('/', '_') + '.ply')))
+        names = sorted(names)
+        pc = np.concatenate([objects[room, name] for name in names])
+        labels = np.concatenate([
+            np.full((100,), label_to_idx.get(name.split('_')[0], 12))
+            for name in names
+        ])
+        np.testing.assert_array_equal(ply.ply_xyz(data),
+                                      pc[:, :3].astype(np.float32))
+        np.testing.assert_array_equal(ply.ply_rgb(data),
+                                      pc[:, 3:].astype(np.uint8))
+        np.testing.assert_array_equal(data['class'], labels)
+
+    # converted rooms are skipped and missing ones are created again
+    done = str(tmp_path / 'original_ply' / 'Area_1_conferenceRoom_1.ply')
+    os.remove(str(tmp_path / 'original_ply' / 'Area_1_conferenceRoom_2.ply'))
+    mtime = os.stat(done).st_mtime_ns
+    dataset = ml3d.datasets.S3DIS(str(tmp_path), num_cpus=2)
+    assert len(dataset.all_files) == 2
+    assert os.stat(done).st_mtime_ns == mtime
+
+
+def test_dataset_manifest(tmp_path):
+    import open3d.ml.torch as ml3d
+    Manifest = ml3d.datasets.utils.Manifest
+
+    root = tmp_path / 'data'
+    for seq in ['00', '08']:
+        for d in ['velodyne', 'labels']:
+            os.makedirs(str(root / 'dataset' / 'sequences' / seq / d))
+        for i in [2, 0, 1]:
+            name = '{:06d}'.format(i)
+            np.zeros((10 + i, 4), np.float32).tofile(
+                str(root / 'dataset' / 'sequences' / seq / 'velodyne' /
+                    (name + '.bin')))
+            if seq == '00':
+                np.zeros((10 + i,), np.uint32).tofile(
+                    str(root / 'dataset' / 'sequences' / seq / 'labels' /
+                        (name + '.label')))
+
+    def make_dataset():
+        return ml3d.datasets.SemanticKITTI(str(root),
+                                           cache_dir=str(tmp_path / 'cache'),
+                                           use_manifest=True,
+                                           training_split=['00'],
+                                           validation_split=['08'],
+                                           test_split=[],
+                                           all_split=['00', '08'])
+
+    dataset = make_dataset()
+    velodyne = str(root / 'dataset' / 'sequences' / '{}' / 'velodyne')
+    ref = [
+        os.path.join(velodyne.format(seq), f)
+        for seq in ['00', '08']
+        for f in sorted(os.listdir(velodyne.format(seq)))
+    ]
+    assert list(dataset.get_split_list('all')) == ref
+    assert list(dataset.get_split_list('val')) == ref[3:]
+    manifest = dataset.manifest
+    np.testing.assert_array_equal(manifest.has_label, [True] * 3 + [False] * 3)
+    np.testing.assert_array_equal(manifest.sizes, [160, 176, 192] * 2)
+
+    # statistics are stored with the manifest
+    path = dataset.get_manifest_path()
+    manifest.set_stats(ref[0], 10, np.array([0, 1, 1, 3]))
+    manifest.save(path)
+    mtime = os.stat(path).st_mtime_ns
+    manifest = make_dataset().manifest
+    assert os.stat(path).st_mtime_ns == mtime
+    assert manifest.num_points[0] == 10
+    np.testing.assert_array_equal(manifest.class_hist[0], [1, 2, 0, 1])
+
+    # adding a file invalidates the manifest, the statistics of unchanged
+    # files are kept
+    np.zeros(
+        (5, 4),
+        np.float32).tofile(os.path.join(velodyne.format('08'), '000003.bin'))
+    dataset = make_dataset()
+    assert os.stat(path).st_mtime_ns != mtime
+    assert list(dataset.get_split_list('val'))[-1].endswith('000003.bin')
+    assert dataset.manifest.num_points[0] == 10
+    assert Manifest.load(path).is_valid(dataset.manifest.dirs)
+
+    # so does adding a label
+    mtime = os.stat(path).st_mtime_ns
+    np.zeros((10,), np.uint32).tofile(
+        str(root / 'dataset' / 'sequences' / '08' / 'labels' / '000000.label'))
+    assert not Manifest.load(path).is_valid(dataset.manifest.dirs)
+    manifest = make_dataset().manifest
+    assert os.stat(path).st_mtime_ns != mtime
+    np.testing.assert_array_equal(manifest.has_label, [True] * 4 + [False] * 3)
+    assert manifest.num_points[0] == 10
+
+
+def test_nuscenes_lazy_infos(tmp_path):
+    import open3d.ml.torch as ml3d
+    import pickle
+    from scipy.spatial.transform import Rotation
+
+    rng = np.random.default_rng(0)
+    infos = []
+    for i in range(4):
+        path = str(tmp_path / '{:d}.pcd.bin'.format(i))
+        rng.random((20, 5), dtype=np.float32).tofile(path)
+        num_boxes = i % 3
+        infos.append({
+            'lidar_path': path,
+            'lidar2ego_tr': rng.random(3),
+            'lidar2ego_rot': rng.random(4),
+            'gt_boxes': rng.random((num_boxes, 7)),
+            'gt_names': np.array(['car', 'truck', 'bus'][:num_boxes]),
+            'num_lidar_pts': np.arange(num_boxes),
+        })
+    with open(str(tmp_path / 'infos_train.pkl'), 'wb') as f:
+        pickle.dump(infos, f)
+    with open(str(tmp_path / 'infos_val.pkl'), 'wb') as f:
+        pickle.dump(infos[:1], f)
+
+    dataset = ml3d.datasets.NuScenes(str(tmp_path))
+    assert dataset.infos == {}
+    split = dataset.get_split('train')
+    assert list(dataset.infos) == ['train']
+    assert len(split) == 4
+    assert len(dataset.get_split('test')) == 0
+
+    for i, info in enumerate(infos):
+        world_cam = np.eye(4)
+        world_cam[:3, :3] = Rotation.from_quat(
+            info['lidar2ego_rot']).as_matrix()
+        world_cam[:3, -1] = info['lidar2ego_tr']
+
+        data = split.get_data(i)
+        np.testing.assert_allclose(data['calib']['world_cam'], world_cam.T)
+        assert split.get_attr(i)['path'] == info['lidar_path']
+
+        boxes = data['bounding_boxes']
+        mask = info['num_lidar_pts'] != 0
+        assert len(boxes) == mask.sum()
+        np.testing.assert_array_equal(boxes.label_class, info['gt_names'][mask])
+        np.testing.assert_allclose(boxes.center,
+                                   info['gt_boxes'][mask, :3],
+                                   rtol=1e-6)
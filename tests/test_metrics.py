@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def test_map_evaluator():
+    from ml3d import metrics
+
+    rng = np.random.RandomState(0)
+
+    def frame(n, with_score):
+        data = {
+            'bbox':
+                np.concatenate([
+                    rng.uniform(0, 40, (n, 3)),
+                    rng.uniform(1, 4, (n, 3)),
+                    np.zeros((n, 1))
+                ],
+                               axis=1),
+            'label':
+                rng.randint(0, 3, n),
+            'difficulty':
+                rng.randint(-1, 3, n)
+        }
+        if with_score:
+            data['score'] = rng.random_sample(n)
+        return data
+
+    gt = [frame(rng.randint(0, 10), False) for _ in range(20)]
+    pred = []
+    for t in gt:
+        n = len(t['label'])
+        p = frame(n + 5, True)
+        p['bbox'][:n] = t['bbox']
+        p['bbox'][:n, :3] += rng.uniform(0, 1, (n, 3))
+        p['label'][:n] = t['label']
+        pred.append(p)
+
+    # computed with the mAP of the baseline, for min_overlap [0.5] and
+    # [0.25, 0.3]
+    expected_bev = np.array([[[0.9090909091, 4.5454545455],
+                              [1.2987012987, 14.1414141414],
+                              [3.6527436527, 19.5075757576]],
+                             [[0.7575757576, 4.5454545455],
+                              [2.2727272727, 5.7342657343],
+                              [3.6266924565, 18.5102776012]]])
+    expected_3d = np.array([[[0.9090909091, 1.0101010101],
+                             [1.0101010101, 11.5702479339],
+                             [0.6993006993, 15.3594771242]],
+                            [[0.6993006993, 4.5454545455],
+                             [2.2727272727, 4.5454545455],
+                             [2.2727272727, 6.4972708451]]])
+
+    evaluator = metrics.MAPEvaluator([0, 1], [0, 1, 2], [0.5])
+    for p, t in zip(pred, gt):
+        evaluator.add_frame(p, t)
+    ap = evaluator.compute()
+    assert ap.shape == (2, 3, 1)
+    np.testing.assert_allclose(ap, expected_bev[..., :1], rtol=1e-9)
+    np.testing.assert_array_equal(
+        ap, metrics.mAP(pred, gt, [0, 1], [0, 1, 2], [0.5]))
+
+    # BEV and 3D with two sets of overlaps in a single pass, matching the
+    # frames in worker processes
+    evaluator = metrics.MAPEvaluator([0, 1], [0, 1, 2], [[0.5], [0.25, 0.3]],
+                                     bev=[True, False],
+                                     num_workers=2)
+    for p, t in zip(pred, gt):
+        evaluator.add_frame(p, t)
+    for bev, ap, expected in zip([True, False], evaluator.compute(),
+                                 [expected_bev, expected_3d]):
+        np.testing.assert_allclose(ap, expected, rtol=1e-9)
+        np.testing.assert_array_equal(
+            ap[..., 1:],
+            metrics.mAP(pred, gt, [0, 1], [0, 1, 2], [0.25, 0.3], bev=bev))
+    assert evaluator.pool is None
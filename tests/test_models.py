@@ -1,3 +1,4 @@
+import os
 import pytest
 import numpy as np
 
@@ -144,3 +145,653 @@ def test_kpconv_tf():
     out = net(inputs)
 
     assert out.shape == (1000, 5)
+
+
+def test_randlanet_torch_mixed_precision(tmp_path):
+    import copy
+    import torch
+    import open3d.ml.torch as ml3d
+    if not hasattr(torch, 'autocast'):
+        pytest.skip("CPU autocast needs torch >= 1.10")
+
+    np.random.seed(0)
+    torch.manual_seed(0)
+
+    # synthetic labels that only depend on the point position
+    points = np.array(np.random.random((1000, 3)), dtype=np.float32)
+    data = {
+        'point': points,
+        'feat': np.array(np.random.random((1000, 3)), dtype=np.float32),
+        'label': np.array(points[:, 0] * 4, dtype=np.int32)
+    }
+    attr = {'split': 'train'}
+
+    net = ml3d.models.RandLANet(num_points=5000, num_classes=4, dim_input=6)
+    net.device = 'cpu'
+    inputs = net.transform(net.preprocess(data, attr), attr)
+    inputs = {
+        k: [torch.from_numpy(np.array([item])) for item in v] if isinstance(
+            v, list) else torch.from_numpy(np.array([v]))
+        for k, v in inputs.items()
+    }
+    labels = inputs['labels']
+
+    # train the same network with and without mixed precision
+    accs = []
+    for mixed_precision in [False, True]:
+        model = copy.deepcopy(net)
+        pipeline = ml3d.pipelines.SemanticSegmentation(
+            model,
+            device='cpu',
+            main_log_dir=str(tmp_path),
+            mixed_precision=mixed_precision)
+        pipeline.optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+        model.train()
+        for step in range(20):
+            with pipeline.autocast():
+                out = model(inputs)
+                loss = torch.nn.functional.cross_entropy(
+                    out.float().reshape(-1, 4),
+                    labels.reshape(-1).long())
+            pipeline.optimizer_step(loss)
+
+        # batch statistics, the running ones barely move in a few steps
+        with torch.no_grad(), pipeline.autocast():
+            out = model(inputs).float()
+        accs.append((out.argmax(-1) == labels).float().mean().item())
+
+    assert accs[0] > 0.8
+    assert abs(accs[0] - accs[1]) < 0.05
+
+
+def test_torch_mixed_precision_train_step(tmp_path):
+    import copy
+    import torch
+    from types import SimpleNamespace
+    import open3d.ml.torch as ml3d
+    if not hasattr(torch, 'amp') or not hasattr(torch.amp, 'GradScaler'):
+        pytest.skip("CPU gradient scaling needs torch >= 2.3")
+
+    def train_step(pipeline, loss_fn):
+        model = pipeline.model
+        model.train()
+        pipeline.optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        before = [p.detach().clone() for p in model.parameters()]
+        torch.manual_seed(0)
+        with pipeline.autocast():
+            loss = loss_fn(model)
+        pipeline.optimizer_step(loss)
+        return torch.cat([(p.detach() - b).flatten()
+                          for p, b in zip(model.parameters(), before)])
+
+    def check(net, pipeline_cls, loss_fn):
+        steps = []
+        for scaled, clip in [(False, False), (True, False), (True, True)]:
+            model = copy.deepcopy(net)
+            pipeline = pipeline_cls(model,
+                                    device='cpu',
+                                    main_log_dir=str(tmp_path),
+                                    mixed_precision=True)
+            if scaled:
+                # only enabled for float16 on CUDA by default
+                pipeline.scaler = torch.amp.GradScaler('cpu', init_scale=2.**10)
+            if clip:
+                model.cfg.grad_clip_norm = 1e-4
+            steps.append(train_step(pipeline, loss_fn))
+            if scaled:
+                assert pipeline.scaler.get_scale() == 2.**10
+
+        # the scaled step matches the unscaled one
+        assert torch.isfinite(steps[1]).all()
+        assert steps[1].abs().max() > 0
+        assert torch.allclose(steps[1], steps[0], rtol=1e-4, atol=1e-7)
+        # gradients are unscaled before clipping them
+        np.testing.assert_allclose(steps[2].abs().max().item(),
+                                   0.1 * 1e-4,
+                                   rtol=1e-2)
+
+    points = np.array(np.random.random((1000, 3)), dtype=np.float32)
+    data = {
+        'point': points,
+        'feat': np.array(np.random.random((1000, 3)), dtype=np.float32),
+        'label': np.array(points[:, 0] * 4, dtype=np.int32) + 1
+    }
+    attr = {'split': 'train'}
+
+    # RandLANet
+    net = ml3d.models.RandLANet(num_points=5000, num_classes=10, dim_input=6)
+    net.device = 'cpu'
+    inputs = net.transform(net.preprocess(data, attr), attr)
+    inputs = {
+        k: [torch.from_numpy(np.array([item])) for item in v] if isinstance(
+            v, list) else torch.from_numpy(np.array([v]))
+        for k, v in inputs.items()
+    }
+    Loss = ml3d.modules.SemSegLoss(None, net, SimpleNamespace(cfg={}), 'cpu')
+    check(net, ml3d.pipelines.SemanticSegmentation,
+          lambda m: m.get_loss(Loss, m(inputs), {'data': inputs}, 'cpu')[0])
+
+    # KPConv
+    net = ml3d.models.KPFCNN(lbl_values=[0, 1, 2, 3, 4, 5],
+                             num_classes=5,
+                             ignored_label_inds=[0],
+                             in_features_dim=5)
+    net.device = 'cpu'
+    batcher = ml3d.dataloaders.ConcatBatcher('cpu')
+    inputs = batcher.collate_fn([{
+        'data': net.transform(net.preprocess(data, attr), attr),
+        'attr': attr
+    }])
+    Loss = ml3d.modules.SemSegLoss(None, net, SimpleNamespace(cfg={}), 'cpu')
+    check(net, ml3d.pipelines.SemanticSegmentation,
+          lambda m: m.get_loss(Loss, m(inputs['data']), inputs, 'cpu')[0])
+
+    # PointPillars
+    BEVBox3D = ml3d.datasets.utils.BEVBox3D
+    net = ml3d.models.PointPillars(
+        device='cpu',
+        point_cloud_range=[0, -40, -3, 70, 40, 1],
+        classes=['Pedestrian', 'Cyclist', 'Car'],
+        voxelize={
+            'max_num_points': 32,
+            'voxel_size': [0.16, 0.16, 4],
+            'max_voxels': [16000, 40000]
+        },
+        voxel_encoder={
+            'in_channels': 4,
+            'feat_channels': [64],
+            'voxel_size': [0.16, 0.16, 4]
+        },
+        scatter={
+            'in_channels': 64,
+            'output_shape': [496, 432]
+        },
+        head={
+            'ranges': [[0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                       [0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                       [0, -39.68, -1.78, 70.4, 39.68, -1.78]],
+            'sizes': [[0.6, 0.8, 1.73], [0.6, 1.76, 1.73], [1.6, 3.9, 1.56]],
+            'iou_thr': [[0.35, 0.5], [0.35, 0.5], [0.45, 0.6]]
+        })
+    points = np.random.random((5000, 4)).astype(np.float32)
+    points[:, :3] *= [60, 60, 3]
+    points[:, :3] += [2, -30, -2]
+    data = {
+        'point': points,
+        'bbox_objs': [
+            BEVBox3D([10, 5, -1], [1.6, 1.5, 3.9], 0.3, 'Car', 1.0),
+            BEVBox3D([20, -3, -1], [0.6, 1.7, 0.8], 1.2, 'Pedestrian', 1.0)
+        ],
+        'calib': None
+    }
+    attr = {'split': 'test'}
+    batch = ml3d.dataloaders.ObjectDetectBatcher().collate_fn([{
+        'data': net.transform(data, attr),
+        'attr': attr
+    }])
+    check(net, ml3d.pipelines.ObjectDetection,
+          lambda m: sum(m.loss(m(batch.point), batch).values()))
+
+
+def test_torch_update_probs():
+    import torch
+    from types import SimpleNamespace
+    import open3d.ml.torch as ml3d
+
+    # update_probs accumulates softmax probabilities, not raw logits
+    logits = torch.randn(1, 50, 10) * 5
+    probs = torch.softmax(logits, dim=-1).numpy()[0]
+    inds = np.random.permutation(100)[:50]
+
+    model = SimpleNamespace(cfg=SimpleNamespace(num_classes=10))
+    test_probs, test_labels = np.zeros((100, 10)), np.zeros((100,), np.int64)
+    ml3d.models.RandLANet.update_probs(model, {'data': {
+        'point_inds': [inds]
+    }}, logits, test_probs, test_labels)
+    np.testing.assert_allclose(test_probs[inds], 0.05 * probs, rtol=1e-5)
+    np.testing.assert_array_equal(test_labels[inds], probs.argmax(1))
+
+    mask = np.zeros((100,), bool)
+    mask[inds] = True
+    batch = SimpleNamespace(labels=torch.zeros(50, dtype=torch.int64),
+                            lengths=[torch.tensor([50])],
+                            frame_inds=torch.zeros(1, 2, dtype=torch.int64),
+                            reproj_inds=[np.arange(100)],
+                            reproj_masks=[mask],
+                            val_labels=[np.zeros(100, np.int64)])
+    test_probs, test_labels = np.zeros((100, 10)), np.zeros((100,), np.int64)
+    ml3d.models.KPFCNN.update_probs(SimpleNamespace(), {'data': batch},
+                                    logits[0], test_probs, test_labels)
+    np.testing.assert_allclose(test_probs[mask], 0.05 * probs, rtol=1e-5)
+    np.testing.assert_array_equal(test_labels[mask], probs.argmax(1))
+
+
+def test_randlanet_torch_grad_checkpoint():
+    import torch
+    import open3d.ml.torch as ml3d
+
+    net = ml3d.models.RandLANet(num_points=5000, num_classes=10, dim_input=6)
+    net_ckpt = ml3d.models.RandLANet(num_points=5000,
+                                     num_classes=10,
+                                     dim_input=6,
+                                     grad_checkpoint=True)
+    net_ckpt.load_state_dict(net.state_dict())
+    net.device = 'cpu'
+    net_ckpt.device = 'cpu'
+
+    data = {
+        'point':
+            np.array(np.random.random((1000, 3)), dtype=np.float32),
+        'feat':
+            np.array(np.random.random((1000, 3)), dtype=np.float32),
+        'label':
+            np.array([np.random.randint(10) for i in range(1000)],
+                     dtype=np.int32)
+    }
+    attr = {'split': 'train'}
+
+    data = net.preprocess(data, attr)
+    inputs = net.transform(data, attr)
+    inputs = {
+        'xyz': [torch.from_numpy(np.array([item])) for item in inputs['xyz']],
+        'neigh_idx': [
+            torch.from_numpy(np.array([item])) for item in inputs['neigh_idx']
+        ],
+        'sub_idx': [
+            torch.from_numpy(np.array([item])) for item in inputs['sub_idx']
+        ],
+        'interp_idx': [
+            torch.from_numpy(np.array([item])) for item in inputs['interp_idx']
+        ],
+        'features': torch.from_numpy(np.array([inputs['features']])),
+        'labels': torch.from_numpy(np.array([inputs['labels']]))
+    }
+
+    outs = []
+    for model in [net, net_ckpt]:
+        model.train()
+        torch.manual_seed(0)
+        out = model(inputs)
+        out.sum().backward()
+        outs.append(out.detach())
+
+    assert torch.allclose(outs[0], outs[1], atol=1e-5)
+    for p, p_ckpt in zip(net.parameters(), net_ckpt.parameters()):
+        if p.grad is not None:
+            assert torch.allclose(p.grad, p_ckpt.grad, atol=1e-4)
+
+    # the recomputation must not update the batch norm statistics again
+    for (name, b), b_ckpt in zip(net.named_buffers(), net_ckpt.buffers()):
+        if name.endswith('num_batches_tracked'):
+            assert torch.equal(b, b_ckpt)
+        else:
+            assert torch.allclose(b, b_ckpt, atol=1e-5)
+
+
+def test_randlanet_torch_gather_neighbour():
+    import torch
+    import open3d.ml.torch as ml3d
+
+    pc = torch.rand(2, 100, 8)
+    neighbor_idx = torch.randint(0, 100, (2, 50, 16))
+
+    features = ml3d.models.RandLANet.gather_neighbour(pc, neighbor_idx)
+
+    assert features.shape == (2, 50, 16, 8)
+    for b in range(2):
+        assert torch.equal(features[b], pc[b][neighbor_idx[b]])
+
+
+def test_kpconv_torch_chunked():
+    import torch
+    import open3d.ml.torch as ml3d
+
+    net = ml3d.models.KPFCNN(lbl_values=[0, 1, 2, 3, 4, 5],
+                             num_classes=4,
+                             ignored_label_inds=[0],
+                             in_features_dim=5,
+                             conv_chunk_size=64)
+    net.device = 'cpu'
+    net.eval()
+
+    data = {
+        'point':
+            np.array(np.random.random((1000, 3)), dtype=np.float32),
+        'feat':
+            np.array(np.random.random((1000, 3)), dtype=np.float32),
+        'label':
+            np.array([np.random.randint(5) for i in range(1000)],
+                     dtype=np.int32)
+    }
+    attr = {'split': 'test'}
+    batcher = ml3d.dataloaders.ConcatBatcher('cpu')
+
+    data = net.preprocess(data, attr)
+    inputs = {'data': net.transform(data, attr), 'attr': attr}
+    inputs = batcher.collate_fn([inputs])
+    with torch.no_grad():
+        out_chunked = net(inputs['data']).numpy()
+
+    for m in net.modules():
+        if isinstance(m, ml3d.models.kpconv.KPConv):
+            m.chunk_size = 0
+    with torch.no_grad():
+        out = net(inputs['data']).numpy()
+
+    np.testing.assert_allclose(out_chunked, out, rtol=1e-5, atol=1e-5)
+
+
+def test_kpconv_torch_kernel_cache(tmp_path, monkeypatch):
+    import open3d.ml.torch as ml3d
+
+    kpconv = ml3d.models.kpconv
+    monkeypatch.setenv('OPEN3D_ML_KERNEL_DIR', str(tmp_path))
+
+    # The default disposition is shipped and must not be regenerated
+    kernel_points = kpconv.load_kernels(1.0, 15, 3, 'center')
+    assert kernel_points.shape == (15, 3)
+    assert os.listdir(tmp_path) == []
+
+    # Dispositions in the user cache take precedence
+    cached = np.random.normal(size=(15, 3))
+    cached /= np.linalg.norm(cached, axis=1, keepdims=True)
+    kpconv.write_kernel_disposition(cached, 15, 'center', 3)
+    assert os.listdir(tmp_path) == ['k_015_center_3D.ply']
+
+    kernel_points = kpconv.load_kernels(1.0, 15, 3, 'center')
+    np.testing.assert_allclose(np.linalg.norm(kernel_points, axis=1),
+                               1.0,
+                               atol=0.1)
+
+
+def test_pointpillars_torch_batched():
+    import torch
+    import open3d.ml.torch as ml3d
+    BEVBox3D = ml3d.datasets.utils.BEVBox3D
+
+    net = ml3d.models.PointPillars(
+        device='cpu',
+        point_cloud_range=[0, -40, -3, 70, 40, 1],
+        classes=['Pedestrian', 'Cyclist', 'Car'],
+        voxelize={
+            'max_num_points': 32,
+            'voxel_size': [0.16, 0.16, 4],
+            'max_voxels': [16000, 40000]
+        },
+        voxel_encoder={
+            'in_channels': 4,
+            'feat_channels': [64],
+            'voxel_size': [0.16, 0.16, 4]
+        },
+        scatter={
+            'in_channels': 64,
+            'output_shape': [496, 432]
+        },
+        head={
+            'ranges': [[0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                       [0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                       [0, -39.68, -1.78, 70.4, 39.68, -1.78]],
+            'sizes': [[0.6, 0.8, 1.73], [0.6, 1.76, 1.73], [1.6, 3.9, 1.56]],
+            'iou_thr': [[0.35, 0.5], [0.35, 0.5], [0.45, 0.6]]
+        })
+    net.eval()
+
+    points = np.random.random((5000, 4)).astype(np.float32)
+    points[:, :3] *= [60, 60, 3]
+    points[:, :3] += [2, -30, -2]
+    data = {
+        'point': points,
+        'bbox_objs': [
+            BEVBox3D([10, 5, -1], [1.6, 1.5, 3.9], 0.3, 'Car', 1.0),
+            BEVBox3D([20, -3, -1], [0.6, 1.7, 0.8], 1.2, 'Pedestrian', 1.0)
+        ],
+        'calib': None
+    }
+    attr = {'split': 'test'}
+    batcher = ml3d.dataloaders.ObjectDetectBatcher()
+    sample = {'data': net.transform(data, attr), 'attr': attr}
+
+    # transform only returns NumPy arrays so it can run in workers
+    assert isinstance(sample['data']['point'], np.ndarray)
+    np.testing.assert_array_equal(sample['data']['labels'], [2, 0])
+    np.testing.assert_allclose(
+        sample['data']['bboxes'],
+        np.stack([bb.to_xyzwhlr() for bb in data['bbox_objs']]),
+        rtol=1e-6)
+
+    with torch.no_grad():
+        single = batcher.collate_fn([sample])
+        loss_single = net.loss(net(single.point), single)
+
+        batch = batcher.collate_fn([sample, sample])
+        results = net(batch.point)
+        loss_batch = net.loss(results, batch)
+        boxes = net.inference_end(results, batch)
+
+    assert len(boxes) == 2
+    for k in loss_single:
+        np.testing.assert_allclose(loss_batch[k].item(),
+                                   loss_single[k].item(),
+                                   rtol=1e-4)
+
+
+def test_pointpillars_torch_anchor_cache():
+    import torch
+    import open3d.ml.torch as ml3d
+
+    generator = ml3d.models.point_pillars.Anchor3DRangeGenerator(
+        ranges=[[0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                [0, -39.68, -1.78, 70.4, 39.68, -1.78]],
+        sizes=[[0.6, 0.8, 1.73], [1.6, 3.9, 1.56]],
+        rotations=[0, 1.57])
+
+    anchors = generator.grid_anchors((248, 216), device='cpu')
+    assert anchors.shape == (1, 248, 216, 2, 2, 7)
+    assert generator.grid_anchors((248, 216), device='cpu') is anchors
+
+    per_range, per_range_bev = generator.grid_anchors_per_range((248, 216),
+                                                                device='cpu')
+    for i in range(2):
+        assert torch.equal(per_range[i], anchors[..., i, :, :].reshape(-1, 7))
+        assert per_range_bev[i].shape == (248 * 216 * 2, 4)
+
+
+def test_pointpillars_torch_scatter_max():
+    import torch
+    from ml3d.torch.utils import objdet_helper
+
+    torch.manual_seed(0)
+    index = torch.randint(0, 50, (1000,))
+    # ties and untouched entries
+    src = torch.randint(0, 20, (1000,)).float() / 20
+    for reduce, fill in [('amax', 0.5), ('amin', 0.5)]:
+        out = torch.full((60,), fill)
+        ref = out.clone().scatter_reduce_(0, index, src, reduce=reduce)
+        if reduce == 'amax':
+            res = objdet_helper._scatter_max_sorted(out.clone(), index, src)
+        else:
+            res = -objdet_helper._scatter_max_sorted(-out, index, -src)
+        assert torch.equal(res, ref)
+
+    gt_idx = torch.randint(0, 10, (1000,))
+    out = torch.full((60,), 10, dtype=torch.long)
+    ref = out.clone().scatter_reduce_(0, index, gt_idx, reduce='amin')
+    assert torch.equal(-objdet_helper._scatter_max_sorted(-out, index, -gt_idx),
+                       ref)
+    assert torch.equal(objdet_helper.scatter_min_(out, index, gt_idx), ref)
+
+
+def test_pointpillars_torch_batched_nms():
+    import torch
+    from ml3d.torch.utils import objdet_helper
+
+    torch.manual_seed(0)
+    num_boxes = 2000
+    boxes = torch.cat([
+        torch.rand(num_boxes, 3) * 40 - 20,
+        torch.tensor([1.9, 4.7, 1.7]) * (1 + 0.1 * torch.randn(num_boxes, 3)),
+        torch.rand(num_boxes, 1) * 6.28
+    ], -1)
+    scores = torch.rand(num_boxes)
+    groups = torch.randint(0, 20, (num_boxes,))
+
+    bev = objdet_helper.xywhr_to_xyxyr(objdet_helper.box3d_to_bev(boxes))
+    ref = torch.cat([
+        idx[objdet_helper.nms(bev[idx], scores[idx], 0.01)] for idx in [(
+            groups == g).nonzero(as_tuple=False).squeeze(-1) for g in range(20)]
+    ])
+    ref = ref[scores[ref].argsort(descending=True)]
+    assert len(ref) < num_boxes
+
+    for offset in [False, True]:
+        keep = objdet_helper.batched_nms(boxes, scores, groups, offset=offset)
+        assert torch.equal(keep, ref)
+
+
+def test_pointpillars_torch_assign_bboxes():
+    import torch
+    import open3d.ml.torch as ml3d
+    bbox_overlaps = ml3d.models.point_pillars.bbox_overlaps
+    box3d_to_bev2d = ml3d.models.point_pillars.box3d_to_bev2d
+
+    head = ml3d.models.point_pillars.Anchor3DHead(
+        num_classes=2,
+        ranges=[[0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                [0, -39.68, -1.78, 70.4, 39.68, -1.78]],
+        sizes=[[0.6, 0.8, 1.73], [1.6, 3.9, 1.56]],
+        iou_thr=[[0.35, 0.5], [0.45, 0.6]])
+    pred_bboxes = torch.zeros(3, 28, 62, 54)
+
+    target_bboxes = []
+    for num in [6, 0, 40]:
+        t = torch.rand(num, 7) * torch.tensor([70, 79, 1, 3, 3, 3, 3.14])
+        t[:, 1] -= 39.5
+        t[:, 3:6] += 0.5
+        target_bboxes.append(t)
+
+    _, target_idx, pos_idx, neg_idx = head.assign_bboxes(
+        pred_bboxes, target_bboxes)
+
+    # dense reference over all anchors and targets of each sample
+    anchors, anchors_bev = head.anchor_generator.grid_anchors_per_range(
+        (62, 54), device='cpu')
+    num_anchors = sum(len(a) for a in anchors)
+    ref = {}
+    offset = 0
+    for b, targets in enumerate(target_bboxes):
+        for i, (neg_th, pos_th) in enumerate(head.iou_thr):
+            idx = torch.arange(len(anchors[i]))
+            flat = (idx // 2 * 2 * 2 + i * 2 + idx % 2) + b * num_anchors
+            if len(targets) == 0:
+                ref.update({int(f): None for f in flat})
+                continue
+            overlaps = bbox_overlaps(box3d_to_bev2d(targets), anchors_bev[i])
+            max_overlaps, argmax_overlaps = overlaps.max(dim=0)
+            gt_max_overlaps = overlaps.max(dim=1)[0]
+            pos = max_overlaps >= pos_th
+            for k in range(len(targets)):
+                if gt_max_overlaps[k] >= neg_th:
+                    pos[overlaps[k, :] == gt_max_overlaps[k]] = True
+            for f, a in zip(flat[pos], argmax_overlaps[pos]):
+                ref[int(f)] = int(a) + offset
+            for f in flat[~pos & (max_overlaps < neg_th)]:
+                ref[int(f)] = None
+        offset += len(targets)
+
+    assert {int(p): int(t) for p, t in zip(pos_idx, target_idx)
+           } == {f: t for f, t in ref.items() if t is not None}
+    assert set(neg_idx.tolist()) == {f for f, t in ref.items() if t is None}
+
+
+def test_pointpillars_torch_get_bboxes():
+    import torch
+    import open3d.ml.torch as ml3d
+
+    head = ml3d.models.point_pillars.Anchor3DHead(
+        num_classes=3,
+        nms_pre=50,
+        ranges=[[0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                [0, -39.68, -0.6, 70.4, 39.68, -0.6],
+                [0, -39.68, -1.78, 70.4, 39.68, -1.78]],
+        sizes=[[0.6, 0.8, 1.73], [0.6, 1.76, 1.73], [1.6, 3.9, 1.56]],
+        iou_thr=[[0.35, 0.5], [0.35, 0.5], [0.45, 0.6]])
+
+    cls_scores = torch.randn(4, 18, 31, 27)
+    bbox_preds = 0.1 * torch.randn(4, 42, 31, 27)
+    dir_preds = torch.randn(4, 12, 31, 27)
+
+    bboxes, scores, labels = head.get_bboxes(cls_scores, bbox_preds, dir_preds)
+    assert len(bboxes) == len(scores) == len(labels) == 4
+
+    # same results as decoding each sample on its own
+    for i in range(4):
+        b, s, l = head.get_bboxes(cls_scores[i:i + 1], bbox_preds[i:i + 1],
+                                  dir_preds[i:i + 1])
+        assert torch.equal(b[0], bboxes[i])
+        assert torch.allclose(s[0], scores[i])
+        assert torch.equal(l[0], labels[i])
+
+        assert len(bboxes[i]) > 0
+        assert (scores[i] > head.score_thr).all()
+        # sorted by class, then by descending score
+        assert (labels[i][1:] >= labels[i][:-1]).all()
+        for c in range(3):
+            cls_scores_i = scores[i][labels[i] == c]
+            assert (cls_scores_i[1:] <= cls_scores_i[:-1]).all()
+
+
+def test_pointpillars_torch_voxelize_batch():
+    import torch
+    from types import SimpleNamespace
+    import open3d.ml.torch as ml3d
+
+    voxel_layer = ml3d.models.point_pillars.PointPillarsVoxelization(
+        voxel_size=[0.16, 0.16, 4],
+        point_cloud_range=[0, -39.68, -3, 69.12, 39.68, 1],
+        max_num_points=32,
+        max_voxels=[16000, 40000])
+
+    points = []
+    for i in range(2):
+        p = torch.rand(5000, 4) * torch.tensor([69, 79, 4, 1])
+        p[:, :3] += torch.tensor([0, -39.6, -3])
+        # a dense voxel with more than max_num_points points
+        p[:100, :3] = torch.tensor([5.0, 5.0, 0.0]) + torch.rand(100, 3) * 0.1
+        points.append(p)
+    row_splits = torch.tensor([0, 5000, 10000])
+
+    voxels, coors, num_points = voxel_layer.forward_batch(
+        torch.cat(points), row_splits)
+
+    # same voxels as voxelizing each point cloud separately
+    for i, p in enumerate(points):
+        ref_voxels, ref_coors, ref_num_points = voxel_layer(p)
+        mask = coors[:, 0] == i
+        ref_keys = (ref_coors.long() * torch.tensor([10000, 1000, 1])).sum(1)
+        keys = (coors[mask, 1:].long() * torch.tensor([10000, 1000, 1])).sum(1)
+        ref_order, order = torch.argsort(ref_keys), torch.argsort(keys)
+        assert torch.equal(ref_coors[ref_order].int(), coors[mask][order, 1:])
+        assert torch.equal(ref_num_points[ref_order], num_points[mask][order])
+        assert torch.equal(ref_voxels[ref_order], voxels[mask][order])
+    assert num_points.max() == 32
+
+    # the model voxelizes each sample with the op unless batched is set
+    model = SimpleNamespace(voxel_layer=voxel_layer)
+    voxelize = ml3d.models.PointPillars.voxelize
+    assert not voxel_layer.batched
+    ref = voxelize(model, points)
+    voxel_layer.batched = True
+    res = voxelize(model, points)
+    ref_order = torch.argsort(
+        (ref[2].long() * torch.tensor([10**9, 10**6, 10**3, 1])).sum(1))
+    order = torch.argsort(
+        (res[2].long() * torch.tensor([10**9, 10**6, 10**3, 1])).sum(1))
+    for r, x in zip(ref, res):
+        assert torch.equal(r[ref_order], x[order].to(r.dtype))
+
+    # max_voxels applies to each point cloud
+    voxel_layer.max_voxels = [100, 100]
+    voxels, coors, num_points = voxel_layer.forward_batch(
+        torch.cat(points), row_splits)
+    assert torch.equal(torch.bincount(coors[:, 0].long()),
+                       torch.tensor([100, 100]))